@@ -1,17 +1,22 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, func
 from app.db.session import get_db
 from app.models.subscription import Subscription
 from app.models.sync_state import SyncState
 from app.models.selection import SelectedCategory
-from app.models.cache import MovieCache, SeriesCache, EpisodeCache
+from app.models.cache import MovieCache, SeriesCache, EpisodeCache, VodInfoCache
 from app.models.schedule import Schedule
 from app.models.schedule_execution import ScheduleExecution
 from app.models.m3u_source import M3USource
 from app.models.m3u_entry import M3UEntry
 from app.models.m3u_selection import M3USelection
+from app.models.output_file import OutputFile
 from app.core.config import settings
+from app.core.celery_app import celery_app
+from app.services.manifest import SOURCE_XTREAM, SOURCE_M3U
+from app.services.staging import clear_output_dir
+from app.tasks.sweep import sweep_output_task
 import os
 import shutil
 import platform
@@ -34,8 +39,8 @@ def delete_generated_files(db: Session = Depends(get_db)):
             # Delete files from movies directory
             if sub.movies_dir and os.path.exists(sub.movies_dir):
                 try:
-                    shutil.rmtree(sub.movies_dir)
-                    os.makedirs(sub.movies_dir, exist_ok=True)
+                    # A staged folder is a symlink to its published version, both go
+                    clear_output_dir(sub.movies_dir)
                     deleted_count += 1
                 except Exception as e:
                     errors.append(f"Error deleting files from {sub.movies_dir}: {str(e)}")
@@ -43,8 +48,7 @@ def delete_generated_files(db: Session = Depends(get_db)):
             # Delete files from series directory
             if sub.series_dir and os.path.exists(sub.series_dir):
                 try:
-                    shutil.rmtree(sub.series_dir)
-                    os.makedirs(sub.series_dir, exist_ok=True)
+                    clear_output_dir(sub.series_dir)
                     deleted_count += 1
                 except Exception as e:
                     errors.append(f"Error deleting files from {sub.series_dir}: {str(e)}")
@@ -56,8 +60,7 @@ def delete_generated_files(db: Session = Depends(get_db)):
             # Delete files from output directory
             if source.output_dir and os.path.exists(source.output_dir):
                 try:
-                    shutil.rmtree(source.output_dir)
-                    os.makedirs(source.output_dir, exist_ok=True)
+                    clear_output_dir(source.output_dir)
                     deleted_count += 1
                 except Exception as e:
                     errors.append(f"Error deleting files from {source.output_dir}: {str(e)}")
@@ -79,6 +82,10 @@ def delete_generated_files(db: Session = Depends(get_db)):
                         errors.append(f"Error deleting {item_path}: {str(e)}")
             except Exception as e:
                 errors.append(f"Error scanning output directory: {str(e)}")
+
+        # The files are gone, so is their manifest
+        db.query(OutputFile).delete()
+        db.commit()
         
         return {
             "message": "Files deleted successfully",
@@ -123,6 +130,7 @@ def reset_database(db: Session = Depends(get_db)):
         db.query(EpisodeCache).delete()
         db.query(SeriesCache).delete()
         db.query(MovieCache).delete()
+        db.query(VodInfoCache).delete()
         db.query(SyncState).delete()
         
         # We DO NOT delete:
@@ -167,6 +175,55 @@ def reset_all_data(db: Session = Depends(get_db)):
         return {"message": f"Error resetting all data: {str(e)}", "success": False}
 
 
+@router.get("/file-stats")
+def get_file_stats(db: Session = Depends(get_db)):
+    """Generated file counts and sizes per source, read from the output manifest instead of walking the folders"""
+    try:
+        rows = db.query(
+            OutputFile.source_type,
+            OutputFile.source_id,
+            OutputFile.item_kind,
+            func.count(OutputFile.id),
+            func.coalesce(func.sum(OutputFile.size), 0)
+        ).group_by(OutputFile.source_type, OutputFile.source_id, OutputFile.item_kind).all()
+
+        sources = [{
+            "source_type": source_type,
+            "source_id": source_id,
+            "item_kind": item_kind,
+            "files": count,
+            "bytes": int(size)
+        } for source_type, source_id, item_kind, count, size in rows]
+
+        return {
+            "sources": sources,
+            "total_files": sum(s["files"] for s in sources),
+            "total_bytes": sum(s["bytes"] for s in sources),
+            "success": True
+        }
+    except Exception as e:
+        return {"message": f"Error reading file stats: {str(e)}", "success": False}
+
+
+@router.post("/sweep/{source_type}/{source_id}")
+def trigger_sweep(source_type: str, source_id: int, remove: bool = False, repair: bool = False):
+    """Start an orphan sweep of a subscription (xtream) or M3U source (m3u) output tree in the worker"""
+    if source_type not in (SOURCE_XTREAM, SOURCE_M3U):
+        return {"message": f"Unknown source type: {source_type}", "success": False}
+    task = sweep_output_task.delay(source_type, source_id, remove=remove, repair=repair)
+    return {"message": "Sweep started", "task_id": task.id, "success": True}
+
+
+@router.get("/sweep/{task_id}")
+def get_sweep_status(task_id: str):
+    """Progress of a running sweep (folders, files, files/s) or its final report"""
+    result = celery_app.AsyncResult(task_id)
+    info = result.info if isinstance(result.info, dict) else None
+    if result.failed():
+        info = {"error": str(result.info)}
+    return {"task_id": task_id, "state": result.state, "info": info, "success": True}
+
+
 @router.get("/disk-usage")
 def get_disk_usage():
     """Get disk usage information for the system."""
@@ -206,8 +206,12 @@ def update_m3u_source(
             raise HTTPException(status_code=400, detail="Source name already exists")
         source.name = updates.name
     
-    if updates.url and source.source_type == SourceType.URL:
+    if updates.url and source.source_type == SourceType.URL and updates.url != source.url:
         source.url = updates.url
+        # Validators of the old URL mean nothing for the new one
+        source.etag = None
+        source.last_modified = None
+        source.content_digest = None
     
     db.commit()
     db.refresh(source)
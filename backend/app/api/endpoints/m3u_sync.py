@@ -20,7 +20,8 @@ def get_sync_status(db: Session = Depends(get_db)):
             last_sync=state.last_sync,
             items_added=state.items_added,
             items_deleted=state.items_deleted,
-            error_message=state.error_message
+            error_message=state.error_message,
+            stats=state.stats
         ) for state in states
     ]
 
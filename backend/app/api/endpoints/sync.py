@@ -20,7 +20,8 @@ def get_sync_status(db: Session = Depends(get_db)):
             last_sync=state.last_sync,
             items_added=state.items_added,
             items_deleted=state.items_deleted,
-            error_message=state.error_message
+            error_message=state.error_message,
+            stats=state.stats
         ) for state in states
     ]
 
@@ -45,8 +46,8 @@ def trigger_movie_sync(subscription_id: int, db: Session = Depends(get_db)):
     return SyncTriggerResponse(message="Movie sync started", task_id=task.id)
 
 @router.post("/series/{subscription_id}", response_model=SyncTriggerResponse)
-def trigger_series_sync(subscription_id: int, db: Session = Depends(get_db)):
-    task = sync_series_task.delay(subscription_id)
+def trigger_series_sync(subscription_id: int, force: bool = False, db: Session = Depends(get_db)):
+    task = sync_series_task.delay(subscription_id, force=force)
     # Save task_id to sync_state
     sync_state = db.query(SyncState).filter(
         SyncState.subscription_id == subscription_id,
@@ -17,3 +17,4 @@ celery_app.conf.timezone = settings.TIMEZONE
 # Import tasks to register them
 from app.tasks import sync  # noqa
 from app.tasks import m3u_sync  # noqa
+from app.tasks import sweep  # noqa
@@ -23,6 +23,47 @@ class Settings(BaseSettings):
     MOVIES_DIR: str = "/output/movies"
     SERIES_DIR: str = "/output/series"
 
+    # Xtream HTTP connection pool (one pool per subscription for a whole sync)
+    XTREAM_MAX_CONNECTIONS: int = 20
+    XTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    XTREAM_KEEPALIVE_EXPIRY: float = 30.0
+    XTREAM_HTTP2: bool = False
+
+    # Adaptive (AIMD) request concurrency per provider, seeded from SYNC_PARALLELISM_*
+    XTREAM_CONCURRENCY_MIN: int = 1
+    XTREAM_CONCURRENCY_MAX: int = 20  # capped by XTREAM_MAX_CONNECTIONS
+    XTREAM_LATENCY_TARGET: float = 2.0  # seconds; slower responses stop the limit from growing
+
+    # Fetch selected categories one by one (in parallel) instead of the whole catalog
+    # when at most this fraction of the provider's categories is selected
+    CATEGORY_FETCH_THRESHOLD: float = 0.25
+
+    # How long a cached get_vod_info payload is trusted before it is fetched again (0 disables the cache)
+    VOD_INFO_CACHE_TTL_HOURS: int = 168
+
+    # Incremental movie syncs only process movies newer than the last seen `added` timestamp;
+    # a full reconciliation (listing fingerprints for every movie) still runs this often
+    MOVIE_INCREMENTAL_SYNC: bool = True
+    MOVIE_FULL_RECONCILE_HOURS: int = 24
+
+    # Sync pipeline (detail fetch -> NFO render -> file write -> cache upsert)
+    SYNC_QUEUE_SIZE: int = 100  # items buffered between two stages
+    SYNC_WRITE_CONCURRENCY: int = 4
+    SYNC_COMMIT_BATCH_SIZE: int = 200  # cache rows per commit...
+    SYNC_COMMIT_INTERVAL: float = 5.0  # ...or seconds since the last commit, whichever comes first
+
+    # Dedicated thread pool for output files: writes go in groups, one thread handoff per group
+    FILE_IO_WORKERS: int = 8
+    FILE_WRITE_BATCH_SIZE: int = 32
+    # Build each sync in a hardlinked copy of the output folder and publish it with one symlink swap
+    STAGED_OUTPUT: bool = False
+
+    # M3U entries parsed and stored per batch while a playlist streams in
+    M3U_INGEST_BATCH_SIZE: int = 1000
+
+    # Orphan sweeps: os.scandir threads walking an output tree
+    SWEEP_WORKERS: int = 8
+
     # Security
     SECRET_KEY: str = "changethis_to_a_secure_random_string_in_production"
     ALGORITHM: str = "HS256"
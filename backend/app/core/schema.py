@@ -0,0 +1,74 @@
+from sqlalchemy import MetaData, UniqueConstraint, inspect, text
+from sqlalchemy.engine import Connection, Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Data to carry over when a column is added to an existing table
+COLUMN_BACKFILLS = {
+    # The episode's stream id used to be the primary key itself
+    ("episode_cache", "episode_id"): "UPDATE episode_cache SET episode_id = id WHERE episode_id IS NULL",
+}
+
+def _unique_column_sets(conn: Connection, table_name: str) -> set:
+    inspector = inspect(conn)
+    sets = {tuple(sorted(c["column_names"])) for c in inspector.get_unique_constraints(table_name)}
+    sets |= {tuple(sorted(i["column_names"])) for i in inspector.get_indexes(table_name) if i.get("unique")}
+    return sets
+
+def _drop_duplicates(conn: Connection, table_name: str, columns: list) -> int:
+    """Keep the newest row (highest id) of every group the unique constraint would reject"""
+    quote = conn.dialect.identifier_preparer.quote
+    table = quote(table_name)
+    cols = ", ".join(quote(c) for c in columns)
+    # Rows with a NULL in the key never conflict, they are left alone
+    not_null = " AND ".join(f"{quote(c)} IS NOT NULL" for c in columns)
+    result = conn.execute(text(
+        f"DELETE FROM {table} WHERE {not_null} AND id NOT IN "
+        f"(SELECT MAX(id) FROM {table} WHERE {not_null} GROUP BY {cols})"
+    ))
+    return result.rowcount or 0
+
+def upgrade_schema(engine: Engine, metadata: MetaData):
+    """Bring tables that already existed up to the models.
+
+    create_all only creates missing tables, so columns, unique constraints and
+    indexes added to a model since never reach an existing database. Missing
+    columns are added (nullable), duplicates that would violate a new unique
+    constraint are dropped and the constraint is created as a unique index.
+    Every step checks first, running it at each start is a no-op once done.
+    """
+    with engine.begin() as conn:
+        existing_tables = set(inspect(conn).get_table_names())
+        quote = conn.dialect.identifier_preparer.quote
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            present = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                logger.info(f"Schema upgrade: added {table.name}.{column.name}")
+                backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    conn.execute(text(backfill))
+
+            unique_sets = _unique_column_sets(conn, table.name)
+            for constraint in table.constraints:
+                if not isinstance(constraint, UniqueConstraint):
+                    continue
+                columns = [c.name for c in constraint.columns]
+                if tuple(sorted(columns)) in unique_sets:
+                    continue
+                dropped = _drop_duplicates(conn, table.name, columns)
+                conn.execute(text(
+                    f"CREATE UNIQUE INDEX {quote(constraint.name)} ON {quote(table.name)} "
+                    f"({', '.join(quote(c) for c in columns)})"
+                ))
+                logger.info(f"Schema upgrade: unique index {constraint.name} on {table.name}, {dropped} duplicate rows dropped")
+
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
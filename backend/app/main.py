@@ -6,10 +6,13 @@ from app.api.api import api_router
 from app.core.config import settings
 from app.db.base import Base
 from app.db.session import engine
+from app.core.schema import upgrade_schema
 import os
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+# ...and bring the ones that already existed up to date
+upgrade_schema(engine, Base.metadata)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, String, Integer, ForeignKey
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.db.base_class import Base
 
 class MovieCache(Base):
     __tablename__ = "movie_cache"
+    __table_args__ = (UniqueConstraint("subscription_id", "stream_id", name="uq_movie_cache_stream"),)
 
     id = Column(Integer, primary_key=True, index=True)
     subscription_id = Column(Integer, nullable=False, index=True)
@@ -12,9 +14,11 @@ class MovieCache(Base):
     category_id = Column(String)
     container_extension = Column(String)
     tmdb_id = Column(String, nullable=True)
+    fingerprint = Column(String, nullable=True)  # Hash of the upstream listing fields, drives the diff
 
 class SeriesCache(Base):
     __tablename__ = "series_cache"
+    __table_args__ = (UniqueConstraint("subscription_id", "series_id", name="uq_series_cache_series"),)
 
     id = Column(Integer, primary_key=True, index=True)
     subscription_id = Column(Integer, nullable=False, index=True)
@@ -22,14 +26,32 @@ class SeriesCache(Base):
     name = Column(String)
     category_id = Column(String)
     tmdb_id = Column(String, nullable=True)
+    fingerprint = Column(String, nullable=True)  # Hash of the upstream listing fields, drives the diff
+    last_modified = Column(String, nullable=True)  # Provider's last_modified as last seen in get_series
 
 class EpisodeCache(Base):
     __tablename__ = "episode_cache"
+    __table_args__ = (UniqueConstraint("subscription_id", "episode_id", name="uq_episode_cache_episode"),)
 
-    id = Column(Integer, primary_key=True, index=True) # This is the stream_id of the episode
+    id = Column(Integer, primary_key=True, index=True)
     subscription_id = Column(Integer, nullable=False, index=True)
     series_id = Column(Integer, index=True) # This refers to the series_id from provider, not our DB id
+    episode_id = Column(Integer, index=True) # This is the stream_id of the episode
     season_num = Column(Integer)
     episode_num = Column(Integer)
     title = Column(String, nullable=True)
     container_extension = Column(String)
+    path = Column(String, nullable=True)  # Output file path without extension, relative to the series root
+    fingerprint = Column(String, nullable=True)  # Hash of everything that ends up in the episode's files
+
+class VodInfoCache(Base):
+    """get_vod_info payloads, kept so unchanged movies never hit the provider again"""
+    __tablename__ = "vod_info_cache"
+    __table_args__ = (UniqueConstraint("subscription_id", "stream_id", name="uq_vod_info_cache_stream"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, nullable=False, index=True)
+    stream_id = Column(Integer, nullable=False, index=True)
+    info = Column(JSON, nullable=True)
+    fingerprint = Column(String, nullable=True)  # Listing fingerprint of the movie when the payload was fetched
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
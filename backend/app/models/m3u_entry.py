@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, Enum as SQLEnum
 from app.db.base_class import Base
 import enum
 
@@ -8,6 +8,9 @@ class EntryType(str, enum.Enum):
 
 class M3UEntry(Base):
     __tablename__ = "m3u_entries"
+    __table_args__ = (
+        UniqueConstraint("m3u_source_id", "entry_key", name="uq_m3u_entry_key"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     m3u_source_id = Column(Integer, ForeignKey("m3u_sources.id"), nullable=False, index=True)
@@ -18,3 +21,5 @@ class M3UEntry(Base):
     tvg_id = Column(String, nullable=True)
     tvg_name = Column(String, nullable=True)
     entry_type = Column(SQLEnum(EntryType), default=EntryType.MOVIE, nullable=False)
+    entry_key = Column(String, nullable=True)  # Stable identity across reparses: digest of url + title
+    content_hash = Column(String, nullable=True)  # Digest of the other fields, tells an updated entry
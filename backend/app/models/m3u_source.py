@@ -21,5 +21,14 @@ class M3USource(Base):
     is_active = Column(Boolean, default=True)
     sync_status = Column(String, default="idle") # idle, syncing, success, error
     last_sync = Column(DateTime, nullable=True)
+    # Validators and blake2b digest of the last playlist download (URL type)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_digest = Column(String, nullable=True)
+    # Set while reparsed entries or a staged copy have not reached the live folder, the next sync then writes every entry
+    unpublished_since = Column(DateTime, nullable=True)
+    # Digest of what the files depend on besides the entries (selection, naming, folders, recorded files)
+    # as of the last completed generation; with an unchanged playlist it tells there is nothing to write
+    generated_digest = Column(String, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Enum
+from sqlalchemy import Column, String, Integer, DateTime, Enum, JSON
 import enum
 from datetime import datetime
 from app.db.base_class import Base
@@ -25,3 +25,4 @@ class M3USyncState(Base):
     items_deleted = Column(Integer, nullable=False, default=0)
     error_message = Column(String, nullable=True)
     task_id = Column(String, nullable=True)  # Celery task ID for cancellation
+    stats = Column(JSON, nullable=True)  # Per-sync counters (files written/skipped, ...)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Integer, DateTime, Index, UniqueConstraint
+from datetime import datetime
+from app.db.base_class import Base
+
+class OutputFile(Base):
+    """Manifest of every generated .strm/.nfo, so cleanup never has to guess paths or walk folders"""
+    __tablename__ = "output_files"
+    __table_args__ = (
+        UniqueConstraint("path", name="uq_output_file_path"),
+        Index("ix_output_file_item", "source_type", "source_id", "item_kind", "item_id"),
+        Index("ix_output_file_parent", "source_type", "source_id", "item_kind", "parent_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_type = Column(String, nullable=False)  # xtream or m3u
+    source_id = Column(Integer, nullable=False)  # Subscription id or M3U source id
+    item_kind = Column(String, nullable=False)  # movie, series, episode, m3u_movie, m3u_series
+    item_id = Column(String, nullable=False)  # Provider stream/series/episode id, or the M3U entry url
+    parent_id = Column(String, nullable=True)  # Series id of an episode, group title of an M3U entry
+    path = Column(String, nullable=False)
+    digest = Column(String, nullable=True)  # blake2b of the content
+    size = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
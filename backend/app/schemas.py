@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any
 from datetime import datetime
 
 class ConfigUpdate(BaseModel):
@@ -41,6 +41,7 @@ class SyncStatusResponse(BaseModel):
     items_added: int
     items_deleted: int
     error_message: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None
 
 class M3USyncStatusResponse(BaseModel):
     id: Optional[int] = None
@@ -51,6 +52,7 @@ class M3USyncStatusResponse(BaseModel):
     items_added: int
     items_deleted: int
     error_message: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None
 
 class SyncTriggerResponse(BaseModel):
     message: str
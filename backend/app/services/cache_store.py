@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, List, Sequence
+from sqlalchemy import Table, delete, update
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lists
+ID_BATCH_SIZE = 500
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Bulk upsert is not supported on {dialect}")
+    return insert
+
+def bulk_upsert(db: Session, table: Table, rows: List[Dict], conflict_columns: Sequence[str]) -> int:
+    """INSERT ... ON CONFLICT DO UPDATE a batch of rows in a single executemany.
+
+    conflict_columns must be backed by a unique constraint; every other key
+    present in the rows is overwritten on conflict.
+    """
+    if not rows:
+        return 0
+    insert = _dialect_insert(db)
+    stmt = insert(table)
+    update_columns = [key for key in rows[0] if key not in conflict_columns]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(conflict_columns),
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+    db.execute(stmt, rows)
+    return len(rows)
+
+def bulk_delete_ids(db: Session, table: Table, ids: Iterable[int], column: str = "id", **filters) -> int:
+    """DELETE rows whose column is in ids, a batch of ids per statement.
+
+    Extra keyword arguments are added as equality filters (e.g. subscription_id=1).
+    """
+    ids = list(ids)
+    conditions = [table.c[key] == value for key, value in filters.items()]
+    deleted = 0
+    for i in range(0, len(ids), ID_BATCH_SIZE):
+        result = db.execute(delete(table).where(table.c[column].in_(ids[i:i + ID_BATCH_SIZE]), *conditions))
+        deleted += result.rowcount or 0
+    return deleted
+
+def bulk_update_ids(db: Session, table: Table, ids: Iterable[int], values: Dict, column: str = "id", **filters) -> int:
+    """UPDATE rows whose column is in ids with the same values, a batch of ids per statement"""
+    ids = list(ids)
+    conditions = [table.c[key] == value for key, value in filters.items()]
+    updated = 0
+    for i in range(0, len(ids), ID_BATCH_SIZE):
+        result = db.execute(update(table).where(table.c[column].in_(ids[i:i + ID_BATCH_SIZE]), *conditions).values(**values))
+        updated += result.rowcount or 0
+    return updated
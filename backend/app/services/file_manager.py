@@ -1,333 +1,333 @@
 import os
-import aiofiles
-import re
-from typing import Optional
+import shutil
+import asyncio
+import threading
+import uuid
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.services.nfo_renderer import NfoRenderer, escape_xml
+from app.services.staging import StagedTree
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Truncate to max 200 characters to ensure full path stays under 255
+# (leaving room for directory path, extension, etc.)
+MAX_NAME_LENGTH = 200
+NAME_CACHE_SIZE = 16384
+
+# Characters invalid in Windows/SMB file names become underscores. A list indexed by code
+# point is the fastest str.translate table; code points past its end are left as they are
+_INVALID_NAME_CHARS = [chr(i) for i in range(128)]
+for _char in '\\/:*?"<>|':
+    _INVALID_NAME_CHARS[ord(_char)] = '_'
+
+class _M3UNameChars(dict):
+    """str.translate table keeping alphanumerics, space, '-' and '_', filled in as code points show up"""
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        value = codepoint if char.isalnum() or char in ' -_' else None
+        self[codepoint] = value
+        return value
+
+_M3U_NAME_CHARS = _M3UNameChars()
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def sanitize_name(name: str) -> str:
+    """File/folder name for Xtream libraries: invalid characters replaced by '_'"""
+    return name.translate(_INVALID_NAME_CHARS)[:MAX_NAME_LENGTH]
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def sanitize_m3u_name(name: str) -> str:
+    """File/folder name for M3U libraries: anything but letters, digits, space, '-' and '_' dropped"""
+    return name.translate(_M3U_NAME_CHARS).strip()
 
 class FileManager:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, io_workers: int = 4, write_batch_size: int = 32):
         self.output_dir = output_dir
+        self.io_workers = io_workers
+        self.write_batch_size = max(1, write_batch_size)
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._stats_lock = threading.Lock()
+        self.write_stats = {"written": 0, "skipped": 0, "bytes_written": 0, "bytes_saved": 0, "dirs_created": 0, "mkdir_avoided": 0, "errors": 0, "batches": 0}
+        self._nfo_renderers: Dict[tuple, NfoRenderer] = {}
+        # Directories known to exist during this run, so each one costs a single makedirs
+        self._known_dirs: Set[str] = set()
+        # Staged copies, one per staged root: output_dir and any extra folder outside it
+        self.staging: List[StagedTree] = []
+        self._on_publish: List[Callable[[], None]] = []
 
     def sanitize_name(self, name: str) -> str:
-        # Replace invalid characters with underscore
-        sanitized = re.sub(r'[\\/:*?"<>|]', '_', name)
-        
-        # Truncate to max 200 characters to ensure full path stays under 255
-        # (leaving room for directory path, extension, etc.)
-        max_length = 200
-        if len(sanitized) > max_length:
-            sanitized = sanitized[:max_length]
-        
-        return sanitized
+        return sanitize_name(name)
+
+    def begin_staging(self, extra_dirs: Iterable[str] = ()):
+        """Send every write and removal under output_dir to a hardlinked copy of it until publish().
+
+        extra_dirs are staged the same way when they live outside output_dir
+        (custom library folders); each root is published with its own swap.
+        Callers keep building live paths; close() without publish() throws
+        the copies away and leaves the live trees untouched.
+        """
+        if self.staging:
+            return
+        roots: List[str] = []
+        for path in sorted({os.path.normpath(d) for d in (self.output_dir, *extra_dirs) if d}):
+            # Sorted, so a parent comes before the folders nested in it
+            if not any(path.startswith(root + os.sep) for root in roots):
+                roots.append(path)
+        for root in roots:
+            tree = StagedTree(root)
+            self.staging.append(tree)
+            tree.prepare()
+
+    def publish(self):
+        for tree in self.staging:
+            tree.publish()
+        callbacks, self._on_publish = self._on_publish, []
+        for callback in callbacks:
+            callback()
 
+    def on_publish(self, callback: Callable[[], None]):
+        """Run callback once the changes are live: after publish() while staging, right away otherwise.
+
+        Bookkeeping of removed files (manifest, cache rows) goes here, so a staged
+        copy that never gets published leaves it pointing at files still live.
+        """
+        if not self.staging:
+            callback()
+        else:
+            self._on_publish.append(callback)
+
+    def physical_path(self, path: str) -> str:
+        """Where a path under a staged root really lives: the staged copy while staging"""
+        for tree in self.staging:
+            live = tree.live_dir
+            if path == live or path.startswith(live + os.sep):
+                return tree.root + path[len(live):]
+        return path
 
     def ensure_directory(self, path: str):
-        os.makedirs(path, exist_ok=True)
+        if path in self._known_dirs:
+            with self._stats_lock:
+                self.write_stats["mkdir_avoided"] += 1
+            return
+        os.makedirs(self.physical_path(path), exist_ok=True)
+        with self._stats_lock:
+            self.write_stats["dirs_created"] += 1
+        # makedirs created (or found) every parent as well
+        while path and path not in self._known_dirs:
+            self._known_dirs.add(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
 
-    async def write_strm(self, path: str, url: str):
-        async with aiofiles.open(path, 'w') as f:
-            await f.write(url)
+    def ensure_directories(self, paths: Iterable[str]):
+        """Create a set of directories up front, parents before children"""
+        for path in sorted(set(paths)):
+            self.ensure_directory(path)
 
-    async def write_nfo(self, path: str, content: str):
-        async with aiofiles.open(path, 'w') as f:
-            await f.write(content)
+    def _forget_directories(self, paths: Iterable[str]):
+        """Drop removed directories, and everything below them, from the known set"""
+        removed = set(paths)
+        if not removed or not self._known_dirs:
+            return
+        stale = set()
+        for known in self._known_dirs:
+            path = known
+            while path:
+                if path in removed:
+                    stale.add(known)
+                    break
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        self._known_dirs -= stale
 
-    async def delete_file(self, path: str):
-        if os.path.exists(path):
-            os.remove(path)
+    def write_if_changed(self, path: str, data: bytes) -> bool:
+        """Atomically write data to path unless the file already holds exactly these bytes.
 
-    async def delete_directory_if_empty(self, path: str):
+        Skipping identical content keeps mtimes stable, so media servers watching
+        the library do not rescan it. Returns True when the file was written.
+        """
+        path = self.physical_path(path)
         try:
-            os.rmdir(path)
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        with self._stats_lock:
+                            self.write_stats["skipped"] += 1
+                            self.write_stats["bytes_saved"] += len(data)
+                        return False
         except OSError:
-            pass # Directory not empty
+            pass # Missing or unreadable, (re)write it
 
-    def generate_movie_nfo(self, movie_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
-        """Generate NFO file for a movie with comprehensive metadata"""
-        tmdb_id = movie_data.get('tmdb') or movie_data.get('tmdb_id', '')
-        # Use o_name as title if available, otherwise name
-        title = movie_data.get('o_name') or movie_data.get('name', 'Unknown')
-        
-        # Strip language prefix
-        regex = prefix_regex if prefix_regex else r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)'
+        directory, name = os.path.split(path)
+        tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
         try:
-            title = re.sub(regex, '', title)
-        except re.error:
-            title = re.sub(r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)', '', title)
-            
-        # Format date at end
-        if format_date:
-            title = re.sub(r'[_\s](\d{4})$', r' (\1)', title)
-            
-        # Clean name
-        if clean_name:
-            title = title.replace('_', ' ')
-        
-        plot = movie_data.get('plot') or movie_data.get('description', '')
-        year = movie_data.get('year') or movie_data.get('releasedate', '')
-        rating = movie_data.get('rating') or movie_data.get('rating_5based', '')
-        genre = movie_data.get('genre', '')
-        director = movie_data.get('director', '')
-        cast_list = movie_data.get('cast') or movie_data.get('actors', '')
-        duration = movie_data.get('duration') or movie_data.get('episode_run_time', '')
-        trailer = movie_data.get('youtube_trailer', '')
-        cover = movie_data.get('movie_image') or movie_data.get('cover_big') or movie_data.get('stream_icon') or movie_data.get('backdrop_path_original', '')
-        
-        # Handle backdrop/fanart
-        backdrop_path = movie_data.get('backdrop_path', [])
-        fanart = backdrop_path[0] if isinstance(backdrop_path, list) and backdrop_path else ''
-        
-        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<movie>\n'
-        
-        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
-        nfo += f'  <originaltitle>{self._escape_xml(movie_data.get("o_name", ""))}</originaltitle>\n'
-        
-        # TMDB / IMDB IDs
-        if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
-            nfo += f'  <tmdbid>{tmdb_id}</tmdbid>\n'
-            nfo += f'  <uniqueid type="tmdb" default="true">{tmdb_id}</uniqueid>\n'
-        
-        # Try to find IMDB ID in info if available
-        # (This usually requires detailed info fetch)
-        
-        if plot:
-            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
-            nfo += f'  <outline>{self._escape_xml(plot[:200])}</outline>\n'
-        
-        if year:
-            year_str = str(year)[:4] if len(str(year)) >= 4 else str(year)
-            nfo += f'  <year>{year_str}</year>\n'
-            nfo += f'  <premiered>{year_str}-01-01</premiered>\n'
-        
-        # Ratings
-        if rating:
             try:
-                r_val = float(rating)
-                # If it was 5-based, convert
-                if movie_data.get('rating_5based'):
-                    r_val *= 2
-                
-                nfo += '  <ratings>\n'
-                nfo += f'    <rating name="tmdb" default="true"><value>{r_val:.1f}</value></rating>\n'
-                nfo += '  </ratings>\n'
-                nfo += f'  <userrating>{int(round(r_val))}</userrating>\n'
-            except (ValueError, TypeError):
+                f = open(tmp_path, 'xb')
+            except FileNotFoundError:
+                # Directory removed behind our back since it was last ensured
+                os.makedirs(directory, exist_ok=True)
+                f = open(tmp_path, 'xb')
+            with f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
                 pass
-        
-        # Genre
-        if genre:
-            # Split by comma or slash
-            for g in re.split(r'[,/]', str(genre)):
-                g_str = g.strip()
-                if g_str:
-                    nfo += f'  <genre>{self._escape_xml(g_str)}</genre>\n'
-        
-        # Director
-        if director:
-            nfo += f'  <director>{self._escape_xml(director)}</director>\n'
-        
-        # Cast
-        if cast_list:
-            for actor in str(cast_list).split(','):
-                actor_name = actor.strip()
-                if actor_name:
-                    nfo += f'  <actor><name>{self._escape_xml(actor_name)}</name></actor>\n'
-        
-        # Duration
-        if duration:
+            raise
+
+        with self._stats_lock:
+            self.write_stats["written"] += 1
+            self.write_stats["bytes_written"] += len(data)
+        return True
+
+    def get_write_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats = dict(self.write_stats)
+        if self.staging:
+            staging = {}
+            for tree in self.staging:
+                for key, value in tree.get_stats().items():
+                    staging[key] = round(staging.get(key, 0) + value, 3)
+            stats["staging"] = staging
+        return stats
+
+    async def write_strm(self, path: str, url: str) -> bool:
+        return await self.write_files([(path, url.encode('utf-8'))]) == 1
+
+    async def write_nfo(self, path: str, content: str) -> bool:
+        return await self.write_files([(path, content.encode('utf-8'))]) == 1
+
+    def _write_batch(self, jobs: List[Tuple[str, bytes]]) -> int:
+        written = 0
+        for path, data in jobs:
             try:
-                total_mins = 0
-                if ':' in str(duration):
-                    parts = str(duration).split(':')
-                    total_mins = int(parts[0]) * 60 + int(parts[1])
+                written += self.write_if_changed(path, data)
+            except OSError as e:
+                logger.error(f"Failed to write {path}: {e}")
+                with self._stats_lock:
+                    self.write_stats["errors"] += 1
+        with self._stats_lock:
+            self.write_stats["batches"] += 1
+        return written
+
+    async def write_files(self, jobs: List[Tuple[str, bytes]]) -> int:
+        """Write (path, bytes) jobs on the IO thread pool, write_batch_size jobs per thread handoff.
+
+        Files already holding the same bytes are left alone. A failing file is
+        logged and counted without stopping the rest. Returns the number of files written.
+        """
+        if not jobs:
+            return 0
+        loop = asyncio.get_running_loop()
+        executor = self._get_io_executor()
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, self._write_batch, jobs[i:i + self.write_batch_size])
+            for i in range(0, len(jobs), self.write_batch_size)
+        ])
+        return sum(results)
+
+    def _get_io_executor(self) -> ThreadPoolExecutor:
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="fm-io")
+        return self._io_executor
+
+    def close(self):
+        """Wait for pending filesystem jobs and stop the worker threads, dropping an unpublished staged copy"""
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=True)
+            self._io_executor = None
+        for tree in self.staging:
+            tree.discard()
+        self._on_publish = []
+
+    @staticmethod
+    def _remove_batch(paths: List[str]) -> int:
+        removed = 0
+        for path in paths:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
                 else:
-                    total_mins = int(duration)
-                nfo += f'  <runtime>{total_mins}</runtime>\n'
-            except (ValueError, TypeError, IndexError):
+                    os.remove(path)
+                removed += 1
+            except FileNotFoundError:
                 pass
+        return removed
 
-        # Stream Details (Video/Audio)
-        # Usually from detailed info 'info' dict
-        info = movie_data.get('info', {})
-        nfo += '  <fileinfo>\n    <streamdetails>\n'
-        
-        # Video
-        nfo += '      <video>\n'
-        nfo += f'        <codec>{self._escape_xml(movie_data.get("container_extension", ""))}</codec>\n'
-        if info.get('videoing'): # Check if present
-             pass # Use info from API if mapped
-        if info.get('bitrate'):
-             nfo += f'        <bitrate>{info.get("bitrate")}</bitrate>\n'
-        nfo += '      </video>\n'
-        
-        # Audio
-        if info.get('audio'):
-             nfo += '      <audio>\n'
-             nfo += f'        <codec>{self._escape_xml(info.get("audio", {}).get("codec", ""))}</codec>\n'
-             nfo += '      </audio>\n'
-             
-        nfo += '    </streamdetails>\n  </fileinfo>\n'
-
-        if trailer:
-            nfo += f'  <trailer>plugin://plugin.video.youtube/?action=play_video&amp;videoid={trailer}</trailer>\n'
-        
-        if cover:
-            nfo += f'  <thumb>{cover}</thumb>\n'
-        
-        if fanart:
-            nfo += f'  <fanart><thumb>{fanart}</thumb></fanart>\n'
-        elif cover:
-            nfo += f'  <fanart><thumb>{cover}</thumb></fanart>\n'
-            
-        # MPAA
-        mpaa = movie_data.get('mpaa') or info.get('mpaa')
-        if mpaa:
-             nfo += f'  <mpaa>{self._escape_xml(mpaa)}</mpaa>\n'
-        
-        nfo += '</movie>'
-        return nfo
+    @staticmethod
+    def _prune_empty_dirs(paths: List[str]) -> int:
+        pruned = 0
+        for path in paths:
+            try:
+                os.rmdir(path)
+                pruned += 1
+            except OSError:
+                pass # Missing or not empty
+        return pruned
 
+    async def remove_paths(self, paths: Iterable[str], prune_dirs: Iterable[str] = (), batch_size: int = 64) -> int:
+        """Remove files and directory trees on the IO thread pool, a batch per handoff.
 
-    def generate_show_nfo(self, series_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
-        """Generate NFO file for a TV show"""
-        tmdb_id = series_data.get('tmdb') or series_data.get('tmdb_id', '')
-        title = series_data.get('o_name') or series_data.get('name', 'Unknown')
+        Once everything is removed, each directory in prune_dirs is deleted if it
+        ended up empty. Returns the number of paths actually removed.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_io_executor()
+        paths = list(dict.fromkeys(paths))
+        prune_dirs = list(dict.fromkeys(prune_dirs))
+        self._forget_directories(paths + prune_dirs)
+        paths = [self.physical_path(path) for path in paths]
+        prune_dirs = [self.physical_path(path) for path in prune_dirs]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, self._remove_batch, paths[i:i + batch_size])
+            for i in range(0, len(paths), batch_size)
+        ])
+        if prune_dirs:
+            await loop.run_in_executor(executor, self._prune_empty_dirs, prune_dirs)
+        return sum(results)
+
+    async def delete_file(self, path: str):
+        path = self.physical_path(path)
+        if os.path.exists(path):
+            os.remove(path)
 
-        regex = prefix_regex if prefix_regex else r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)'
+    async def delete_directory_if_empty(self, path: str):
+        self._forget_directories([path])
         try:
-            title = re.sub(regex, '', title)
-        except re.error:
-            title = re.sub(r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)', '', title)
-            
-        if format_date:
-            title = re.sub(r'[_\s](\d{4})$', r' (\1)', title)
-        if clean_name:
-            title = title.replace('_', ' ')
-        
-        plot = series_data.get('plot') or series_data.get('description', '')
-        year = series_data.get('year') or series_data.get('releaseDate', '')
-        rating = series_data.get('rating') or series_data.get('rating_5based', '')
-        genre = series_data.get('genre', '')
-        cast_list = series_data.get('cast') or series_data.get('actors', '')
-        director = series_data.get('director', '')
-        cover = series_data.get('cover') or series_data.get('cover_big') or series_data.get('stream_icon') or series_data.get('backdrop_path_original', '')
-        
-        backdrop_path = series_data.get('backdrop_path', [])
-        fanart = backdrop_path[0] if isinstance(backdrop_path, list) and backdrop_path else ''
-        
-        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<tvshow>\n'
-        
-        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
-        
-        if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
-             nfo += f'  <tmdbid>{tmdb_id}</tmdbid>\n'
-             nfo += f'  <uniqueid type="tmdb" default="true">{tmdb_id}</uniqueid>\n'
-
-        if plot:
-            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
-        
-        if year:
-            year_str = str(year)[:4] if len(str(year)) >= 4 else str(year)
-            nfo += f'  <year>{year_str}</year>\n'
-            nfo += f'  <premiered>{year_str}-01-01</premiered>\n'
-        
-        if rating:
-            try:
-                r_val = float(rating)
-                if series_data.get('rating_5based'):
-                    r_val *= 2
-                
-                nfo += '  <ratings>\n'
-                nfo += f'    <rating name="tmdb" default="true"><value>{r_val:.1f}</value></rating>\n'
-                nfo += '  </ratings>\n'
-                nfo += f'  <userrating>{int(round(r_val))}</userrating>\n'
-            except (ValueError, TypeError):
-                pass
-        
-        if genre:
-            for g in re.split(r'[,/]', str(genre)):
-                g_str = g.strip()
-                if g_str:
-                    nfo += f'  <genre>{self._escape_xml(g_str)}</genre>\n'
-        
-        if director:
-            nfo += f'  <director>{self._escape_xml(director)}</director>\n'
-        
-        if cast_list:
-            for actor in str(cast_list).split(','):
-                actor_name = actor.strip()
-                if actor_name:
-                    nfo += f'  <actor><name>{self._escape_xml(actor_name)}</name></actor>\n'
-        
-        if cover:
-            nfo += f'  <thumb>{cover}</thumb>\n'
-        
-        if fanart:
-            nfo += f'  <fanart><thumb>{fanart}</thumb></fanart>\n'
-        elif cover:
-            nfo += f'  <fanart><thumb>{cover}</thumb></fanart>\n'
-        
-        nfo += '</tvshow>'
-        return nfo
+            os.rmdir(self.physical_path(path))
+        except OSError:
+            pass # Directory not empty
 
-    def generate_episode_nfo(self, episode_data: dict, series_name: str, season_num: int, episode_num: int) -> str:
-        """Generate NFO file for an episode"""
-        title = episode_data.get('title', '')
-        if not title:
-            title = f"Episode {episode_num}"
-            
-        plot = episode_data.get('info', {}).get('plot') or episode_data.get('plot', '')
-        duration = episode_data.get('info', {}).get('duration') or episode_data.get('duration', '')
-        
-        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<episodedetails>\n'
-        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
-        nfo += f'  <showtitle>{self._escape_xml(series_name)}</showtitle>\n'
-        nfo += f'  <season>{season_num}</season>\n'
-        nfo += f'  <episode>{episode_num}</episode>\n'
-        
-        if plot:
-            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
-            
-        # Parse duration "HH:MM:SS" -> minutes
-        if duration:
-             try:
-                total_mins = 0
-                if ':' in str(duration):
-                    parts = str(duration).split(':')
-                    if len(parts) == 3:
-                        total_mins = int(parts[0]) * 60 + int(parts[1])
-                    elif len(parts) == 2:
-                        total_mins = int(parts[0])
-                elif str(duration).isdigit():
-                     total_mins = int(duration)
-                
-                if total_mins > 0:
-                    nfo += f'  <runtime>{total_mins}</runtime>\n'
-             except (ValueError, TypeError):
-                 pass
-
-        # Stream Details
-        # Usually from detailed info 'info' dict of the episode
-        info = episode_data.get('info', {})
-        nfo += '  <fileinfo>\n    <streamdetails>\n'
-        nfo += '      <video>\n'
-        nfo += f'        <codec>{self._escape_xml(episode_data.get("container_extension", ""))}</codec>\n'
-        if info.get('bitrate'):
-             nfo += f'        <bitrate>{info.get("bitrate")}</bitrate>\n'
-        nfo += '      </video>\n'
-        nfo += '    </streamdetails>\n  </fileinfo>\n'
-
-        nfo += '</episodedetails>'
-        return nfo
+    def get_nfo_renderer(self, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> NfoRenderer:
+        """Renderer for these title options; built (and its regexes compiled) once per FileManager"""
+        key = (prefix_regex, format_date, clean_name)
+        renderer = self._nfo_renderers.get(key)
+        if renderer is None:
+            renderer = self._nfo_renderers[key] = NfoRenderer(prefix_regex, format_date, clean_name)
+        return renderer
 
+    def generate_movie_nfo(self, movie_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
+        """Generate NFO file for a movie with comprehensive metadata"""
+        return self.get_nfo_renderer(prefix_regex, format_date, clean_name).movie(movie_data)
+
+    def generate_show_nfo(self, series_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
+        """Generate NFO file for a TV show"""
+        return self.get_nfo_renderer(prefix_regex, format_date, clean_name).show(series_data)
 
+    def generate_episode_nfo(self, episode_data: dict, series_name: str, season_num: int, episode_num: int) -> str:
+        """Generate NFO file for an episode"""
+        # Episode titles are not rewritten, any renderer will do
+        return self.get_nfo_renderer().episode(episode_data, series_name, season_num, episode_num)
 
     def _escape_xml(self, text: str) -> str:
         """Escape XML special characters"""
-        if not text:
-            return ''
-        return (str(text)
-                .replace('&', '&amp;')
-                .replace('<', '&lt;')
-                .replace('>', '&gt;')
-                .replace('"', '&quot;')
-                .replace("'", '&apos;'))
+        return escape_xml(text)
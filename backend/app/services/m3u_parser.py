@@ -1,125 +1,196 @@
+import hashlib
+import os
 import re
+import tempfile
+import time
 import requests
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
+# key="value" attributes, or the first comma outside them followed by the title
+_EXTINF_TOKEN = re.compile(r'([\w-]+)="([^"]*)"|,(.*)')
+
 class M3UParser:
-    """Parser for M3U/M3U8 playlist files"""
+    """Parser for M3U/M3U8 playlist files.
+
+    Playlists are read line by line and entries are yielded as they are
+    parsed, so neither the body nor the entry list is ever held whole.
+    """
     
     def __init__(self):
         self.entries = []
+        self.lines_read = 0
     
-    def parse_from_url(self, url: str) -> List[Dict]:
-        """Fetch and parse M3U from URL"""
+    def iter_url(self, url: str, chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+        """Stream and parse M3U from URL"""
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            content = response.text
-            return self.parse_content(content)
+            with requests.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                # No declared charset: the playlists we see are UTF-8
+                encoding = response.encoding or 'utf-8'
+                lines = (line.decode(encoding, errors='replace') for line in response.iter_lines(chunk_size=chunk_size))
+                yield from self.iter_lines(lines)
         except Exception as e:
             logger.error(f"Error fetching M3U from URL {url}: {e}")
             raise
     
-    def parse_from_file(self, file_path: str) -> List[Dict]:
-        """Parse M3U from file"""
+    def iter_file(self, file_path: str, encoding: str = 'utf-8', errors: str = 'strict') -> Iterator[Dict]:
+        """Stream and parse M3U from file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return self.parse_content(content)
+            # Lines end at '\n' only, like the split of the whole content always did
+            with open(file_path, 'r', encoding=encoding, errors=errors, newline='\n') as f:
+                yield from self.iter_lines(f)
         except Exception as e:
             logger.error(f"Error reading M3U file {file_path}: {e}")
             raise
     
-    def parse_content(self, content: str) -> List[Dict]:
-        """Parse M3U content and extract entries"""
-        entries = []
-        lines = content.strip().split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
+    def iter_lines(self, lines: Iterable[str]) -> Iterator[Dict]:
+        """Parse M3U lines and yield entries"""
+        pending = None  # EXTINF metadata waiting for its URL line
+        count = 0
+        for raw in lines:
+            self.lines_read += 1
+            line = raw.strip()
+            if not line:
+                continue
             
-            # Skip empty lines and comments that aren't EXTINF
-            if not line or (line.startswith('#') and not line.startswith('#EXTINF')):
-                i += 1
+            if pending is not None:
+                # First non-empty line after EXTINF should be the URL, a comment drops the entry
+                entry, pending = pending, None
+                if not line.startswith('#'):
+                    entry['url'] = line
+                    
+                    # Refine entry_type based on URL pattern (more reliable for Xtream Codes)
+                    if '/series/' in line:
+                        entry['entry_type'] = 'series'
+                    elif '/movie/' in line:
+                        entry['entry_type'] = 'movie'
+                    
+                    count += 1
+                    yield entry
                 continue
             
-            # Look for EXTINF line
+            # Look for EXTINF line, other comments are skipped
             if line.startswith('#EXTINF'):
-                # Parse EXTINF metadata
-                entry = self._parse_extinf(line)
-                
-                # Next non-empty line should be the URL
-                i += 1
-                while i < len(lines) and not lines[i].strip():
-                    i += 1
-                
-                if i < len(lines):
-                    url = lines[i].strip()
-                    if url and not url.startswith('#'):
-                        entry['url'] = url
-                        
-                        # Refine entry_type based on URL pattern (more reliable for Xtream Codes)
-                        if '/series/' in url:
-                            entry['entry_type'] = 'series'
-                        elif '/movie/' in url:
-                            entry['entry_type'] = 'movie'
-                            
-                        entries.append(entry)
-            
-            i += 1
+                pending = self._parse_extinf(line)
         
-        logger.info(f"Parsed {len(entries)} entries from M3U content")
-        return entries
+        logger.info(f"Parsed {count} entries from M3U content")
+    
+    def parse_from_url(self, url: str) -> List[Dict]:
+        """Fetch and parse M3U from URL"""
+        return list(self.iter_url(url))
+    
+    def parse_from_file(self, file_path: str) -> List[Dict]:
+        """Parse M3U from file"""
+        return list(self.iter_file(file_path))
+    
+    def parse_content(self, content: str) -> List[Dict]:
+        """Parse M3U content and extract entries"""
+        return list(self.iter_lines(content.strip().split('\n')))
     
     def _parse_extinf(self, line: str) -> Dict:
-        """Parse EXTINF line and extract metadata"""
-        entry = {
-            'title': '',
-            'logo': None,
-            'group_title': None,
-            'tvg_id': None,
-            'tvg_name': None,
-            'entry_type': 'live'
-        }
-        
-        # Extract tvg-id
-        tvg_id_match = re.search(r'tvg-id="([^"]*)"', line)
-        if tvg_id_match:
-            entry['tvg_id'] = tvg_id_match.group(1)
-        
-        # Extract tvg-name
-        tvg_name_match = re.search(r'tvg-name="([^"]*)"', line)
-        if tvg_name_match:
-            entry['tvg_name'] = tvg_name_match.group(1)
-        
-        # Extract tvg-logo or logo
-        logo_match = re.search(r'tvg-logo="([^"]*)"', line)
-        if not logo_match:
-            logo_match = re.search(r'logo="([^"]*)"', line)
-        if logo_match:
-            entry['logo'] = logo_match.group(1)
-        
-        # Extract group-title
-        group_match = re.search(r'group-title="([^"]*)"', line)
-        if group_match:
-            entry['group_title'] = group_match.group(1)
-        
-        # Extract title (usually after the last comma)
-        title_match = re.search(r',(.+)$', line)
-        if title_match:
-            entry['title'] = title_match.group(1).strip()
+        """Parse EXTINF line and extract metadata.
+
+        One scan collects every key="value" attribute and stops at the first
+        comma outside quotes: the title is the rest of the line, so commas in
+        a quoted tvg-name no longer cut the title short. Where that changes the
+        title, the one earlier versions read (everything after the very first
+        comma) comes along as legacy_title, so entries cached under it keep it.
+        """
+        attributes = {}
+        title = ''
+        rest = None
+        for key, value, rest in _EXTINF_TOKEN.findall(line):
+            if key:
+                attributes[key] = value
+            else:
+                title = rest.strip()
+                break
         
         # Determine entry type
         # Default to live, will be refined based on URL in parse_content
-        entry['entry_type'] = 'live'
-        
+        entry = {
+            'title': title,
+            'logo': attributes['tvg-logo'] if 'tvg-logo' in attributes else attributes.get('logo'),
+            'group_title': attributes.get('group-title'),
+            'tvg_id': attributes.get('tvg-id'),
+            'tvg_name': attributes.get('tvg-name'),
+            'entry_type': 'live',
+            'attributes': attributes
+        }
+        first_comma = line.find(',')
+        if first_comma != -1 and (rest is None or first_comma != len(line) - len(rest) - 1):
+            entry['legacy_title'] = line[first_comma + 1:].strip()
         return entry
 
 
+def download_m3u(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 chunk_size: int = 64 * 1024) -> Dict:
+    """Conditional GET of a playlist into a temporary file.
+
+    The validators of the previous download go out as If-None-Match and
+    If-Modified-Since. A 304 comes back as status "not_modified" without a
+    file; otherwise the body is streamed to disk and digested on the way,
+    and the caller removes the file once it is parsed.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    started = time.monotonic()
+    with requests.get(url, timeout=30, stream=True, headers=headers) as response:
+        if response.status_code == 304:
+            # A 304 may leave the validators out, the ones sent still hold
+            return {
+                'status': 'not_modified',
+                'etag': response.headers.get('ETag', etag),
+                'last_modified': response.headers.get('Last-Modified', last_modified),
+                'bytes': 0,
+                'seconds': round(time.monotonic() - started, 3),
+            }
+        response.raise_for_status()
+        result = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        fd, path = tempfile.mkstemp(prefix='m3u-', suffix='.m3u')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException as e:
+            os.remove(path)
+            logger.error(f"Error fetching M3U from URL {url}: {e}")
+            raise
+        # No declared charset: the playlists we see are UTF-8
+        encoding = response.encoding or 'utf-8'
+    return {
+        **result,
+        'status': 'downloaded',
+        'path': path,
+        'digest': digest.hexdigest(),
+        'encoding': encoding,
+        'bytes': size,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def iter_m3u_url(url: str) -> Iterator[Dict]:
+    """Helper function to stream entries from an M3U URL"""
+    return M3UParser().iter_url(url)
+
+
+def iter_m3u_file(file_path: str, encoding: str = 'utf-8', errors: str = 'strict') -> Iterator[Dict]:
+    """Helper function to stream entries from an M3U file"""
+    return M3UParser().iter_file(file_path, encoding, errors)
+
+
 def parse_m3u_url(url: str) -> List[Dict]:
     """Helper function to parse M3U from URL"""
     parser = M3UParser()
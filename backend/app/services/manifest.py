@@ -0,0 +1,140 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import String, cast, exists
+from sqlalchemy.orm import Session
+from app.models.output_file import OutputFile
+from app.services.cache_store import bulk_upsert, bulk_delete_ids, ID_BATCH_SIZE
+
+SOURCE_XTREAM = "xtream"
+SOURCE_M3U = "m3u"
+
+def file_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def manifest_rows(
+    source_type: str,
+    source_id: int,
+    item_kind: str,
+    item_id,
+    files: Iterable[Tuple[str, bytes]],
+    parent_id=None,
+    now: Optional[datetime] = None,
+) -> List[Dict]:
+    """OutputFile rows for the (path, bytes) files generated for one item"""
+    now = now or datetime.utcnow()
+    return [{
+        'source_type': source_type,
+        'source_id': source_id,
+        'item_kind': item_kind,
+        'item_id': str(item_id),
+        'parent_id': str(parent_id) if parent_id is not None else None,
+        'path': path,
+        'digest': file_digest(data),
+        'size': len(data),
+        'updated_at': now
+    } for path, data in files]
+
+def existing_file_rows(
+    source_type: str,
+    source_id: int,
+    item_kind: str,
+    item_id,
+    paths: Iterable[str],
+    parent_id=None,
+    now: Optional[datetime] = None,
+) -> List[Dict]:
+    """OutputFile rows for files an earlier sync wrote and nothing recorded, content unknown"""
+    now = now or datetime.utcnow()
+    return [{
+        'source_type': source_type,
+        'source_id': source_id,
+        'item_kind': item_kind,
+        'item_id': str(item_id),
+        'parent_id': str(parent_id) if parent_id is not None else None,
+        'path': path,
+        'digest': None,
+        'size': None,
+        'updated_at': now
+    } for path in paths]
+
+def record_files(db: Session, rows: List[Dict]) -> int:
+    # A path written twice in one batch (same name generated twice) keeps its last row
+    rows = list({row['path']: row for row in rows}.values())
+    return bulk_upsert(db, OutputFile.__table__, rows, ['path'])
+
+def load_item_paths(db: Session, source_type: str, source_id: int, item_kind: str, ids: Iterable, by: str = "item_id") -> Dict[str, List[str]]:
+    """Recorded paths of these items (or, with by="parent_id", of their children), keyed by id"""
+    ids = [str(i) for i in ids]
+    column = getattr(OutputFile, by)
+    paths: Dict[str, List[str]] = {}
+    for i in range(0, len(ids), ID_BATCH_SIZE):
+        rows = db.query(column, OutputFile.path).filter(
+            OutputFile.source_type == source_type,
+            OutputFile.source_id == source_id,
+            OutputFile.item_kind == item_kind,
+            column.in_(ids[i:i + ID_BATCH_SIZE])
+        )
+        for key, path in rows:
+            paths.setdefault(key, []).append(path)
+    return paths
+
+def recorded_item_ids(db: Session, source_type: str, source_id: int, item_kind: str) -> Set[str]:
+    """Ids of the items of a kind with at least one recorded file"""
+    rows = db.query(OutputFile.item_id).filter(
+        OutputFile.source_type == source_type,
+        OutputFile.source_id == source_id,
+        OutputFile.item_kind == item_kind
+    ).distinct()
+    return {item_id for (item_id,) in rows}
+
+def recorded_clause(source_type: str, source_id: int, item_kind: str, id_column):
+    """EXISTS clause, true for rows whose id (id_column) has a file recorded under this item kind"""
+    return exists().where(
+        OutputFile.source_type == source_type,
+        OutputFile.source_id == source_id,
+        OutputFile.item_kind == item_kind,
+        OutputFile.item_id == cast(id_column, String)
+    )
+
+def count_source_files(db: Session, source_type: str, source_id: int) -> int:
+    return db.query(OutputFile.id).filter(OutputFile.source_type == source_type, OutputFile.source_id == source_id).count()
+
+def load_source_files(db: Session, source_type: str, source_id: int) -> Dict[str, Tuple[str, str, Optional[str]]]:
+    """Every recorded path of a source: {path: (item_kind, item_id, parent_id)}"""
+    rows = db.query(OutputFile.path, OutputFile.item_kind, OutputFile.item_id, OutputFile.parent_id).filter(
+        OutputFile.source_type == source_type,
+        OutputFile.source_id == source_id
+    )
+    return {path: (item_kind, item_id, parent_id) for path, item_kind, item_id, parent_id in rows}
+
+def recorded_paths_under(db: Session, roots: Iterable[str]) -> Set[str]:
+    """Recorded paths below any of these folders, whichever source wrote them"""
+    paths: Set[str] = set()
+    for root in roots:
+        prefix = os.path.join(os.path.normpath(root), "")
+        paths.update(os.path.normpath(path) for (path,) in db.query(OutputFile.path).filter(OutputFile.path.startswith(prefix, autoescape=True)))
+    return paths
+
+def forget_paths(db: Session, paths: Iterable[str]) -> int:
+    return bulk_delete_ids(db, OutputFile.__table__, list(paths), column="path")
+
+def forget_recorded_since(db: Session, source_type: str, source_id: int, item_kinds: Iterable[str],
+                          since: datetime) -> List[Tuple[str, str, Optional[str]]]:
+    """Drop the rows of these kinds recorded at or after since, returns their (item_kind, item_id, parent_id)"""
+    conditions = [
+        OutputFile.source_type == source_type,
+        OutputFile.source_id == source_id,
+        OutputFile.item_kind.in_(list(item_kinds)),
+        OutputFile.updated_at >= since,
+    ]
+    items = {tuple(row) for row in db.query(OutputFile.item_kind, OutputFile.item_id, OutputFile.parent_id).filter(*conditions)}
+    db.query(OutputFile).filter(*conditions).delete(synchronize_session=False)
+    return list(items)
+
+def forget_items(db: Session, source_type: str, source_id: int, item_kind: str, ids: Iterable, by: str = "item_id") -> int:
+    return bulk_delete_ids(
+        db, OutputFile.__table__, [str(i) for i in ids], column=by,
+        source_type=source_type, source_id=source_id, item_kind=item_kind
+    )
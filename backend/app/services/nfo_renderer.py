@@ -0,0 +1,218 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+DEFAULT_PREFIX_REGEX = r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)'
+
+_DEFAULT_PREFIX = re.compile(DEFAULT_PREFIX_REGEX)
+_TRAILING_YEAR = re.compile(r'[_\s](\d{4})$')
+_GENRE_SPLIT = re.compile(r'[,/]')
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n'
+_NO_TMDB = ('0', 'None', 'null', '')
+
+def escape_xml(text) -> str:
+    """Escape XML special characters"""
+    if not text:
+        return ''
+    # Chained str.replace runs in C and beats a one-pass str.translate, whose
+    # multi-character mapping goes through a dict lookup per character
+    return (str(text)
+            .replace('&', '&amp;')
+            .replace('<', '&lt;')
+            .replace('>', '&gt;')
+            .replace('"', '&quot;')
+            .replace("'", '&apos;'))
+
+# Genre, actor and show names repeat across a whole catalog, escape each once (str arguments only)
+escape_xml_cached = lru_cache(maxsize=8192)(escape_xml)
+
+class NfoRenderer:
+    """Kodi NFO rendering with the title rules of one sync compiled up front.
+
+    Output is built from a list of parts joined once, the same bytes the
+    original string concatenation produced.
+    """
+
+    def __init__(self, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False):
+        self.prefix = _DEFAULT_PREFIX
+        if prefix_regex:
+            try:
+                self.prefix = re.compile(prefix_regex)
+            except re.error:
+                pass
+        self.format_date = format_date
+        self.clean_name = clean_name
+
+    def clean_title(self, title: str) -> str:
+        # Strip language prefix
+        title = self.prefix.sub('', title)
+        # Format date at end
+        if self.format_date:
+            title = _TRAILING_YEAR.sub(r' (\1)', title)
+        if self.clean_name:
+            title = title.replace('_', ' ')
+        return title
+
+    @staticmethod
+    def _tmdb(parts: list, tmdb_id):
+        if tmdb_id and str(tmdb_id) not in _NO_TMDB:
+            parts.append(f'  <tmdbid>{tmdb_id}</tmdbid>\n  <uniqueid type="tmdb" default="true">{tmdb_id}</uniqueid>\n')
+
+    @staticmethod
+    def _year(parts: list, year):
+        if year:
+            year_str = str(year)[:4]
+            parts.append(f'  <year>{year_str}</year>\n  <premiered>{year_str}-01-01</premiered>\n')
+
+    @staticmethod
+    def _rating(parts: list, rating, five_based):
+        if not rating:
+            return
+        try:
+            r_val = float(rating)
+        except (ValueError, TypeError):
+            return
+        # If it was 5-based, convert
+        if five_based:
+            r_val *= 2
+        parts.append(f'  <ratings>\n    <rating name="tmdb" default="true"><value>{r_val:.1f}</value></rating>\n  </ratings>\n')
+        try:
+            parts.append(f'  <userrating>{int(round(r_val))}</userrating>\n')
+        except ValueError:
+            pass # NaN rating: the ratings block stays, without a user rating
+
+    @staticmethod
+    def _people(parts: list, genre, director, cast_list):
+        if genre:
+            for g in _GENRE_SPLIT.split(str(genre)):
+                g_str = g.strip()
+                if g_str:
+                    parts.append(f'  <genre>{escape_xml_cached(g_str)}</genre>\n')
+        if director:
+            parts.append(f'  <director>{escape_xml(director)}</director>\n')
+        if cast_list:
+            for actor in str(cast_list).split(','):
+                actor_name = actor.strip()
+                if actor_name:
+                    parts.append(f'  <actor><name>{escape_xml_cached(actor_name)}</name></actor>\n')
+
+    @staticmethod
+    def _artwork(parts: list, data: dict, cover):
+        backdrop_path = data.get('backdrop_path', [])
+        fanart = backdrop_path[0] if isinstance(backdrop_path, list) and backdrop_path else ''
+        if cover:
+            parts.append(f'  <thumb>{cover}</thumb>\n')
+        if fanart:
+            parts.append(f'  <fanart><thumb>{fanart}</thumb></fanart>\n')
+        elif cover:
+            parts.append(f'  <fanart><thumb>{cover}</thumb></fanart>\n')
+
+    def movie(self, movie_data: dict) -> str:
+        tmdb_id = movie_data.get('tmdb') or movie_data.get('tmdb_id', '')
+        # Use o_name as title if available, otherwise name
+        title = self.clean_title(movie_data.get('o_name') or movie_data.get('name', 'Unknown'))
+        plot = movie_data.get('plot') or movie_data.get('description', '')
+        duration = movie_data.get('duration') or movie_data.get('episode_run_time', '')
+        trailer = movie_data.get('youtube_trailer', '')
+        cover = movie_data.get('movie_image') or movie_data.get('cover_big') or movie_data.get('stream_icon') or movie_data.get('backdrop_path_original', '')
+
+        parts = [
+            _XML_HEADER, '<movie>\n',
+            f'  <title>{escape_xml(title)}</title>\n',
+            f'  <originaltitle>{escape_xml(movie_data.get("o_name", ""))}</originaltitle>\n',
+        ]
+        self._tmdb(parts, tmdb_id)
+        if plot:
+            parts.append(f'  <plot>{escape_xml(plot)}</plot>\n  <outline>{escape_xml(plot[:200])}</outline>\n')
+        self._year(parts, movie_data.get('year') or movie_data.get('releasedate', ''))
+        self._rating(parts, movie_data.get('rating') or movie_data.get('rating_5based', ''), movie_data.get('rating_5based'))
+        self._people(parts, movie_data.get('genre', ''), movie_data.get('director', ''), movie_data.get('cast') or movie_data.get('actors', ''))
+
+        if duration:
+            try:
+                if ':' in str(duration):
+                    hours, minutes = str(duration).split(':')[:2]
+                    total_mins = int(hours) * 60 + int(minutes)
+                else:
+                    total_mins = int(duration)
+                parts.append(f'  <runtime>{total_mins}</runtime>\n')
+            except (ValueError, TypeError):
+                pass
+
+        # Stream Details (Video/Audio), usually from detailed info 'info' dict
+        info = movie_data.get('info', {})
+        parts.append(f'  <fileinfo>\n    <streamdetails>\n      <video>\n        <codec>{escape_xml(movie_data.get("container_extension", ""))}</codec>\n')
+        if info.get('bitrate'):
+            parts.append(f'        <bitrate>{info.get("bitrate")}</bitrate>\n')
+        parts.append('      </video>\n')
+        if info.get('audio'):
+            parts.append(f'      <audio>\n        <codec>{escape_xml(info.get("audio", {}).get("codec", ""))}</codec>\n      </audio>\n')
+        parts.append('    </streamdetails>\n  </fileinfo>\n')
+
+        if trailer:
+            parts.append(f'  <trailer>plugin://plugin.video.youtube/?action=play_video&amp;videoid={trailer}</trailer>\n')
+        self._artwork(parts, movie_data, cover)
+
+        mpaa = movie_data.get('mpaa') or info.get('mpaa')
+        if mpaa:
+            parts.append(f'  <mpaa>{escape_xml(mpaa)}</mpaa>\n')
+
+        parts.append('</movie>')
+        return ''.join(parts)
+
+    def show(self, series_data: dict) -> str:
+        tmdb_id = series_data.get('tmdb') or series_data.get('tmdb_id', '')
+        title = self.clean_title(series_data.get('o_name') or series_data.get('name', 'Unknown'))
+        plot = series_data.get('plot') or series_data.get('description', '')
+        cover = series_data.get('cover') or series_data.get('cover_big') or series_data.get('stream_icon') or series_data.get('backdrop_path_original', '')
+
+        parts = [_XML_HEADER, '<tvshow>\n', f'  <title>{escape_xml(title)}</title>\n']
+        self._tmdb(parts, tmdb_id)
+        if plot:
+            parts.append(f'  <plot>{escape_xml(plot)}</plot>\n')
+        self._year(parts, series_data.get('year') or series_data.get('releaseDate', ''))
+        self._rating(parts, series_data.get('rating') or series_data.get('rating_5based', ''), series_data.get('rating_5based'))
+        self._people(parts, series_data.get('genre', ''), series_data.get('director', ''), series_data.get('cast') or series_data.get('actors', ''))
+        self._artwork(parts, series_data, cover)
+        parts.append('</tvshow>')
+        return ''.join(parts)
+
+    def episode(self, episode_data: dict, series_name: str, season_num: int, episode_num: int) -> str:
+        title = episode_data.get('title', '') or f"Episode {episode_num}"
+        plot = episode_data.get('info', {}).get('plot') or episode_data.get('plot', '')
+        duration = episode_data.get('info', {}).get('duration') or episode_data.get('duration', '')
+
+        parts = [
+            _XML_HEADER, '<episodedetails>\n',
+            f'  <title>{escape_xml(title)}</title>\n',
+            f'  <showtitle>{escape_xml_cached(series_name)}</showtitle>\n',
+            f'  <season>{season_num}</season>\n',
+            f'  <episode>{episode_num}</episode>\n',
+        ]
+        if plot:
+            parts.append(f'  <plot>{escape_xml(plot)}</plot>\n')
+
+        # Parse duration "HH:MM:SS" -> minutes
+        if duration:
+            try:
+                total_mins = 0
+                if ':' in str(duration):
+                    time_parts = str(duration).split(':')
+                    if len(time_parts) == 3:
+                        total_mins = int(time_parts[0]) * 60 + int(time_parts[1])
+                    elif len(time_parts) == 2:
+                        total_mins = int(time_parts[0])
+                elif str(duration).isdigit():
+                    total_mins = int(duration)
+                if total_mins > 0:
+                    parts.append(f'  <runtime>{total_mins}</runtime>\n')
+            except (ValueError, TypeError):
+                pass
+
+        info = episode_data.get('info', {})
+        parts.append(f'  <fileinfo>\n    <streamdetails>\n      <video>\n        <codec>{escape_xml(episode_data.get("container_extension", ""))}</codec>\n')
+        if info.get('bitrate'):
+            parts.append(f'        <bitrate>{info.get("bitrate")}</bitrate>\n')
+        parts.append('      </video>\n    </streamdetails>\n  </fileinfo>\n</episodedetails>')
+        return ''.join(parts)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+class Stage:
+    def __init__(self, name: str, func: Callable[[Any], Awaitable[Any]], concurrency: int = 1, fatal: bool = False):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.fatal = fatal
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+class Pipeline:
+    """Items flow through async stages joined by bounded queues.
+
+    Each stage runs its own pool of workers, so one slow item only occupies
+    a single worker of its stage instead of holding back a whole batch. A
+    stage returning None drops the item; exceptions are logged and drop it too,
+    except in a fatal stage (e.g. the one committing results), whose first
+    error stops the whole pipeline and is raised from run().
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.stages: List[Stage] = []
+
+    def add_stage(self, name: str, func: Callable[[Any], Awaitable[Any]], concurrency: int = 1,
+                  fatal: bool = False) -> "Pipeline":
+        self.stages.append(Stage(name, func, concurrency, fatal))
+        return self
+
+    async def _worker(self, stage: Stage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]):
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            try:
+                result = await stage.func(item)
+            except Exception as e:
+                stage.errors += 1
+                logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                if stage.fatal:
+                    raise
+                continue
+            stage.processed += 1
+            if result is None:
+                stage.dropped += 1
+            elif outbox is not None:
+                await outbox.put(result)
+
+    async def _run_stage(self, stage: Stage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], downstream: int):
+        await asyncio.gather(*[self._worker(stage, inbox, outbox) for _ in range(stage.concurrency)])
+        if outbox is not None:
+            for _ in range(downstream):
+                await outbox.put(_DONE)
+
+    async def _feed(self, source: AsyncIterable, inbox: asyncio.Queue):
+        async for item in source:
+            await inbox.put(item)
+        for _ in range(self.stages[0].concurrency):
+            await inbox.put(_DONE)
+
+    async def run(self, source: AsyncIterable):
+        if not self.stages:
+            return
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        tasks = []
+        for index, stage in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else None
+            downstream = self.stages[index + 1].concurrency if outbox is not None else 0
+            tasks.append(asyncio.create_task(self._run_stage(stage, queues[index], outbox, downstream)))
+        tasks.append(asyncio.create_task(self._feed(source, queues[0])))
+
+        try:
+            # A failed stage leaves the ones upstream blocked on a full queue: stop at the first error
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            stage.name: {"processed": stage.processed, "dropped": stage.dropped, "errors": stage.errors}
+            for stage in self.stages
+        }
+
+class CommitBatcher:
+    """Collects results and flushes them once enough have piled up or enough time has passed"""
+
+    def __init__(self, flush: Callable[[list], None], batch_size: int = 200, interval: float = 5.0):
+        self.flush_func = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending: list = []
+        self.flushes = 0
+        self._last_flush = time.monotonic()
+
+    async def add(self, item: Any):
+        self.pending.append(item)
+        if len(self.pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.flush_func(batch)
+            self.flushes += 1
+        self._last_flush = time.monotonic()
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter for requests against a single provider.
+
+    The limit grows by roughly one slot per round of healthy responses
+    (additive increase) and is multiplied by ``backoff`` when the provider
+    throttles or fails (multiplicative decrease).
+    """
+
+    def __init__(
+        self,
+        initial: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 50,
+        latency_target: float = 2.0,
+        backoff: float = 0.5,
+        max_history: int = 200,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.max_history = max_history
+        self._condition: Optional[asyncio.Condition] = None
+        self.reset(initial)
+
+    def reset(self, initial: int):
+        """Start over from a new initial limit (e.g. the configured parallelism)"""
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.peak_limit = int(self.limit)
+        self._started = time.monotonic()
+        self._last_decrease = 0.0
+        self.history: List[List[float]] = [[0.0, int(self.limit)]]
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the event loop running the sync
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            while self.in_flight >= self.current_limit:
+                await condition.wait()
+            self.in_flight += 1
+
+    async def release(self, latency: float, throttled: bool = False):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            self.requests += 1
+            previous = self.current_limit
+            now = time.monotonic()
+
+            if throttled:
+                self.throttled += 1
+                # Requests already in flight fail together, only back off once per latency window
+                if now - self._last_decrease > max(latency, 1.0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            if self.current_limit != previous:
+                self.peak_limit = max(self.peak_limit, self.current_limit)
+                self.history.append([round(now - self._started, 2), self.current_limit])
+                if len(self.history) > self.max_history:
+                    # Keep the first sample so the starting point stays visible
+                    del self.history[1]
+                if self.current_limit < previous:
+                    logger.info(f"Provider throttling, concurrency reduced to {self.current_limit}")
+            condition.notify_all()
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": self.current_limit,
+            "peak_limit": self.peak_limit,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "history": list(self.history),
+        }
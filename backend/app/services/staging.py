@@ -0,0 +1,98 @@
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def versions_dir_for(live_dir: str) -> str:
+    """Hidden folder next to the live path holding its published versions"""
+    parent, name = os.path.split(os.path.normpath(live_dir))
+    return os.path.join(parent, f".{name}.versions")
+
+def clear_output_dir(live_dir: str):
+    """Remove a live output folder, published versions included, and leave an empty folder behind"""
+    if os.path.islink(live_dir):
+        os.unlink(live_dir)
+        shutil.rmtree(versions_dir_for(live_dir), ignore_errors=True)
+    elif os.path.isdir(live_dir):
+        shutil.rmtree(live_dir)
+    os.makedirs(live_dir, exist_ok=True)
+
+class StagedTree:
+    """Next version of an output tree, built beside the live one and published in one rename.
+
+    The live path becomes a relative symlink into a hidden versions folder.
+    prepare() hardlinks the current version into a fresh one, so only files
+    the sync really changes cost a write (writes replace files through a
+    rename and never touch the shared inode). publish() swaps the symlink
+    with os.replace, the media server sees the old tree until that instant.
+    The very first publish of a plain folder needs two renames, so the live
+    path is briefly absent once.
+    """
+
+    def __init__(self, live_dir: str):
+        self.live_dir = os.path.normpath(live_dir)
+        self.versions_dir = versions_dir_for(live_dir)
+        self.root: Optional[str] = None
+        self.published = False
+        self.stats = {"linked": 0, "prepare_seconds": 0.0, "publish_seconds": 0.0}
+
+    def _link(self, src: str, dst: str):
+        os.link(src, dst)
+        self.stats["linked"] += 1
+
+    def prepare(self) -> str:
+        started = time.monotonic()
+        os.makedirs(self.versions_dir, exist_ok=True)
+        version = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.root = os.path.join(self.versions_dir, version)
+        if os.path.isdir(self.live_dir):
+            # Leftover temp files of an interrupted write are not carried over
+            shutil.copytree(self.live_dir, self.root, symlinks=True, copy_function=self._link,
+                            ignore=shutil.ignore_patterns(".*.tmp"))
+        else:
+            os.makedirs(self.root)
+        self.stats["prepare_seconds"] = round(time.monotonic() - started, 3)
+        return self.root
+
+    def publish(self):
+        if self.root is None or self.published:
+            return
+        started = time.monotonic()
+        parent = os.path.dirname(self.live_dir)
+        tmp_link = os.path.join(parent, f".{os.path.basename(self.live_dir)}.{uuid.uuid4().hex}.link")
+        # Relative, so the link still resolves where the output folder is mounted elsewhere (media server container)
+        os.symlink(os.path.relpath(self.root, parent), tmp_link)
+        try:
+            if os.path.isdir(self.live_dir) and not os.path.islink(self.live_dir):
+                # First staged sync: the plain folder is moved aside, it is cleaned up with the other versions
+                os.rename(self.live_dir, os.path.join(self.versions_dir, f"{os.path.basename(self.root)}-previous"))
+            os.replace(tmp_link, self.live_dir)
+        except BaseException:
+            try:
+                os.unlink(tmp_link)
+            except OSError:
+                pass
+            raise
+        self.published = True
+        self._remove_other_versions()
+        self.stats["publish_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Published {self.live_dir} -> {self.root}")
+
+    def _remove_other_versions(self):
+        for entry in os.scandir(self.versions_dir):
+            if entry.path != self.root:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def discard(self):
+        """Drop an unpublished version (failed sync), the live tree stays as it was"""
+        if self.root is not None and not self.published:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+GENERATED_EXTENSIONS = (".strm", ".nfo")
+
+def _scan_dir(path: str, extensions: Tuple[str, ...]) -> Tuple[List[str], List[str], bool]:
+    """One directory level: (matching files, subdirectories, failed)"""
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # Symlinked folders are not followed, a link loop can't run the scan forever
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.name.endswith(extensions):
+                        files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning(f"Could not scan {path}: {e}")
+        return files, dirs, True
+    return files, dirs, False
+
+class TreeScan:
+    """Walk output trees with os.scandir on a pool of threads.
+
+    Every directory is one job, so wide category folders and deep series
+    folders spread over all workers. Only files with the given extensions
+    are collected.
+    """
+
+    def __init__(self, workers: int = 8, extensions: Tuple[str, ...] = GENERATED_EXTENSIONS,
+                 progress: Optional[Callable[[Dict], None]] = None, progress_every: int = 500):
+        self.workers = max(1, workers)
+        self.extensions = extensions
+        self.progress = progress
+        self.progress_every = progress_every
+        self.stats = {"dirs": 0, "files": 0, "errors": 0, "elapsed": 0.0, "files_per_sec": 0.0}
+
+    def _update_rate(self, started: float):
+        elapsed = time.monotonic() - started
+        self.stats["elapsed"] = round(elapsed, 3)
+        self.stats["files_per_sec"] = round(self.stats["files"] / elapsed, 1) if elapsed > 0 else 0.0
+
+    def run(self, roots: Iterable[str]) -> Set[str]:
+        started = time.monotonic()
+        found: Set[str] = set()
+        reported = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tree-scan") as pool:
+            pending = {pool.submit(_scan_dir, root, self.extensions) for root in roots if os.path.isdir(root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, dirs, failed = future.result()
+                    self.stats["dirs"] += 1
+                    self.stats["errors"] += failed
+                    self.stats["files"] += len(files)
+                    found.update(files)
+                    pending.update(pool.submit(_scan_dir, path, self.extensions) for path in dirs)
+
+                if self.progress and self.stats["dirs"] - reported >= self.progress_every:
+                    reported = self.stats["dirs"]
+                    self._update_rate(started)
+                    self.progress(dict(self.stats))
+        self._update_rate(started)
+        return found
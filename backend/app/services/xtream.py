@@ -1,17 +1,166 @@
+import asyncio
+import json
+import time
 import httpx
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Iterable
 from tenacity import retry, stop_after_attempt, wait_exponential
+from app.services.rate_limiter import AdaptiveLimiter
 import logging
 
 logger = logging.getLogger(__name__)
 
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = " \t\r\n"
+_JSON_DELIMITERS = _JSON_WHITESPACE + ",]"
+
+async def iter_json_array(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """Incrementally decode a top-level JSON array, yielding one element at a time.
+
+    Only the element being decoded is buffered, so memory stays bounded by the
+    size of a single item instead of the whole response body.
+    """
+    chunk_iter = chunks.__aiter__()
+    buf = ""
+    pos = 0
+    eof = False
+    in_array = False
+
+    async def read_more() -> bool:
+        nonlocal buf, pos, eof
+        try:
+            chunk = await chunk_iter.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            return False
+        # Drop the consumed prefix so the buffer never grows past one item
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buf) and buf[pos] in _JSON_WHITESPACE:
+            pos += 1
+        if pos >= len(buf):
+            if eof or not await read_more():
+                raise ValueError("Unexpected end of JSON array" if in_array else "Empty JSON response")
+            continue
+
+        char = buf[pos]
+        if not in_array:
+            if char != "[":
+                # Panels answer with an object (or garbage) on errors
+                while await read_more():
+                    pass
+                payload = json.loads(buf[pos:])
+                raise ValueError(f"Expected a JSON array, got {type(payload).__name__}")
+            in_array = True
+            pos += 1
+            continue
+
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+
+        try:
+            item, end = _JSON_DECODER.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof or not await read_more():
+                raise
+            continue
+        if not eof and (end >= len(buf) or buf[end] not in _JSON_DELIMITERS):
+            # A scalar cut at a chunk boundary decodes as a shorter value
+            if await read_more():
+                continue
+        pos = end
+        yield item
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 class XtreamClient:
-    def __init__(self, url: str, username: str, password: str):
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeout: float = 60.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
         self.base_url = url.rstrip("/")
         self.username = username
         self.password = password
         self.api_url = f"{self.base_url}/player_api.php"
 
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        # Adapts the number of concurrent requests to how the panel copes
+        self.limiter = limiter or AdaptiveLimiter()
+
+        # Per-client counters, used to confirm that connections are reused
+        self.requests_made = 0
+        self.connections_opened = 0
+
+    async def __aenter__(self) -> "XtreamClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool is bound to the event loop running the sync
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=self.limits,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def close(self):
+        """Close the pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _trace(self, event_name: str, info: Dict):
+        # httpcore emits this once per new TCP connection, never for a reused one
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    @staticmethod
+    def _is_throttled(error: Exception) -> bool:
+        """Whether an error means the panel is overloaded (429/5xx, timeouts, dropped connections)"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code == 429 or status_code >= 500
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+    def get_connection_stats(self) -> Dict[str, int]:
+        return {
+            "requests_made": self.requests_made,
+            "connections_opened": self.connections_opened,
+            "connections_reused": max(self.requests_made - self.connections_opened, 0),
+        }
+
     def _get_params(self, action: str, **kwargs) -> Dict[str, str]:
         params = {
             "username": self.username,
@@ -23,18 +172,98 @@ class XtreamClient:
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def _request(self, action: str, **kwargs) -> Any:
-        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
-            params = self._get_params(action, **kwargs)
+        client = self._get_client()
+        params = self._get_params(action, **kwargs)
+        await self.limiter.acquire()
+        started = time.monotonic()
+        throttled = False
+        try:
+            self.requests_made += 1
+            response = await client.get(self.api_url, params=params, extensions={"trace": self._trace})
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            throttled = self._is_throttled(e)
+            logger.error(f"HTTP error for {action}: {e}")
+            raise
+        except Exception as e:
+            throttled = self._is_throttled(e)
+            logger.error(f"Error fetching {action}: {e}")
+            raise
+        finally:
+            await self.limiter.release(time.monotonic() - started, throttled)
+
+    async def _stream_list(self, action: str, **kwargs) -> AsyncIterator[Dict]:
+        """Stream a listing action, yielding items as they are decoded.
+
+        Failures are retried like _request, but only until the first item has
+        been yielded; after that the error is propagated to the caller.
+        """
+        params = self._get_params(action, **kwargs)
+        attempts = 3
+        for attempt in range(1, attempts + 1):
+            yielded = False
+            await self.limiter.acquire()
+            started = time.monotonic()
+            latency = None
+            throttled = False
             try:
-                response = await client.get(self.api_url, params=params)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                logger.error(f"HTTP error for {action}: {e}")
-                raise
+                client = self._get_client()
+                self.requests_made += 1
+                async with client.stream("GET", self.api_url, params=params, extensions={"trace": self._trace}) as response:
+                    # Judge the panel by its time to first byte, not by the body transfer
+                    latency = time.monotonic() - started
+                    response.raise_for_status()
+                    async for item in iter_json_array(response.aiter_text()):
+                        yielded = True
+                        yield item
+                return
             except Exception as e:
-                logger.error(f"Error fetching {action}: {e}")
-                raise
+                throttled = self._is_throttled(e)
+                if yielded or attempt == attempts:
+                    logger.error(f"Error streaming {action}: {e}")
+                    raise
+                logger.warning(f"Error streaming {action} (attempt {attempt}/{attempts}): {e}")
+            finally:
+                await self.limiter.release(latency if latency is not None else time.monotonic() - started, throttled)
+            await asyncio.sleep(min(4 * 2 ** (attempt - 1), 10))
+
+    async def _stream_categories(self, action: str, category_ids: Iterable[str], id_key: str) -> AsyncIterator[Dict]:
+        """Stream a listing for several categories concurrently and merge the results.
+
+        Items listed under more than one category are yielded once.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        done = object()
+
+        async def fetch(category_id: str):
+            try:
+                async for item in self._stream_list(action, category_id=category_id):
+                    await queue.put(item)
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        tasks = [asyncio.create_task(fetch(category_id)) for category_id in category_ids]
+        seen = set()
+        pending = len(tasks)
+        try:
+            while pending:
+                item = await queue.get()
+                if item is done:
+                    pending -= 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                item_id = item.get(id_key)
+                if item_id in seen:
+                    continue
+                seen.add(item_id)
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def get_vod_categories(self) -> List[Dict]:
         return await self._request("get_vod_categories")
@@ -45,6 +274,15 @@ class XtreamClient:
             kwargs["category_id"] = category_id
         return await self._request("get_vod_streams", **kwargs)
 
+    def iter_vod_streams(self, category_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        kwargs = {}
+        if category_id:
+            kwargs["category_id"] = category_id
+        return self._stream_list("get_vod_streams", **kwargs)
+
+    def iter_vod_streams_for_categories(self, category_ids: Iterable[str]) -> AsyncIterator[Dict]:
+        return self._stream_categories("get_vod_streams", category_ids, "stream_id")
+
     async def get_series_categories(self) -> List[Dict]:
         return await self._request("get_series_categories")
 
@@ -54,6 +292,15 @@ class XtreamClient:
             kwargs["category_id"] = category_id
         return await self._request("get_series", **kwargs)
 
+    def iter_series(self, category_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        kwargs = {}
+        if category_id:
+            kwargs["category_id"] = category_id
+        return self._stream_list("get_series", **kwargs)
+
+    def iter_series_for_categories(self, category_ids: Iterable[str]) -> AsyncIterator[Dict]:
+        return self._stream_categories("get_series", category_ids, "series_id")
+
     async def get_series_info(self, series_id: str) -> Dict:
         return await self._request("get_series_info", series_id=series_id)
 
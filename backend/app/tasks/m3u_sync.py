@@ -1,4 +1,5 @@
 from app.core.celery_app import celery_app
+from sqlalchemy import insert, update, select, bindparam
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.m3u_source import M3USource, SourceType
@@ -6,15 +7,20 @@ from app.models.m3u_entry import M3UEntry, EntryType
 from app.models.m3u_selection import M3USelection, SelectionType
 from app.models.m3u_sync_state import M3USyncState
 from app.models.settings import SettingsModel
-from app.services.m3u_parser import parse_m3u_url, parse_m3u_file
-from app.services.file_manager import FileManager
+from app.services.m3u_parser import download_m3u, iter_m3u_file
+from app.services.file_manager import FileManager, sanitize_m3u_name
+from app.services.manifest import SOURCE_M3U, manifest_rows, record_files, load_source_files, count_source_files, forget_paths
+from app.services.cache_store import bulk_delete_ids
+from app.core.config import settings as app_settings
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Set, Optional, Tuple
+import os
 import shutil
 import hashlib
 import asyncio
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -22,17 +28,14 @@ logger = logging.getLogger(__name__)
 CONTENT_TYPE_MOVIES = "movies"
 CONTENT_TYPE_SERIES = "series"
 STRM_EXTENSION = ".strm"
+# Manifest item kind of each content type
+ITEM_KINDS = {CONTENT_TYPE_MOVIES: "m3u_movie", CONTENT_TYPE_SERIES: "m3u_series"}
 
 
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
-def sanitize_name(name: str) -> str:
-    """Sanitize name for filesystem compatibility"""
-    return "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).strip()
-
-
 def calculate_file_hash(file_path: str) -> Optional[str]:
     """Calculate MD5 hash of file for change detection"""
     try:
@@ -92,7 +95,7 @@ def cleanup_deselected_groups(
         for group_dir in content_dir.iterdir():
             if group_dir.is_dir():
                 is_selected = any(
-                    sanitize_name(g) == group_dir.name 
+                    sanitize_m3u_name(g) == group_dir.name 
                     for g in selected_groups
                 )
                 
@@ -108,6 +111,151 @@ def cleanup_deselected_groups(
     return deleted_count
 
 
+def stale_recorded_files(recorded: dict, generated: Set[str], content_type: str, sync_types: Optional[list]) -> list:
+    """Recorded files of a content type this run did not generate (deselected groups, entries gone from the playlist)"""
+    if sync_types and content_type not in sync_types:
+        return []
+    item_kind = ITEM_KINDS[content_type]
+    return [path for path, (kind, _, _) in recorded.items() if kind == item_kind and path not in generated]
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b("\x1f".join("" if part is None else str(part) for part in parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def generation_digest(db: Session, source_id: int, selected_groups: list, naming: tuple,
+                      output_dirs: tuple, sync_types: Optional[list]) -> str:
+    """Everything the generated files depend on besides the entries themselves.
+
+    The recorded file count changes whenever files are forgotten outside a sync
+    (sweep repair, deleted output), which then has to write them again.
+    """
+    selection = sorted((sel.group_title, sel.selection_type.value) for sel in selected_groups)
+    return _digest(selection, naming, output_dirs, sorted(sync_types or []), count_source_files(db, SOURCE_M3U, source_id))
+
+
+def entry_row(source_id: int, entry_data: dict) -> Optional[dict]:
+    """m3u_entries row for a parsed movie or series entry, None for live channels"""
+    # Determine entry type
+    entry_type_str = entry_data.get('entry_type', 'live')
+    if entry_type_str == 'movie':
+        entry_type = EntryType.MOVIE
+    elif entry_type_str == 'series':
+        entry_type = EntryType.SERIES
+    else:
+        # Skip LIVE entries entirely
+        return None
+    
+    row = {
+        'm3u_source_id': source_id,
+        'title': entry_data.get('title', 'Unknown'),
+        'url': entry_data['url'],
+        'group_title': entry_data.get('group_title'),
+        'logo': entry_data.get('logo'),
+        'tvg_id': entry_data.get('tvg_id'),
+        'tvg_name': entry_data.get('tvg_name'),
+        'entry_type': entry_type
+    }
+    row['content_hash'] = _digest(row['group_title'], row['logo'], row['tvg_id'], row['tvg_name'], entry_type.value)
+    return row
+
+
+def assign_entry_key(row: dict, seen: Set[str]) -> str:
+    """Key of url + title; a repeat of the same pair in the playlist gets its occurrence number mixed in"""
+    key = _digest(row['url'], row['title'])
+    occurrence = 0
+    while key in seen:
+        occurrence += 1
+        key = _digest(row['url'], row['title'], occurrence)
+    seen.add(key)
+    row['entry_key'] = key
+    return key
+
+
+def insert_entries(db: Session, rows: list) -> int:
+    """INSERT a batch of entry rows in one Core executemany, no ORM objects or identity map involved"""
+    if rows:
+        db.execute(insert(M3UEntry.__table__), rows)
+    return len(rows)
+
+
+def update_entries(db: Session, rows: list) -> int:
+    """UPDATE a batch of existing entries by id in one executemany"""
+    if rows:
+        table = M3UEntry.__table__
+        columns = [key for key in rows[0] if key != '_id']
+        db.execute(
+            update(table).where(table.c.id == bindparam('_id')).values({column: bindparam(column) for column in columns}),
+            rows
+        )
+    return len(rows)
+
+
+def reconcile_entries(db: Session, source_id: int, entries, batch_size: int) -> Tuple[dict, Set[str]]:
+    """Bring a source's cached entries in line with a parsed playlist: insert, update and delete, never rewrite.
+
+    Ids of unchanged entries survive the reparse. Returns the counts and the keys of the
+    entries inserted or updated, the only ones whose files need writing again.
+
+    Entries cached under the title older parsers read from an EXTINF line with a comma
+    in a quoted attribute keep that title (and so their key and file names); only
+    entries new to the cache get the corrected one.
+    """
+    table = M3UEntry.__table__
+    existing = {}
+    stale_ids = []
+    for entry_id, key, content_hash in db.execute(
+        select(table.c.id, table.c.entry_key, table.c.content_hash).where(table.c.m3u_source_id == source_id)
+    ):
+        if key is None:
+            # Cached before entries had a key, replaced by a keyed row
+            stale_ids.append(entry_id)
+        else:
+            existing[key] = (entry_id, content_hash)
+
+    stats = {"parsed": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "batches": 0}
+    changed_keys: Set[str] = set()
+    seen: Set[str] = set()
+    inserts, updates = [], []
+
+    def flush():
+        stats["inserted"] += insert_entries(db, inserts)
+        stats["updated"] += update_entries(db, updates)
+        stats["batches"] += 1
+        inserts.clear()
+        updates.clear()
+
+    for entry_data in entries:
+        stats["parsed"] += 1
+        row = entry_row(source_id, entry_data)
+        if row is None:
+            continue
+        legacy_title = entry_data.get('legacy_title')
+        if legacy_title is not None and _digest(row['url'], legacy_title) in existing:
+            row['title'] = legacy_title
+        key = assign_entry_key(row, seen)
+        current = existing.pop(key, None)
+        if current is None:
+            inserts.append(row)
+            changed_keys.add(key)
+        elif current[1] != row['content_hash']:
+            # Title and url are the key, everything else may change in place
+            updates.append({'_id': current[0], **{column: row[column] for column in
+                            ('group_title', 'logo', 'tvg_id', 'tvg_name', 'entry_type', 'content_hash')}})
+            changed_keys.add(key)
+        else:
+            stats["unchanged"] += 1
+        if len(inserts) + len(updates) >= batch_size:
+            flush()
+    if inserts or updates:
+        flush()
+
+    # Whatever is left was not in the playlist any more
+    stale_ids += [entry_id for entry_id, _ in existing.values()]
+    stats["deleted"] = bulk_delete_ids(db, table, stale_ids)
+    return stats, changed_keys
+
+
 # ============================================================================
 # Main Sync Task
 # ============================================================================
@@ -116,6 +264,7 @@ def cleanup_deselected_groups(
 def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool = False):
     """Sync M3U source - parse and generate STRM files"""
     db = SessionLocal()
+    fm = None
     try:
         # Get M3U source
         source = db.query(M3USource).filter(M3USource.id == source_id).first()
@@ -132,7 +281,7 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         logger.info(f"Starting M3U sync for source: {source.name}")
         
         # Initialize FileManager
-        fm = FileManager(source.output_dir)
+        fm = FileManager(source.output_dir, app_settings.FILE_IO_WORKERS, app_settings.FILE_WRITE_BATCH_SIZE)
         
         # OPTIMIZATION: Check if any groups are selected BEFORE parsing M3U
         selected_groups = db.query(M3USelection).filter(
@@ -161,6 +310,7 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
                     # RESET counters at the start of each sync
                     state.items_added = 0
                     state.items_deleted = 0
+                    state.stats = {}
                     sync_states.append(state)
         
         db.commit()
@@ -186,16 +336,60 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         
         # OPTIMIZATION: Check if we need to reparse M3U
         needs_reparse = should_reparse_m3u(source, existing_entries_count, force)
+        # An earlier sync changed entries, or staged files, that never reached the live folder
+        interrupted = source.unpublished_since is not None
         
         added_count = 0
+        ingest_stats = None
+        fetch_stats = None
+        # Keys of entries the reparse inserted or updated, None when every entry must be (re)generated
+        changed_keys: Optional[Set[str]] = set()
         if needs_reparse:
-            # Parse M3U content
+            # Entries stream out of the parser and are reconciled a batch at a time, the playlist
+            # is never held whole. One transaction, so a broken download keeps the old entries
+            download = None
             try:
                 if source.source_type == SourceType.URL:
-                    entries = parse_m3u_url(source.url)
+                    # Validators only go out when the cached entries are worth keeping
+                    conditional = not force and existing_entries_count > 0
+                    download = download_m3u(
+                        source.url,
+                        source.etag if conditional else None,
+                        source.last_modified if conditional else None
+                    )
+                    if download["status"] == "not_modified":
+                        outcome = "not_modified"
+                    elif conditional and download["digest"] == source.content_digest:
+                        # Server without validators, or one that changes them on every response
+                        outcome = "unchanged_digest"
+                    else:
+                        outcome = "changed"
+                    fetch_stats = {"outcome": outcome, "bytes": download["bytes"], "seconds": download["seconds"]}
+                    source.etag = download["etag"]
+                    source.last_modified = download["last_modified"]
+                    entries = iter_m3u_file(download["path"], download["encoding"], errors="replace") if outcome == "changed" else None
                 else:  # FILE
-                    entries = parse_m3u_file(source.file_path)
+                    entries = iter_m3u_file(source.file_path)
+                
+                if entries is not None:
+                    started = time.monotonic()
+                    ingest_stats, changed_keys = reconcile_entries(db, source_id, entries, app_settings.M3U_INGEST_BATCH_SIZE)
+                    if download is not None:
+                        # Stored with the entries it describes, a failed ingest fetches again next time
+                        source.content_digest = download["digest"]
+                    if changed_keys:
+                        # Cleared once their files are published, until then a failed sync can't lose them
+                        source.unpublished_since = source.unpublished_since or datetime.utcnow()
+                
+                # Commit cached entries
+                db.commit()
+                if ingest_stats is not None:
+                    elapsed = time.monotonic() - started
+                    added_count = ingest_stats["inserted"] + ingest_stats["updated"] + ingest_stats["unchanged"]
+                    ingest_stats["seconds"] = round(elapsed, 3)
+                    ingest_stats["rows_per_sec"] = round(ingest_stats["parsed"] / elapsed, 1) if elapsed > 0 else 0.0
             except Exception as e:
+                db.rollback()
                 logger.error(f"Error parsing M3U source {source.name}: {e}")
                 source.sync_status = "error"
                 
@@ -206,50 +400,28 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
                     
                 db.commit()
                 return {"error": str(e)}
+            finally:
+                if download is not None and download.get("path"):
+                    os.remove(download["path"])
             
-            logger.info(f"Parsed {len(entries)} entries from {source.name}")
-            
-            # Clear existing entries
-            db.query(M3UEntry).filter(M3UEntry.m3u_source_id == source_id).delete()
-            db.commit()
+            if ingest_stats is None:
+                # Playlist unchanged: no parse, no ingest, and generation below only writes
+                # entries whose files are not recorded (newly selected groups)
+                logger.info(f"M3U playlist of {source.name} unchanged ({fetch_stats['outcome']}), using cached entries")
+                added_count = existing_entries_count
+            else:
+                logger.info(
+                    f"Parsed {ingest_stats['parsed']} entries from {source.name}, cached {added_count}: "
+                    f"{ingest_stats['inserted']} new, {ingest_stats['updated']} updated, {ingest_stats['deleted']} removed "
+                    f"({ingest_stats['rows_per_sec']} rows/s)"
+                )
+            if force:
+                # A forced sync also rewrites unchanged entries (naming settings may have changed)
+                changed_keys = None
             
             # Create output directory
             Path(source.output_dir).mkdir(parents=True, exist_ok=True)
             
-            # Process and cache entries
-            for entry_data in entries:
-                try:
-                    # Determine entry type
-                    entry_type_str = entry_data.get('entry_type', 'live')
-                    if entry_type_str == 'movie':
-                        entry_type = EntryType.MOVIE
-                    elif entry_type_str == 'series':
-                        entry_type = EntryType.SERIES
-                    else:
-                        # Skip LIVE entries entirely
-                        continue
-                    
-                    # Save to database
-                    db_entry = M3UEntry(
-                        m3u_source_id=source_id,
-                        title=entry_data.get('title', 'Unknown'),
-                        url=entry_data['url'],
-                        group_title=entry_data.get('group_title'),
-                        logo=entry_data.get('logo'),
-                        tvg_id=entry_data.get('tvg_id'),
-                        tvg_name=entry_data.get('tvg_name'),
-                        entry_type=entry_type
-                    )
-                    db.add(db_entry)
-                    added_count += 1
-                        
-                except Exception as e:
-                    logger.error(f"Error caching entry {entry_data.get('title')}: {e}")
-                    continue
-            
-            # Commit cached entries
-            db.commit()
-            
             # Update hash if applicable
             if source.source_type == SourceType.FILE and hasattr(source, 'm3u_hash'):
                 source.m3u_hash = calculate_file_hash(source.file_path)
@@ -257,6 +429,9 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         else:
             logger.info(f"Using cached entries for {source.name}")
             added_count = existing_entries_count
+        if interrupted:
+            logger.info(f"Previous sync of {source.name} was not published, writing every entry")
+            changed_keys = None
         
         # If no groups selected, stop here (already cached)
         if not selected_groups:
@@ -268,6 +443,10 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
                 state.status = "success"
                 state.last_sync = datetime.utcnow()
                 state.task_id = None
+                if ingest_stats:
+                    state.stats = {**(state.stats or {}), "ingest": ingest_stats}
+                if fetch_stats:
+                    state.stats = {**(state.stats or {}), "fetch": fetch_stats}
                 
             db.commit()
             return {
@@ -293,13 +472,59 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         movies_base = source.movies_dir or f"{source.output_dir}/movies"
         series_base = source.series_dir or f"{source.output_dir}/series"
         
+        # Same entries, selection and settings as the last completed generation: its files are still right
+        naming = (prefix_regex, format_date, clean_name)
+        playlist_unchanged = changed_keys is not None and not changed_keys and not (ingest_stats and ingest_stats["deleted"])
+        generation = generation_digest(db, source_id, selected_groups, naming, (movies_base, series_base), sync_types)
+        if playlist_unchanged and source.generated_digest == generation:
+            logger.info(f"Playlist, selection and settings of {source.name} unchanged, no files to generate")
+            source.last_sync = datetime.utcnow()
+            source.sync_status = "success"
+            for state in sync_states:
+                state.status = "success"
+                state.last_sync = datetime.utcnow()
+                state.items_added = 0
+                state.items_deleted = 0
+                state.stats = {**(state.stats or {}), "generation": "skipped"}
+                if ingest_stats:
+                    state.stats = {**state.stats, "ingest": ingest_stats}
+                if fetch_stats:
+                    state.stats = {**state.stats, "fetch": fetch_stats}
+                state.task_id = None
+            db.commit()
+            return {
+                "source_id": source_id,
+                "source_name": source.name,
+                "items_cached": added_count,
+                "items_processed": 0,
+                "status": "success",
+                "message": "Playlist, selection and settings unchanged, no files generated"
+            }
+        # Set again once this generation completes
+        source.generated_digest = None
+
+        # Staged: everything below happens in hardlinked copies of the output folders, published at the end
+        if app_settings.STAGED_OUTPUT:
+            source.unpublished_since = source.unpublished_since or datetime.utcnow()
+        db.commit()
+        if app_settings.STAGED_OUTPUT:
+            fm.begin_staging((movies_base, series_base))
+
+        # Files written by earlier syncs; content types without any fall back to walking the folders
+        recorded = load_source_files(db, SOURCE_M3U, source_id)
+        recorded_kinds = {kind for kind, _, _ in recorded.values()}
+
         # CLEANUP PHASE: Remove directories for deselected groups
-        movies_deleted = cleanup_deselected_groups(
-            movies_base, selected_movie_groups, CONTENT_TYPE_MOVIES, sync_types
-        )
-        series_deleted = cleanup_deselected_groups(
-            series_base, selected_series_groups, CONTENT_TYPE_SERIES, sync_types
-        )
+        movies_deleted = 0
+        if ITEM_KINDS[CONTENT_TYPE_MOVIES] not in recorded_kinds:
+            movies_deleted = cleanup_deselected_groups(
+                fm.physical_path(movies_base), selected_movie_groups, CONTENT_TYPE_MOVIES, sync_types
+            )
+        series_deleted = 0
+        if ITEM_KINDS[CONTENT_TYPE_SERIES] not in recorded_kinds:
+            series_deleted = cleanup_deselected_groups(
+                fm.physical_path(series_base), selected_series_groups, CONTENT_TYPE_SERIES, sync_types
+            )
         
         # FILE GENERATION PHASE
         movies_files_created = 0
@@ -309,8 +534,21 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         # We need an event loop for async FileManager methods
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
+
+        # Files are queued and handed to the IO pool in groups, one batch per worker thread
+        pending_writes = []
+        pending_rows = []
+        queued_paths = set()
+        entries_unchanged = 0
+        flush_size = fm.write_batch_size * fm.io_workers
         
-        for entry in db.query(M3UEntry).filter(M3UEntry.m3u_source_id == source_id).all():
+        # Streamed in batches, a large playlist never sits in memory as ORM objects
+        entries = db.execute(
+            select(M3UEntry.title, M3UEntry.url, M3UEntry.group_title, M3UEntry.logo, M3UEntry.entry_type, M3UEntry.entry_key)
+            .where(M3UEntry.m3u_source_id == source_id)
+            .execution_options(yield_per=app_settings.M3U_INGEST_BATCH_SIZE)
+        )
+        for entry in entries:
             try:
                 # Filter by sync_types if provided
                 if sync_types:
@@ -336,20 +574,29 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
                     continue
                 
                 # Prepare data for NFO generation
-                safe_group = sanitize_name(group)
-                safe_title = sanitize_name(entry.title)
+                safe_group = sanitize_m3u_name(group)
+                safe_title = sanitize_m3u_name(entry.title)
                 
                 group_dir = Path(base_dir) / content_type / safe_group
-                group_dir.mkdir(parents=True, exist_ok=True)
-                
                 strm_path = group_dir / f"{safe_title}{STRM_EXTENSION}"
                 nfo_path = group_dir / f"{safe_title}.nfo"
                 
-                # Check if STRM exists to count as new
-                is_new = not strm_path.exists()
+                # An entry the reparse left alone is only written if its files were never recorded
+                # (newly selected group, repaired by a sweep)
+                if (changed_keys is not None and entry.entry_key not in changed_keys
+                        and str(strm_path) in recorded and str(nfo_path) in recorded):
+                    queued_paths.add(str(strm_path))
+                    queued_paths.add(str(nfo_path))
+                    entries_unchanged += 1
+                    continue
                 
-                # Create STRM file
-                loop.run_until_complete(fm.write_strm(str(strm_path), entry.url))
+                fm.ensure_directory(str(group_dir))
+                
+                # Check if STRM exists (or is already queued) to count as new, the manifest answers without a stat
+                is_new = (str(strm_path) not in queued_paths and str(strm_path) not in recorded
+                          and not strm_path.exists())
+                queued_paths.add(str(strm_path))
+                queued_paths.add(str(nfo_path))
                 
                 # Create NFO file
                 data = {
@@ -367,13 +614,39 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
                     if is_new:
                         series_files_created += 1
                 
-                loop.run_until_complete(fm.write_nfo(str(nfo_path), nfo_content))
+                files = [(str(strm_path), entry.url.encode('utf-8')), (str(nfo_path), nfo_content.encode('utf-8'))]
+                pending_writes += files
+                pending_rows += manifest_rows(SOURCE_M3U, source_id, ITEM_KINDS[content_type], entry.url, files, parent_id=group)
+                if len(pending_writes) >= flush_size:
+                    loop.run_until_complete(fm.write_files(pending_writes))
+                    record_files(db, pending_rows)
+                    pending_writes = []
+                    pending_rows = []
                         
             except Exception as e:
                 logger.error(f"Error processing entry {entry.title}: {e}")
                 continue
         
+        loop.run_until_complete(fm.write_files(pending_writes))
+        record_files(db, pending_rows)
+
+        # Recorded files nothing generated this time: deselected groups and entries the playlist dropped
+        for content_type in (CONTENT_TYPE_MOVIES, CONTENT_TYPE_SERIES):
+            stale = stale_recorded_files(recorded, queued_paths, content_type, sync_types)
+            if not stale:
+                continue
+            group_dirs = {str(Path(path).parent) for path in stale}
+            loop.run_until_complete(fm.remove_paths(stale, prune_dirs=group_dirs))
+            forget_paths(db, stale)
+            removed = sum(1 for path in stale if path.endswith(STRM_EXTENSION))
+            if content_type == CONTENT_TYPE_MOVIES:
+                movies_deleted += removed
+            else:
+                series_deleted += removed
         loop.close()
+        fm.publish()
+        source.unpublished_since = None
+        source.generated_digest = generation_digest(db, source_id, selected_groups, naming, (movies_base, series_base), sync_types)
         
         files_created = movies_files_created + series_files_created
         
@@ -391,6 +664,11 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
             elif state.type == CONTENT_TYPE_SERIES:
                 state.items_added = series_files_created
                 state.items_deleted = series_deleted
+            state.stats = {**(state.stats or {}), "files": fm.get_write_stats(), "entries_unchanged": entries_unchanged}
+            if ingest_stats:
+                state.stats = {**state.stats, "ingest": ingest_stats}
+            if fetch_stats:
+                state.stats = {**state.stats, "fetch": fetch_stats}
             state.task_id = None
             
         db.commit()
@@ -398,7 +676,7 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
         logger.info(
             f"M3U sync completed for {source.name}: "
             f"{added_count} entries cached, {files_created} files created, "
-            f"{movies_deleted + series_deleted} files deleted"
+            f"{movies_deleted + series_deleted} files deleted, {entries_unchanged} unchanged entries skipped"
         )
         
         return {
@@ -412,6 +690,8 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
     except Exception as e:
         logger.error(f"Error in M3U sync task for source {source_id}: {e}")
         try:
+            # Manifest rows not committed yet describe files of a dropped staged copy, or writes that failed
+            db.rollback()
             if 'source' in locals() and source:
                 source.sync_status = "error"
                 
@@ -431,4 +711,6 @@ def sync_m3u_source_task(source_id: int, sync_types: list = None, force: bool =
             pass
         return {"error": str(e)}
     finally:
+        if fm is not None:
+            fm.close()
         db.close()
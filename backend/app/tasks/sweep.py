@@ -0,0 +1,213 @@
+from app.core.celery_app import celery_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+from app.models.subscription import Subscription
+from app.models.m3u_source import M3USource
+from app.models.m3u_entry import M3UEntry, EntryType
+from app.models.m3u_selection import M3USelection, SelectionType
+from app.models.cache import MovieCache, SeriesCache, EpisodeCache
+from app.models.sync_state import SyncState, SyncStatus
+from app.services.file_manager import FileManager
+from app.services.cache_store import bulk_delete_ids
+from app.services.manifest import (
+    SOURCE_XTREAM, SOURCE_M3U, load_source_files, recorded_paths_under, recorded_clause, forget_paths
+)
+from app.services.tree_scan import TreeScan
+from app.core.config import settings as app_settings
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Paths listed in the report, the counts are always complete
+REPORT_SAMPLE_SIZE = 100
+
+
+def output_roots(db: Session, source_type: str, source_id: int) -> Optional[List[str]]:
+    """Folders a source generates into, None if the source doesn't exist"""
+    if source_type == SOURCE_XTREAM:
+        sub = db.query(Subscription).filter(Subscription.id == source_id).first()
+        return [sub.movies_dir, sub.series_dir] if sub else None
+    if source_type == SOURCE_M3U:
+        source = db.query(M3USource).filter(M3USource.id == source_id).first()
+        if not source:
+            return None
+        movies_base = source.movies_dir or f"{source.output_dir}/movies"
+        series_base = source.series_dir or f"{source.output_dir}/series"
+        return [f"{movies_base}/movies", f"{series_base}/series"]
+    return None
+
+
+def _unrecorded(db: Session, source_type: str, source_id: int, item_kind: str, id_column, *conditions) -> int:
+    """Rows matching the conditions whose id has no file recorded under this item kind"""
+    recorded = recorded_clause(source_type, source_id, item_kind, id_column)
+    return db.execute(select(func.count()).where(*conditions, ~recorded)).scalar() or 0
+
+
+def unrecorded_items(db: Session, source_type: str, source_id: int) -> int:
+    """Items a source has generated files for that the manifest does not know yet.
+
+    Their files are on disk but recorded nowhere, a sweep would take them for orphans.
+    """
+    if source_type == SOURCE_XTREAM:
+        return sum(
+            _unrecorded(db, source_type, source_id, kind, id_column, model.subscription_id == source_id)
+            for model, id_column, kind in (
+                (MovieCache, MovieCache.stream_id, "movie"),
+                (SeriesCache, SeriesCache.series_id, "series"),
+                (EpisodeCache, EpisodeCache.episode_id, "episode"),
+            )
+        )
+    if source_type == SOURCE_M3U:
+        total = 0
+        for entry_type, selection_type, kind in ((EntryType.MOVIE, SelectionType.MOVIE, "m3u_movie"),
+                                                 (EntryType.SERIES, SelectionType.SERIES, "m3u_series")):
+            # Only entries of selected groups get files
+            selected_groups = select(M3USelection.group_title).where(
+                M3USelection.m3u_source_id == source_id,
+                M3USelection.selection_type == selection_type
+            )
+            total += _unrecorded(
+                db, source_type, source_id, kind, M3UEntry.url,
+                M3UEntry.m3u_source_id == source_id,
+                M3UEntry.entry_type == entry_type,
+                func.coalesce(M3UEntry.group_title, "Uncategorized").in_(selected_groups)
+            )
+        return total
+    return 0
+
+
+def sync_running(db: Session, source_type: str, source_id: int) -> bool:
+    """Whether a sync of the source is writing right now; its new files are not recorded yet"""
+    if source_type == SOURCE_XTREAM:
+        return db.query(SyncState.id).filter(
+            SyncState.subscription_id == source_id,
+            SyncState.status == SyncStatus.RUNNING
+        ).first() is not None
+    if source_type == SOURCE_M3U:
+        return db.query(M3USource.id).filter(
+            M3USource.id == source_id,
+            M3USource.sync_status == "syncing"
+        ).first() is not None
+    return False
+
+
+def parent_dirs(paths: List[str], roots: List[str]) -> List[str]:
+    """Folders above the paths up to (not including) the roots, deepest first"""
+    roots = {os.path.normpath(root) for root in roots}
+    dirs = set()
+    for path in paths:
+        parent = os.path.dirname(path)
+        while parent not in roots and parent not in dirs and os.path.dirname(parent) != parent:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    return sorted(dirs, key=len, reverse=True)
+
+
+def repair_missing(db: Session, source_type: str, source_id: int, missing: Dict[str, tuple]) -> int:
+    """Forget missing files and invalidate their cache rows, so the next sync writes them again"""
+    forget_paths(db, missing)
+    if source_type != SOURCE_XTREAM:
+        # M3U syncs write every selected entry whose files are not recorded
+        return len(missing)
+
+    movie_ids = {int(item_id) for kind, item_id, _ in missing.values() if kind == "movie"}
+    episode_ids = {int(item_id) for kind, item_id, _ in missing.values() if kind == "episode"}
+    # A series is only refetched when its cache row is gone, its unchanged episodes are skipped again
+    series_ids = {int(parent_id if kind == "episode" else item_id) for kind, item_id, parent_id in missing.values() if kind in ("series", "episode")}
+
+    bulk_delete_ids(db, MovieCache.__table__, movie_ids, column="stream_id", subscription_id=source_id)
+    bulk_delete_ids(db, SeriesCache.__table__, series_ids, column="series_id", subscription_id=source_id)
+    bulk_delete_ids(db, EpisodeCache.__table__, episode_ids, column="episode_id", subscription_id=source_id)
+    return len(missing)
+
+
+@celery_app.task(bind=True)
+def sweep_output_task(self, source_type: str, source_id: int, remove: bool = False, repair: bool = False):
+    """Compare a source's output folders with the manifest: report, and optionally fix, orphans and missing files.
+
+    Orphans are generated-looking files (.strm/.nfo) no source recorded; remove
+    deletes them and prunes the folders they leave empty. Missing files are
+    recorded but gone from disk; repair makes the next sync write them again.
+    """
+    db = SessionLocal()
+    try:
+        roots = output_roots(db, source_type, source_id)
+        if roots is None:
+            logger.error(f"Sweep: {source_type} source {source_id} not found")
+            return {"error": "Source not found"}
+        roots = [os.path.normpath(root) for root in roots]
+
+        def report_progress(stats: Dict):
+            if self.request.id:
+                self.update_state(state="PROGRESS", meta={"phase": "scan", **stats})
+
+        scan = TreeScan(app_settings.SWEEP_WORKERS, progress=report_progress)
+        on_disk = scan.run(roots)
+
+        # Files of every source count as expected, two sources can share an output folder
+        recorded = load_source_files(db, source_type, source_id)
+        expected = recorded_paths_under(db, roots) | {os.path.normpath(path) for path in recorded}
+
+        orphans = sorted(on_disk - expected)
+        # Recorded paths outside today's roots (output folder changed since) are not this sweep's business
+        under_roots = tuple(os.path.join(root, "") for root in roots)
+        missing = {
+            path: info for path, info in recorded.items()
+            if os.path.normpath(path) not in on_disk and os.path.normpath(path).startswith(under_roots)
+        }
+
+        result = {
+            "source_type": source_type,
+            "source_id": source_id,
+            "roots": roots,
+            "scan": scan.stats,
+            "orphans": len(orphans),
+            "missing": len(missing),
+            "orphan_sample": orphans[:REPORT_SAMPLE_SIZE],
+            "missing_sample": sorted(missing)[:REPORT_SAMPLE_SIZE],
+            "removed": 0,
+            "repaired": 0,
+        }
+
+        if remove and orphans:
+            # Items synced before the manifest existed have unrecorded files that would look orphaned,
+            # nothing is removed until a sync has recorded them all
+            unrecorded = unrecorded_items(db, source_type, source_id)
+            if sync_running(db, source_type, source_id):
+                # Files a running sync has written but not committed yet look orphaned too
+                result["warning"] = "A sync of this source is running, orphans were only reported; sweep again once it is done"
+            elif not recorded or unrecorded:
+                result["unrecorded_items"] = unrecorded
+                result["warning"] = (
+                    f"{unrecorded} synced items have no recorded files yet, orphans were only reported; "
+                    f"run a full sync first"
+                ) if unrecorded else "No files recorded for this source yet, orphans were only reported"
+            else:
+                if self.request.id:
+                    self.update_state(state="PROGRESS", meta={"phase": "remove", **scan.stats, "orphans": len(orphans)})
+                fm = FileManager(roots[0], app_settings.FILE_IO_WORKERS, app_settings.FILE_WRITE_BATCH_SIZE)
+                try:
+                    result["removed"] = asyncio.run(fm.remove_paths(orphans, prune_dirs=parent_dirs(orphans, roots)))
+                finally:
+                    fm.close()
+
+        if repair and missing:
+            result["repaired"] = repair_missing(db, source_type, source_id, missing)
+            db.commit()
+
+        logger.info(
+            f"Sweep of {source_type} source {source_id}: {scan.stats['files']} files in {scan.stats['dirs']} folders "
+            f"({scan.stats['files_per_sec']} files/s), {len(orphans)} orphans, {len(missing)} missing, "
+            f"{result['removed']} removed, {result['repaired']} repaired"
+        )
+        return result
+    except Exception as e:
+        logger.exception(f"Error sweeping {source_type} source {source_id}")
+        db.rollback()
+        return {"error": str(e)}
+    finally:
+        db.close()
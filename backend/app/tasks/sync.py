@@ -1,22 +1,196 @@
 import asyncio
+import hashlib
+import json
 import os
-import shutil
 from app.core.celery_app import celery_app
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.db.session import SessionLocal
 from app.models.subscription import Subscription
 from app.models.sync_state import SyncState, SyncStatus, SyncType
 from app.models.selection import SelectedCategory
-from app.models.cache import MovieCache, SeriesCache, EpisodeCache
+from app.models.cache import MovieCache, SeriesCache, EpisodeCache, VodInfoCache
 from app.models.schedule import Schedule, SyncType as ScheduleSyncType
 from app.models.schedule_execution import ScheduleExecution, ExecutionStatus
 from app.services.xtream import XtreamClient
+from app.services.rate_limiter import AdaptiveLimiter
+from app.services.pipeline import Pipeline, CommitBatcher
+from app.services.cache_store import bulk_upsert, bulk_delete_ids, bulk_update_ids, ID_BATCH_SIZE
+from app.services.manifest import (
+    SOURCE_XTREAM, manifest_rows, existing_file_rows, record_files, load_item_paths, recorded_item_ids, recorded_clause,
+    forget_paths, forget_items, forget_recorded_since
+)
 from app.services.file_manager import FileManager
+from app.core.config import settings as app_settings
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Upstream listing fields that end up in the generated files; a change in any of them triggers a rewrite
+MOVIE_FINGERPRINT_FIELDS = (
+    "name", "container_extension", "category_id", "stream_icon", "rating", "rating_5based",
+    "tmdb", "tmdb_id", "plot", "year", "genre", "added", "last_modified",
+)
+# Listing fields whose change means get_vod_info has new details; a rename or new rating keeps the cached ones
+VOD_INFO_FINGERPRINT_FIELDS = ("tmdb", "tmdb_id", "added", "last_modified")
+SERIES_FINGERPRINT_FIELDS = (
+    "name", "category_id", "cover", "plot", "cast", "director", "genre", "releaseDate", "rating",
+    "rating_5based", "tmdb", "backdrop_path", "youtube_trailer", "episode_run_time", "last_modified",
+)
+
+def record_fingerprint(item: dict, fields: tuple) -> str:
+    """Compact, stable hash of the given fields of a listing item"""
+    payload = json.dumps([item.get(field) for field in fields], separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+def episode_fingerprint(episode: dict, *context) -> str:
+    """Hash of an episode payload plus whatever else goes into its files (path, url, show name)"""
+    payload = json.dumps([episode, *context], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+def build_xtream_client(sub: Subscription) -> XtreamClient:
+    """Create a pooled client for one subscription, reused for the whole sync"""
+    return XtreamClient(
+        sub.xtream_url,
+        sub.username,
+        sub.password,
+        max_connections=app_settings.XTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=app_settings.XTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=app_settings.XTREAM_KEEPALIVE_EXPIRY,
+        http2=app_settings.XTREAM_HTTP2,
+        limiter=AdaptiveLimiter(
+            min_limit=app_settings.XTREAM_CONCURRENCY_MIN,
+            # More in-flight requests than pooled connections would only queue in httpx
+            max_limit=min(app_settings.XTREAM_CONCURRENCY_MAX, app_settings.XTREAM_MAX_CONNECTIONS),
+            latency_target=app_settings.XTREAM_LATENCY_TARGET,
+        ),
+    )
+
+def record_sync_stats(sync_state: SyncState, **values):
+    # Reassign instead of mutating so SQLAlchemy notices the JSON change
+    sync_state.stats = {**(sync_state.stats or {}), **values}
+
+def iter_catalog(xc: XtreamClient, kind: str, categories: list, selected_ids: set, sync_state: SyncState):
+    """Pick between downloading the full catalog and fetching only the selected categories"""
+    ratio = len(selected_ids) / len(categories) if categories else 1.0
+    per_category = bool(selected_ids) and ratio <= app_settings.CATEGORY_FETCH_THRESHOLD
+    record_sync_stats(sync_state, fetch_strategy="per_category" if per_category else "full")
+
+    if kind == "movies":
+        return xc.iter_vod_streams_for_categories(sorted(selected_ids)) if per_category else xc.iter_vod_streams()
+    return xc.iter_series_for_categories(sorted(selected_ids)) if per_category else xc.iter_series()
+
+def parse_added(item: dict) -> int:
+    try:
+        return int(item.get('added') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def use_incremental_movie_sync(sync_state: SyncState) -> bool:
+    """Incremental only once a full sync set the watermark, and while the last full one is recent enough"""
+    if not app_settings.MOVIE_INCREMENTAL_SYNC or sync_state.watermark is None or sync_state.last_full_sync is None:
+        return False
+    return sync_state.last_full_sync >= datetime.utcnow() - timedelta(hours=app_settings.MOVIE_FULL_RECONCILE_HOURS)
+
+# Never equal to a real fingerprint: the item is written again by the next sync
+UNPUBLISHED_FINGERPRINT = "unpublished"
+
+def mark_unpublished(db: Session, subscription_id: int, sync_type: SyncType, since: Optional[datetime]):
+    """Set (or clear, with None) when the DB started running ahead of the live tree"""
+    sync_state = db.query(SyncState).filter(
+        SyncState.subscription_id == subscription_id,
+        SyncState.type == sync_type
+    ).first()
+    if not sync_state:
+        sync_state = SyncState(subscription_id=subscription_id, type=sync_type)
+        db.add(sync_state)
+    sync_state.unpublished_since = since
+    db.commit()
+
+def forget_unpublished_sync(db: Session, subscription_id: int, sync_type: SyncType, error: Optional[str] = None) -> int:
+    """Undo the DB side of a staged sync whose copy never got published (failed, revoked, crashed).
+
+    Cache and manifest rows are committed batch by batch while the files only go
+    to the staged copy. The manifest rows recorded since the sync started are
+    dropped and the fingerprints of their items made stale, so the next sync (a
+    full one, the watermark moved on as well) writes them again. Returns the
+    number of movies or shows reset.
+    """
+    sync_state = db.query(SyncState).filter(
+        SyncState.subscription_id == subscription_id,
+        SyncState.type == sync_type
+    ).first()
+    if not sync_state or sync_state.unpublished_since is None:
+        return 0
+
+    stale = {'fingerprint': UNPUBLISHED_FINGERPRINT}
+    if sync_type == SyncType.MOVIES:
+        items = forget_recorded_since(db, SOURCE_XTREAM, subscription_id, ["movie"], sync_state.unpublished_since)
+        ids = {int(item_id) for _, item_id, _ in items}
+        bulk_update_ids(db, MovieCache.__table__, ids, stale, column="stream_id", subscription_id=subscription_id)
+        bulk_update_ids(db, VodInfoCache.__table__, ids, stale, column="stream_id", subscription_id=subscription_id)
+        sync_state.last_full_sync = None
+    else:
+        items = forget_recorded_since(db, SOURCE_XTREAM, subscription_id, ["series", "episode"], sync_state.unpublished_since)
+        # Episodes are only written with their show, the show goes through get_series_info again
+        ids = {int(item_id if kind == "series" else parent_id) for kind, item_id, parent_id in items
+               if kind == "series" or parent_id is not None}
+        bulk_update_ids(db, SeriesCache.__table__, ids, dict(stale, last_modified=None), column="series_id", subscription_id=subscription_id)
+        bulk_update_ids(db, EpisodeCache.__table__, ids, stale, column="series_id", subscription_id=subscription_id)
+
+    sync_state.unpublished_since = None
+    if error is not None:
+        sync_state.status = SyncStatus.FAILED
+        sync_state.error_message = error
+    db.commit()
+    logger.warning(f"Staged {sync_type.value} sync of subscription {subscription_id} was not published, {len(ids)} items reset")
+    return len(ids)
+
+def load_vod_info_cache(db: Session, subscription_id: int, stream_ids: list) -> dict:
+    """Return the cached detail rows for these movies, fresh or expired, keyed by stream_id"""
+    if app_settings.VOD_INFO_CACHE_TTL_HOURS <= 0 or not stream_ids:
+        return {}
+    rows = db.query(VodInfoCache).filter(
+        VodInfoCache.subscription_id == subscription_id,
+        VodInfoCache.stream_id.in_(stream_ids)
+    ).all()
+    return {row.stream_id: row for row in rows}
+
+def load_episode_cache(db: Session, subscription_id: int, series_ids: list) -> dict:
+    """Cached episodes of these series in one query per id batch: {series_id: {episode_id: row}}"""
+    table = EpisodeCache.__table__
+    episodes = {series_id: {} for series_id in series_ids}
+    for i in range(0, len(series_ids), ID_BATCH_SIZE):
+        rows = db.execute(
+            select(table.c.id, table.c.series_id, table.c.episode_id, table.c.path, table.c.fingerprint).where(
+                table.c.subscription_id == subscription_id,
+                table.c.series_id.in_(series_ids[i:i + ID_BATCH_SIZE])
+            )
+        )
+        for row in rows:
+            episodes[row.series_id][row.episode_id] = row
+    return episodes
+
+def fresh_vod_info(info_rows: dict, stream_id: int, fingerprint: str):
+    """Cached info payload for a movie, or None when missing, older than the TTL or fetched for other details.
+
+    fingerprint covers VOD_INFO_FINGERPRINT_FIELDS only: a new TMDB id or a re-added stream
+    means changed details, a renamed or re-rated movie is rendered from the cached ones.
+    """
+    row = info_rows.get(stream_id)
+    if row is None or row.fetched_at is None or row.fingerprint != fingerprint:
+        return None
+    if row.fetched_at < datetime.utcnow() - timedelta(hours=app_settings.VOD_INFO_CACHE_TTL_HOURS):
+        return None
+    return row.info
+
+async def run_with_client(process, db: Session, xc: XtreamClient, fm: FileManager, subscription_id: int, **options):
+    """Run a sync coroutine and close the client's connection pool afterwards"""
+    async with xc:
+        await process(db, xc, fm, subscription_id, **options)
+
 async def process_movies(db: Session, xc: XtreamClient, fm: FileManager, subscription_id: int):
     # Get settings
     from app.models.settings import SettingsModel
@@ -24,6 +198,8 @@ async def process_movies(db: Session, xc: XtreamClient, fm: FileManager, subscri
     prefix_regex = settings.get("PREFIX_REGEX")
     format_date = settings.get("FORMAT_DATE_IN_TITLE") == "true"
     clean_name = settings.get("CLEAN_NAME") == "true"
+    # Title rules are compiled once for the whole sync
+    nfo = fm.get_nfo_renderer(prefix_regex, format_date, clean_name)
 
     # Update status
     sync_state = db.query(SyncState).filter(
@@ -37,6 +213,7 @@ async def process_movies(db: Session, xc: XtreamClient, fm: FileManager, subscri
     
     sync_state.status = SyncStatus.RUNNING
     sync_state.last_sync = datetime.now()
+    sync_state.stats = {}
     db.commit()
 
     try:
@@ -44,185 +221,309 @@ async def process_movies(db: Session, xc: XtreamClient, fm: FileManager, subscri
         categories = await xc.get_vod_categories()
         cat_map = {c['category_id']: c['category_name'] for c in categories}
 
-        # Fetch All Movies
-        all_movies = await xc.get_vod_streams()
-
         # Filter by selected categories if any
         selected_cats = db.query(SelectedCategory).filter(
             SelectedCategory.subscription_id == subscription_id,
             SelectedCategory.type == "movie"
         ).all()
+        selected_ids = {s.category_id for s in selected_cats}
+
+        def movie_files(movie, tmdb_id):
+            """Folders, .strm and .nfo path of a movie"""
+            safe_cat = fm.sanitize_name(cat_map.get(movie['category_id'], "Uncategorized"))
+            safe_name = fm.sanitize_name(movie['name'])
+            cat_dir = f"{fm.output_dir}/{safe_cat}"
+
+            # Folder Structure Logic
+            if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
+                folder_name = f"{safe_name} {{tmdb-{tmdb_id}}}"
+                movie_target_dir = f"{cat_dir}/{folder_name}"
+                return [cat_dir, movie_target_dir], f"{movie_target_dir}/{folder_name}.strm", f"{movie_target_dir}/{folder_name}.nfo"
+            # Fallback to flat structure if no TMDB ID
+            return [cat_dir], f"{cat_dir}/{safe_name}.strm", f"{cat_dir}/{safe_name}.nfo"
+
+        incremental = use_incremental_movie_sync(sync_state)
+        watermark = sync_state.watermark or 0
+        record_sync_stats(sync_state, mode="incremental" if incremental else "full")
         
-        if selected_cats:
-            selected_ids = {s.category_id for s in selected_cats}
-            all_movies = [m for m in all_movies if m['category_id'] in selected_ids]
-        
-        # Current Cache
-        cached_movies = {m.stream_id: m for m in db.query(MovieCache).filter(MovieCache.subscription_id == subscription_id).all()}
+        # Current Cache (incremental syncs only need the ids)
+        if incremental:
+            cached_movies = {stream_id: None for (stream_id,) in db.query(MovieCache.stream_id).filter(MovieCache.subscription_id == subscription_id)}
+        else:
+            cached_movies = {m.stream_id: m for m in db.query(MovieCache).filter(MovieCache.subscription_id == subscription_id).all()}
         
         to_add_update = []
         to_delete = []
+        fingerprints = {}
+        to_backfill = []
+        # Unchanged movies whose files were written before the manifest existed
+        to_record = []
+        recorded_movies = set() if incremental else recorded_item_ids(db, SOURCE_XTREAM, subscription_id, "movie")
         
         current_ids = set()
+        highest_added = watermark
+
+        # Stream the catalog so only changed items are kept in memory
+        async for movie in iter_catalog(xc, "movies", categories, selected_ids, sync_state):
+            if selected_ids and movie['category_id'] not in selected_ids:
+                continue
 
-        for movie in all_movies:
             stream_id = int(movie['stream_id'])
             current_ids.add(stream_id)
+            added = parse_added(movie)
+            highest_added = max(highest_added, added)
+
+            if incremental:
+                # Unknown ids still count as new, e.g. after a category got selected
+                if stream_id not in cached_movies or added > watermark:
+                    to_add_update.append(movie)
+                    fingerprints[stream_id] = record_fingerprint(movie, MOVIE_FINGERPRINT_FIELDS)
+                continue
+
+            fingerprint = record_fingerprint(movie, MOVIE_FINGERPRINT_FIELDS)
             
             # Check if changed
             cached = cached_movies.get(stream_id)
             if not cached:
-                to_add_update.append(movie)
+                changed = True
+            elif cached.fingerprint is None:
+                # Row written before fingerprints existed: fall back to the old check once
+                changed = cached.name != movie['name'] or cached.container_extension != movie['container_extension']
+                if not changed:
+                    to_backfill.append({'subscription_id': subscription_id, 'stream_id': stream_id, 'fingerprint': fingerprint})
             else:
-                if cached.name != movie['name'] or cached.container_extension != movie['container_extension']:
-                    to_add_update.append(movie)
+                changed = cached.fingerprint != fingerprint
+
+            if changed:
+                to_add_update.append(movie)
+                fingerprints[stream_id] = fingerprint
+            elif str(stream_id) not in recorded_movies:
+                to_record.append((movie, cached.tmdb_id))
+
+        bulk_upsert(db, MovieCache.__table__, to_backfill, ['subscription_id', 'stream_id'])
+        # Recorded from the paths they would be written to, so cleanup and sweeps know every file
+        now = datetime.utcnow()
+        record_files(db, [
+            row for movie, tmdb_id in to_record
+            for row in existing_file_rows(SOURCE_XTREAM, subscription_id, "movie", movie['stream_id'], movie_files(movie, tmdb_id)[1:], now=now)
+        ])
+        record_sync_stats(sync_state, manifest_backfilled=len(to_record))
 
         # Detect deletions
-        for stream_id, cached in cached_movies.items():
-            if stream_id not in current_ids:
-                to_delete.append(cached)
+        if incremental:
+            removed_ids = list(cached_movies.keys() - current_ids)
+            for i in range(0, len(removed_ids), ID_BATCH_SIZE):
+                to_delete += db.query(MovieCache).filter(
+                    MovieCache.subscription_id == subscription_id,
+                    MovieCache.stream_id.in_(removed_ids[i:i + ID_BATCH_SIZE])
+                ).all()
+        else:
+            for stream_id, cached in cached_movies.items():
+                if stream_id not in current_ids:
+                    to_delete.append(cached)
 
-        # Process Deletions
+        # Process Deletions (on the IO thread pool, the event loop keeps serving requests)
+        paths_to_remove = []
+        category_dirs = set()
+        recorded = load_item_paths(db, SOURCE_XTREAM, subscription_id, "movie", [m.stream_id for m in to_delete])
         for movie in to_delete:
             cat_name = cat_map.get(movie.category_id, "Uncategorized")
             safe_cat = fm.sanitize_name(cat_name)
             safe_name = fm.sanitize_name(movie.name)
             tmdb_id = movie.tmdb_id
+            category_dirs.add(f"{fm.output_dir}/{safe_cat}")
+
+            # The manifest knows exactly where the files are: drop the movie's own folder, or just the flat files
+            movie_paths = recorded.get(str(movie.stream_id))
+            if movie_paths:
+                for path in movie_paths:
+                    parent, name = os.path.split(path)
+                    own_folder = os.path.splitext(name)[0] == os.path.basename(parent)
+                    paths_to_remove.append(parent if own_folder else path)
+                continue
 
             # Old flat or new folder structure? Try both removals
             
             # 1. New Structure: Category/MovieName {tmdb-ID}/
             if tmdb_id:
                  folder_name = f"{safe_name} {{tmdb-{tmdb_id}}}"
-                 movie_dir = f"{fm.output_dir}/{safe_cat}/{folder_name}"
-                 if os.path.exists(movie_dir):
-                     shutil.rmtree(movie_dir)
+                 paths_to_remove.append(f"{fm.output_dir}/{safe_cat}/{folder_name}")
             
             # 2. Old Structure: Category/MovieName.strm
             # Also clean up old files if they exist (migration or fallback)
-            old_path = f"{fm.output_dir}/{safe_cat}/{safe_name}.strm"
-            old_nfo = f"{fm.output_dir}/{safe_cat}/{safe_name}.nfo"
-            await fm.delete_file(old_path)
-            await fm.delete_file(old_nfo)
+            paths_to_remove.append(f"{fm.output_dir}/{safe_cat}/{safe_name}.strm")
+            paths_to_remove.append(f"{fm.output_dir}/{safe_cat}/{safe_name}.nfo")
 
-            await fm.delete_directory_if_empty(f"{fm.output_dir}/{safe_cat}")
-            
-            db.delete(movie)
+        # Categories are pruned once, after all of their removals
+        await fm.remove_paths(paths_to_remove, prune_dirs=category_dirs)
+
+        removed_ids = [m.id for m in to_delete]
+        removed_stream_ids = [m.stream_id for m in to_delete]
+
+        def forget_removed_movies():
+            bulk_delete_ids(db, MovieCache.__table__, removed_ids)
+            forget_items(db, SOURCE_XTREAM, subscription_id, "movie", removed_stream_ids)
+            # Details of removed movies are not needed anymore
+            bulk_delete_ids(db, VodInfoCache.__table__, removed_stream_ids, column='stream_id', subscription_id=subscription_id)
+
+        # Staged, the rows stay until the files are gone from the live tree: a sync that never
+        # publishes leaves the movies cached, and the next one removes them again
+        fm.on_publish(forget_removed_movies)
+        db.commit()
         
         # Process Additions/Updates with Parallel Fetching
         try:
             parallelism = int(settings.get("SYNC_PARALLELISM_MOVIES", "10"))
         except ValueError:
             parallelism = 10
-            
-        batch_size = parallelism
-        semaphore = asyncio.Semaphore(batch_size)
 
-        async def process_single_movie(movie):
-            async with semaphore:
-                try:
+        # The configured parallelism is only the starting point, the limiter adapts it
+        xc.limiter.reset(parallelism)
+
+        # Category folders in one pass, the write stage then finds them already known
+        fm.ensure_directories(f"{fm.output_dir}/{fm.sanitize_name(cat_map.get(m['category_id'], 'Uncategorized'))}" for m in to_add_update)
+
+        info_cache_stats = {"hits": 0, "misses": 0}
+
+        async def feed_movies():
+            # Cached details are looked up a batch at a time, never once per movie
+            for i in range(0, len(to_add_update), app_settings.SYNC_COMMIT_BATCH_SIZE):
+                batch = to_add_update[i:i + app_settings.SYNC_COMMIT_BATCH_SIZE]
+                # The pipeline holds the batch from here on, a full sync never keeps the whole catalog
+                to_add_update[i:i + len(batch)] = [None] * len(batch)
+                info_rows = load_vod_info_cache(db, subscription_id, [int(m['stream_id']) for m in batch])
+                recorded = load_item_paths(db, SOURCE_XTREAM, subscription_id, "movie", [m['stream_id'] for m in batch])
+                for movie in batch:
                     stream_id = int(movie['stream_id'])
-                    name = movie['name']
-                    ext = movie['container_extension']
-                    cat_id = movie['category_id']
-                    tmdb_id = movie.get('tmdb')
-
-                    # Fetch detailed info for Metadata
-                    try:
-                        detailed_info = await xc.get_vod_info(str(stream_id))
-                        if detailed_info and 'info' in detailed_info:
-                            movie['info'] = detailed_info['info'] # Inject info for NFO generator
-                            # Update TMDB if found
-                            if detailed_info['info'].get('tmdb_id'):
-                                tmdb_id = detailed_info['info'].get('tmdb_id')
-                                movie['tmdb'] = tmdb_id # Update for object
-                    except Exception as e:
-                        # logger.warning(f"Failed to fetch info for movie {stream_id}: {e}")
-                        pass
-
-                    cat_name = cat_map.get(cat_id, "Uncategorized")
-                    safe_cat = fm.sanitize_name(cat_name)
-                    safe_name = fm.sanitize_name(name)
-                    
-                    cat_dir = f"{fm.output_dir}/{safe_cat}"
-                    fm.ensure_directory(cat_dir)
-                    
-                    # Folder Structure Logic
-                    if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
-                         folder_name = f"{safe_name} {{tmdb-{tmdb_id}}}"
-                         movie_target_dir = f"{cat_dir}/{folder_name}"
-                         fm.ensure_directory(movie_target_dir)
-                         
-                         strm_path = f"{movie_target_dir}/{folder_name}.strm"
-                         nfo_path = f"{movie_target_dir}/{folder_name}.nfo"
-                    else:
-                         # Fallback to flat structure if no TMDB ID
-                         strm_path = f"{cat_dir}/{safe_name}.strm"
-                         nfo_path = f"{cat_dir}/{safe_name}.nfo"
-                    
-                    url = xc.get_stream_url("movie", str(stream_id), ext)
-                    
-                    await fm.write_strm(strm_path, url)
-                    
-                    nfo_content = fm.generate_movie_nfo(movie, prefix_regex, format_date, clean_name)
-                    await fm.write_nfo(nfo_path, nfo_content)
-
-                    # Update Cache
-                    # We need to lock DB access or handle it after gather?
-                    # Ideally accumulate results and bulk update, but for safety lets return data
-                    return {
-                        'action': 'update_cache',
-                        'data': {
-                            'stream_id': stream_id,
-                            'name': name,
-                            'category_id': cat_id,
-                            'container_extension': ext,
-                            'tmdb_id': str(tmdb_id) if tmdb_id else None
-                        }
+                    info_fingerprint = record_fingerprint(movie, VOD_INFO_FINGERPRINT_FIELDS)
+                    yield {
+                        'movie': movie,
+                        'stream_id': stream_id,
+                        'info_fingerprint': info_fingerprint,
+                        'cached_info': fresh_vod_info(info_rows, stream_id, info_fingerprint),
+                        'recorded_paths': recorded.get(str(stream_id), [])
                     }
 
-                except Exception as e:
-                    logger.error(f"Error processing movie {movie.get('name')}: {e}")
-                    return None
+        async def fetch_movie_details(item):
+            movie = item['movie']
+            tmdb_id = movie.get('tmdb')
+            item['fetched_info'] = None
+            item['info'] = None
 
-        # Execute in chunks to avoid memory explosion if list is huge
-        # But for 10 concurrent, direct gather is fine usually.
-        # Let's process in batches of 50 to update DB incrementally
-        total_processed = 0
-        chunk_size = 50
-        
-        for i in range(0, len(to_add_update), chunk_size):
-            chunk = to_add_update[i:i + chunk_size]
-            results = await asyncio.gather(*[process_single_movie(m) for m in chunk])
-            
-            for res in results:
-                if res and res['action'] == 'update_cache':
-                    d = res['data']
-                    cached = cached_movies.get(d['stream_id'])
-                    if not cached:
-                        cached = MovieCache(subscription_id=subscription_id, stream_id=d['stream_id'])
-                        db.add(cached)
-                    
-                    cached.name = d['name']
-                    cached.category_id = d['category_id']
-                    cached.container_extension = d['container_extension']
-                    cached.tmdb_id = d['tmdb_id']
-            
-            db.commit() # Commit every chunk
+            # Fetch detailed info for Metadata, unless a fresh copy is cached
+            try:
+                if item['cached_info'] is not None:
+                    info_cache_stats["hits"] += 1
+                    detailed_info = {'info': item['cached_info']}
+                else:
+                    info_cache_stats["misses"] += 1
+                    detailed_info = await xc.get_vod_info(str(item['stream_id']))
+                    if detailed_info and isinstance(detailed_info.get('info'), dict):
+                        item['fetched_info'] = detailed_info['info']
+                if detailed_info and 'info' in detailed_info:
+                    item['info'] = detailed_info['info'] # For the NFO generator
+                    # Update TMDB if found
+                    if detailed_info['info'].get('tmdb_id'):
+                        tmdb_id = detailed_info['info'].get('tmdb_id')
+            except Exception as e:
+                # logger.warning(f"Failed to fetch info for movie {stream_id}: {e}")
+                pass
+
+            item['tmdb_id'] = tmdb_id
+            return item
+
+        async def render_movie(item):
+            movie = item['movie']
+            item['dirs'], strm_path, nfo_path = movie_files(movie, item['tmdb_id'])
+
+            url = xc.get_stream_url("movie", str(item['stream_id']), movie['container_extension'])
+            item['strm'] = (strm_path, url)
+            if item['info'] is not None:
+                # The NFO gets the details on a copy, the listing dict is left as fetched
+                movie = dict(movie, info=item['info'])
+                if item['tmdb_id']:
+                    movie['tmdb'] = item['tmdb_id']
+            item['nfo'] = (nfo_path, nfo.movie(movie))
+            return item
+
+        async def write_movie(item):
+            for path in item['dirs']:
+                fm.ensure_directory(path)
+            strm_path, url = item['strm']
+            nfo_path, content = item['nfo']
+            item['files'] = [(strm_path, url.encode('utf-8')), (nfo_path, content.encode('utf-8'))]
+            # Both files of a movie in a single handoff to the IO pool
+            await fm.write_files(item['files'])
+
+            # Renamed (e.g. a TMDB id showed up): the files recorded at the old location go
+            item['stale_paths'] = [p for p in item['recorded_paths'] if p not in (strm_path, nfo_path)]
+            if item['stale_paths']:
+                old_dirs = {os.path.dirname(p) for p in item['stale_paths']} - set(item['dirs'])
+                await fm.remove_paths(item['stale_paths'], prune_dirs=old_dirs)
+            return item
+
+        def persist_movies(batch):
+            now = datetime.utcnow()
+            bulk_upsert(db, MovieCache.__table__, [{
+                'subscription_id': subscription_id,
+                'stream_id': item['stream_id'],
+                'name': item['movie']['name'],
+                'category_id': item['movie']['category_id'],
+                'container_extension': item['movie']['container_extension'],
+                'tmdb_id': str(item['tmdb_id']) if item['tmdb_id'] else None,
+                'fingerprint': fingerprints[item['stream_id']]
+            } for item in batch], ['subscription_id', 'stream_id'])
+
+            stale_paths = [p for item in batch for p in item['stale_paths']]
+            fm.on_publish(lambda: forget_paths(db, stale_paths))
+            record_files(db, [
+                row for item in batch
+                for row in manifest_rows(SOURCE_XTREAM, subscription_id, "movie", item['stream_id'], item['files'], now=now)
+            ])
+
+            if app_settings.VOD_INFO_CACHE_TTL_HOURS > 0:
+                bulk_upsert(db, VodInfoCache.__table__, [{
+                    'subscription_id': subscription_id,
+                    'stream_id': item['stream_id'],
+                    'info': item['fetched_info'],
+                    'fingerprint': item['info_fingerprint'],
+                    'fetched_at': now
+                } for item in batch if item['fetched_info'] is not None], ['subscription_id', 'stream_id'])
+
+            record_sync_stats(sync_state, concurrency=xc.limiter.snapshot(), vod_info_cache=dict(info_cache_stats))
+            db.commit()
+
+        # Staged pipeline: a slow get_vod_info only holds one fetch worker, never a whole batch
+        batcher = CommitBatcher(persist_movies, app_settings.SYNC_COMMIT_BATCH_SIZE, app_settings.SYNC_COMMIT_INTERVAL)
+        pipeline = (
+            Pipeline(queue_size=app_settings.SYNC_QUEUE_SIZE)
+            .add_stage("fetch", fetch_movie_details, concurrency=xc.limiter.max_limit)
+            .add_stage("render", render_movie)
+            .add_stage("write", write_movie, concurrency=app_settings.SYNC_WRITE_CONCURRENCY)
+            .add_stage("persist", batcher.add, fatal=True)
+        )
+        await pipeline.run(feed_movies())
+        batcher.flush()
+        record_sync_stats(sync_state, pipeline=pipeline.get_stats(), vod_info_cache=dict(info_cache_stats))
 
         sync_state.items_added = len(to_add_update)
         sync_state.items_deleted = len(to_delete)
+        sync_state.watermark = highest_added
+        if not incremental:
+            sync_state.last_full_sync = datetime.utcnow()
+        record_sync_stats(sync_state, http=xc.get_connection_stats(), concurrency=xc.limiter.snapshot(), files=fm.get_write_stats(), watermark=highest_added)
         sync_state.status = SyncStatus.SUCCESS
         db.commit()
 
     except Exception as e:
         logger.exception("Error syncing movies")
+        record_sync_stats(sync_state, http=xc.get_connection_stats(), concurrency=xc.limiter.snapshot(), files=fm.get_write_stats())
         sync_state.status = SyncStatus.FAILED
         sync_state.error_message = str(e)
         db.commit()
         raise
 
-async def process_series(db: Session, xc: XtreamClient, fm: FileManager, subscription_id: int):
+async def process_series(db: Session, xc: XtreamClient, fm: FileManager, subscription_id: int, force: bool = False):
     # Get settings
     from app.models.settings import SettingsModel
     settings_rows = db.query(SettingsModel).all()
@@ -231,6 +532,8 @@ async def process_series(db: Session, xc: XtreamClient, fm: FileManager, subscri
     prefix_regex = settings.get("PREFIX_REGEX")
     format_date = settings.get("FORMAT_DATE_IN_TITLE") == "true"
     clean_name = settings.get("CLEAN_NAME") == "true"
+    # Title rules are compiled once for the whole sync
+    nfo = fm.get_nfo_renderer(prefix_regex, format_date, clean_name)
     
     use_season_folders = settings.get("SERIES_USE_SEASON_FOLDERS", "true") == "true"
     include_series_name = settings.get("SERIES_INCLUDE_NAME_IN_FILENAME", "false") == "true"
@@ -247,64 +550,204 @@ async def process_series(db: Session, xc: XtreamClient, fm: FileManager, subscri
     
     sync_state.status = SyncStatus.RUNNING
     sync_state.last_sync = datetime.utcnow()
+    sync_state.stats = {}
     db.commit()
 
     try:
         categories = await xc.get_series_categories()
         cat_map = {c['category_id']: c['category_name'] for c in categories}
 
-        all_series = await xc.get_series()
-
         # Filter by selected categories if any
         selected_cats = db.query(SelectedCategory).filter(
             SelectedCategory.subscription_id == subscription_id,
             SelectedCategory.type == "series"
         ).all()
-        
-        if selected_cats:
-            selected_ids = {s.category_id for s in selected_cats}
-            all_series = [s for s in all_series if s['category_id'] in selected_ids]
+        selected_ids = {s.category_id for s in selected_cats}
         
         cached_series = {s.series_id: s for s in db.query(SeriesCache).filter(SeriesCache.subscription_id == subscription_id).all()}
         
         to_add_update = []
+        to_refresh = []
         to_delete = []
+        fingerprints = {}
+        to_backfill = []
+        # Shows left alone whose files were written before the manifest existed
+        to_record = []
+        recorded_series = recorded_item_ids(db, SOURCE_XTREAM, subscription_id, "series")
+        # A show counts as recorded once every cached episode of it is too
+        recorded_series -= {str(series_id) for series_id in db.execute(
+            select(EpisodeCache.series_id).distinct().where(
+                EpisodeCache.subscription_id == subscription_id,
+                ~recorded_clause(SOURCE_XTREAM, subscription_id, "episode", EpisodeCache.episode_id)
+            )
+        ).scalars()}
         current_ids = set()
 
-        for series in all_series:
+        # Stream the catalog so only changed items are kept in memory
+        async for series in iter_catalog(xc, "series", categories, selected_ids, sync_state):
+            if selected_ids and series['category_id'] not in selected_ids:
+                continue
+
             series_id = int(series['series_id'])
             current_ids.add(series_id)
+            fingerprint = record_fingerprint(series, SERIES_FINGERPRINT_FIELDS)
+            last_modified = series.get('last_modified')
             
             cached = cached_series.get(series_id)
-            if not cached:
-                to_add_update.append(series)
+            if force or not cached:
+                changed = True
+            elif cached.fingerprint is None:
+                # Row written before fingerprints existed: fall back to the old check once
+                changed = cached.name != series['name']
+                if not changed:
+                    to_backfill.append({'subscription_id': subscription_id, 'series_id': series_id, 'fingerprint': fingerprint, 'last_modified': last_modified})
+            elif cached.fingerprint == fingerprint:
+                changed = False
+            elif (last_modified and cached.last_modified == str(last_modified)
+                    and cached.name == series['name'] and cached.category_id == series['category_id']):
+                # Episodes can't have changed, only the show's own metadata: refresh tvshow.nfo without get_series_info
+                to_refresh.append((series, cached))
+                fingerprints[series_id] = fingerprint
+                changed = False
             else:
-                if cached.name != series['name']:
-                    to_add_update.append(series)
+                changed = True
+
+            if changed:
+                to_add_update.append(series)
+                fingerprints[series_id] = fingerprint
+            elif str(series_id) not in recorded_series:
+                to_record.append((series, cached, fingerprint))
+
+        bulk_upsert(db, SeriesCache.__table__, to_backfill, ['subscription_id', 'series_id'])
 
         for series_id, cached in cached_series.items():
             if series_id not in current_ids:
                 to_delete.append(cached)
 
-        # Deletions
+        # Deletions (on the IO thread pool, the event loop keeps serving requests)
+        paths_to_remove = []
+        category_dirs = set()
+        recorded = load_item_paths(db, SOURCE_XTREAM, subscription_id, "series", [s.series_id for s in to_delete])
         for series in to_delete:
             cat_name = cat_map.get(series.category_id, "Uncategorized")
             safe_cat = fm.sanitize_name(cat_name)
             safe_name = fm.sanitize_name(series.name)
+            category_dirs.add(f"{fm.output_dir}/{safe_cat}")
+
+            # The manifest knows the show's folder from its tvshow.nfo
+            show_paths = recorded.get(str(series.series_id))
+            if show_paths:
+                paths_to_remove += [os.path.dirname(path) for path in show_paths]
+                continue
             
             # Check for TMDB folder if applicable
             tmdb_id = series.tmdb_id
-            potential_paths = [
-                 f"{fm.output_dir}/{safe_cat}/{safe_name}",
-                 f"{fm.output_dir}/{safe_cat}/{safe_name} {{tmdb-{tmdb_id}}}" if tmdb_id else None
-            ]
-
-            for path in potential_paths:
-                if path and os.path.exists(path):
-                    shutil.rmtree(path)
-            
-            await fm.delete_directory_if_empty(f"{fm.output_dir}/{safe_cat}")
-            db.delete(series)
+            paths_to_remove.append(f"{fm.output_dir}/{safe_cat}/{safe_name}")
+            if tmdb_id:
+                paths_to_remove.append(f"{fm.output_dir}/{safe_cat}/{safe_name} {{tmdb-{tmdb_id}}}")
+
+        # Categories are pruned once, after all of their removals
+        await fm.remove_paths(paths_to_remove, prune_dirs=category_dirs)
+
+        removed_ids = [s.id for s in to_delete]
+        removed_series_ids = [s.series_id for s in to_delete]
+        episode_stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        episode_stats["deleted"] = sum(
+            db.query(EpisodeCache.id).filter(
+                EpisodeCache.subscription_id == subscription_id,
+                EpisodeCache.series_id.in_(removed_series_ids[i:i + ID_BATCH_SIZE])
+            ).count()
+            for i in range(0, len(removed_series_ids), ID_BATCH_SIZE)
+        )
+
+        def forget_removed_series():
+            bulk_delete_ids(db, SeriesCache.__table__, removed_ids)
+            bulk_delete_ids(db, EpisodeCache.__table__, removed_series_ids, column="series_id", subscription_id=subscription_id)
+            forget_items(db, SOURCE_XTREAM, subscription_id, "series", removed_series_ids)
+            forget_items(db, SOURCE_XTREAM, subscription_id, "episode", removed_series_ids, by="parent_id")
+
+        # Staged, the rows stay until the files are gone from the live tree: a sync that never
+        # publishes leaves the shows cached, and the next one removes them again
+        fm.on_publish(forget_removed_series)
+        db.commit()
+
+        def series_dir_for(series, tmdb_id):
+            cat_name = cat_map.get(series['category_id'], "Uncategorized")
+            safe_cat = fm.sanitize_name(cat_name)
+            safe_name = fm.sanitize_name(series['name'])
+
+            folder_name = safe_name
+            if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
+                 folder_name = f"{safe_name} {{tmdb-{tmdb_id}}}"
+
+            return f"{fm.output_dir}/{safe_cat}/{folder_name}"
+
+        def series_row(series, tmdb_id):
+            return {
+                'subscription_id': subscription_id,
+                'series_id': int(series['series_id']),
+                'name': series['name'],
+                'category_id': series['category_id'],
+                'tmdb_id': str(tmdb_id) if tmdb_id else None,
+                'fingerprint': fingerprints[int(series['series_id'])],
+                'last_modified': str(series['last_modified']) if series.get('last_modified') else None
+            }
+
+        # Record the files of shows synced before the manifest, from where they were written:
+        # tvshow.nfo from the cached TMDB id, episodes from their cached paths
+        backfilled = 0
+        refetch_ids = set()
+        for i in range(0, len(to_record), app_settings.SYNC_COMMIT_BATCH_SIZE):
+            batch = to_record[i:i + app_settings.SYNC_COMMIT_BATCH_SIZE]
+            batch_ids = [int(series['series_id']) for series, _, _ in batch]
+            episodes = load_episode_cache(db, subscription_id, batch_ids)
+            # Partly recorded shows keep the rows they have, with their digests
+            already_recorded = {
+                path
+                for kind, by in (("series", "item_id"), ("episode", "parent_id"))
+                for paths in load_item_paths(db, SOURCE_XTREAM, subscription_id, kind, batch_ids, by=by).values()
+                for path in paths
+            }
+            now = datetime.utcnow()
+            rows = []
+            for series, cached, fingerprint in batch:
+                series_id = int(series['series_id'])
+                if not episodes[series_id]:
+                    # Episodes never cached, their paths are unknown: the show is fetched once more
+                    refetch_ids.add(series_id)
+                    to_add_update.append(series)
+                    fingerprints[series_id] = fingerprint
+                    continue
+                show_nfo = f"{series_dir_for(series, cached.tmdb_id)}/tvshow.nfo"
+                rows += existing_file_rows(SOURCE_XTREAM, subscription_id, "series", series_id, [show_nfo], now=now)
+                for episode in episodes[series_id].values():
+                    if episode.path:
+                        base = f"{fm.output_dir}/{episode.path}"
+                        rows += existing_file_rows(
+                            SOURCE_XTREAM, subscription_id, "episode", episode.episode_id,
+                            [f"{base}.strm", f"{base}.nfo"], parent_id=series_id, now=now
+                        )
+                backfilled += 1
+            record_files(db, [row for row in rows if row['path'] not in already_recorded])
+        to_refresh = [(series, cached) for series, cached in to_refresh if int(series['series_id']) not in refetch_ids]
+        record_sync_stats(sync_state, manifest_backfilled=backfilled)
+        db.commit()
+
+        # Listing-only changes: the TMDB id learned from get_series_info is kept from the cache
+        refreshed_nfos = []
+        for series, cached in to_refresh:
+            if cached.tmdb_id:
+                series['tmdb'] = cached.tmdb_id
+            series_dir = series_dir_for(series, cached.tmdb_id)
+            fm.ensure_directory(series_dir)
+            refreshed_nfos.append((f"{series_dir}/tvshow.nfo", nfo.show(series).encode('utf-8')))
+        await fm.write_files(refreshed_nfos)
+        bulk_upsert(db, SeriesCache.__table__, [series_row(series, cached.tmdb_id) for series, cached in to_refresh], ['subscription_id', 'series_id'])
+        record_files(db, [
+            row for (series, _), show_file in zip(to_refresh, refreshed_nfos)
+            for row in manifest_rows(SOURCE_XTREAM, subscription_id, "series", series['series_id'], [show_file])
+        ])
+        db.commit()
 
         # Process Additions/Updates Parallel
         try:
@@ -312,135 +755,259 @@ async def process_series(db: Session, xc: XtreamClient, fm: FileManager, subscri
         except ValueError:
             parallelism = 5
 
-        batch_size = parallelism
-        semaphore = asyncio.Semaphore(batch_size)
-
-        async def process_single_series(series):
-            async with semaphore:
-                try:
-                    series_id = int(series['series_id'])
-                    name = series['name']
-                    cat_id = series['category_id']
-                    tmdb_id = series.get('tmdb')
-
-                    # Fetch Episodes and Info
-                    info_response = await xc.get_series_info(str(series_id))
-                    series_info = info_response.get('info', {})
-                    episodes_data = info_response.get('episodes', {})
-                    
-                    if isinstance(episodes_data, list):
-                        episodes_data = {}
-                    
-                    if series_info.get('tmdb_id'):
-                         tmdb_id = series_info.get('tmdb_id')
-                         series['tmdb'] = tmdb_id # For NFO
-
-                    cat_name = cat_map.get(cat_id, "Uncategorized")
-                    safe_cat = fm.sanitize_name(cat_name)
-                    safe_name = fm.sanitize_name(name)
-                    
-                    folder_name = safe_name
-                    if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
-                         folder_name = f"{safe_name} {{tmdb-{tmdb_id}}}"
-
-                    series_dir = f"{fm.output_dir}/{safe_cat}/{folder_name}"
-                    fm.ensure_directory(series_dir)
-                    
-                    # Always create tvshow.nfo
-                    nfo_path = f"{series_dir}/tvshow.nfo"
-                    await fm.write_nfo(nfo_path, fm.generate_show_nfo(series, prefix_regex, format_date, clean_name))
-                    
-                    for season_key, episodes in episodes_data.items():
-                        season_num = int(season_key)
-                        
-                        # SEASON FOLDERS LOGIC
-                        if use_season_folders:
-                            season_dir_name = f"Season {season_num:02d}"
-                            current_dir = f"{series_dir}/{season_dir_name}"
-                        else:
-                            current_dir = series_dir
-                            
-                        fm.ensure_directory(current_dir)
-                        
-                        for ep in episodes:
-                            ep_num = int(ep['episode_num'])
-                            ep_id = ep['id']
-                            container = ep['container_extension']
-                            title = ep.get('title', '')
-                            
-                            # Clean Episode Title
-                            # 1. Provide a hook to remove Series Name if it's prefixed
-                            # Just minimal heuristic: if title starts with series name, strip it
-                            # But risky. Let's rely on standard logic for now.
-                            
-                            formatted_ep = f"S{season_num:02d}E{ep_num:02d}"
-                            safe_ep_title = ""
-                            
-                            if title:
-                                # Remove extension if present in title
-                                if title.lower().endswith(f".{container}"):
-                                    title = title[:-len(container)-1]
-                                    
-                                safe_ep_title = fm.sanitize_name(title)
-                            
-                            if include_series_name:
-                                 filename_base = f"{safe_name} - {formatted_ep}"
-                            else:
-                                 filename_base = formatted_ep
-                                 
-                            if safe_ep_title:
-                                 filename = f"{filename_base} - {safe_ep_title}"
-                            else:
-                                 filename = filename_base
-                            
-                            strm_path = f"{current_dir}/{filename}.strm"
-                            url = xc.get_stream_url("series", str(ep_id), container)
-                            await fm.write_strm(strm_path, url)
-                            
-                            # Episode NFO
-                            ep_nfo_path = f"{current_dir}/{filename}.nfo"
-                            ep_nfo_content = fm.generate_episode_nfo(ep, name, season_num, ep_num)
-                            await fm.write_nfo(ep_nfo_path, ep_nfo_content)
-
-                    return {
-                        'action': 'update_cache',
-                        'data': {
-                            'series_id': series_id,
-                            'name': name,
-                            'category_id': cat_id,
-                            'tmdb_id': str(tmdb_id) if tmdb_id else None
-                        }
+        # The configured parallelism is only the starting point, the limiter adapts it
+        xc.limiter.reset(parallelism)
+
+        # Category folders in one pass, the write stage then finds them already known
+        fm.ensure_directories(f"{fm.output_dir}/{fm.sanitize_name(cat_map.get(s['category_id'], 'Uncategorized'))}" for s in to_add_update)
+
+        async def feed_series():
+            # Where each show's tvshow.nfo was written and its cached episodes, a batch of shows per lookup:
+            # the render stage never has to query the database from the event loop
+            for i in range(0, len(to_add_update), app_settings.SYNC_COMMIT_BATCH_SIZE):
+                batch = to_add_update[i:i + app_settings.SYNC_COMMIT_BATCH_SIZE]
+                recorded = load_item_paths(db, SOURCE_XTREAM, subscription_id, "series", [s['series_id'] for s in batch])
+                recorded_episodes = load_item_paths(db, SOURCE_XTREAM, subscription_id, "episode", [s['series_id'] for s in batch], by="parent_id")
+                episodes = load_episode_cache(db, subscription_id, [int(s['series_id']) for s in batch])
+                for series in batch:
+                    yield {
+                        'series': series,
+                        'recorded_paths': recorded.get(str(series['series_id']), []),
+                        'recorded_episode_paths': set(recorded_episodes.get(str(series['series_id']), [])),
+                        'cached_episodes': episodes[int(series['series_id'])]
                     }
-                except Exception as e:
-                     logger.error(f"Error processing series {series.get('name')}: {e}")
-                     return None
-
-        chunk_size = 20
-        for i in range(0, len(to_add_update), chunk_size):
-            chunk = to_add_update[i:i + chunk_size]
-            results = await asyncio.gather(*[process_single_series(s) for s in chunk])
-            
-            for res in results:
-                if res and res['action'] == 'update_cache':
-                    d = res['data']
-                    cached = cached_series.get(d['series_id'])
-                    if not cached:
-                        cached = SeriesCache(subscription_id=subscription_id, series_id=d['series_id'])
-                        db.add(cached)
-                    
-                    cached.name = d['name']
-                    cached.category_id = d['category_id']
-                    cached.tmdb_id = d['tmdb_id']
-            
+
+        async def fetch_series_info(item):
+            # Fetch Episodes and Info
+            item['info_response'] = await xc.get_series_info(str(item['series']['series_id']))
+            return item
+
+        async def render_series(item):
+            series = item['series']
+            info_response = item['info_response']
+            name = series['name']
+            tmdb_id = series.get('tmdb')
+
+            series_info = info_response.get('info', {})
+            episodes_data = info_response.get('episodes', {})
+
+            if isinstance(episodes_data, list):
+                episodes_data = {}
+
+            if series_info.get('tmdb_id'):
+                 tmdb_id = series_info.get('tmdb_id')
+                 series['tmdb'] = tmdb_id # For NFO
+
+            safe_name = fm.sanitize_name(name)
+            series_id = int(series['series_id'])
+            series_dir = series_dir_for(series, tmdb_id)
+            dirs = [series_dir]
+
+            # Always create tvshow.nfo
+            show_nfo_path = f"{series_dir}/tvshow.nfo"
+            nfo_files = [(show_nfo_path, nfo.show(series))]
+            strm_files = []
+            # Manifest owner of every written path: (kind, item id)
+            owners = {show_nfo_path: ("series", series_id)}
+            # Unchanged episodes written before the manifest existed
+            backfill_rows = []
+            episode_rows = []
+            counts = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+
+            cached_episodes = item['cached_episodes']
+            seen_episodes = set()
+            expected_paths = set()
+            remove_paths = []
+            prune_dirs = set()
+
+            # The show moved (new TMDB id, renamed, other category): its old folder goes once emptied
+            for old_path in item['recorded_paths']:
+                if old_path != show_nfo_path:
+                    remove_paths.append(old_path)
+                    prune_dirs.add(os.path.dirname(old_path))
+
+            for season_key, episodes in episodes_data.items():
+                season_num = int(season_key)
+
+                # SEASON FOLDERS LOGIC
+                if use_season_folders:
+                    season_dir_name = f"Season {season_num:02d}"
+                    current_dir = f"{series_dir}/{season_dir_name}"
+                else:
+                    current_dir = series_dir
+
+                for ep in episodes:
+                    ep_num = int(ep['episode_num'])
+                    ep_id = ep['id']
+                    container = ep['container_extension']
+                    title = ep.get('title', '')
+
+                    # Clean Episode Title
+                    # 1. Provide a hook to remove Series Name if it's prefixed
+                    # Just minimal heuristic: if title starts with series name, strip it
+                    # But risky. Let's rely on standard logic for now.
+
+                    formatted_ep = f"S{season_num:02d}E{ep_num:02d}"
+                    safe_ep_title = ""
+
+                    if title:
+                        # Remove extension if present in title
+                        if title.lower().endswith(f".{container}"):
+                            title = title[:-len(container)-1]
+
+                        safe_ep_title = fm.sanitize_name(title)
+
+                    if include_series_name:
+                         filename_base = f"{safe_name} - {formatted_ep}"
+                    else:
+                         filename_base = formatted_ep
+
+                    if safe_ep_title:
+                         filename = f"{filename_base} - {safe_ep_title}"
+                    else:
+                         filename = filename_base
+
+                    url = xc.get_stream_url("series", str(ep_id), container)
+                    relative_path = f"{current_dir}/{filename}"[len(fm.output_dir) + 1:]
+                    fingerprint = episode_fingerprint(ep, name, season_num, relative_path, url)
+
+                    episode_id = int(ep_id)
+                    seen_episodes.add(episode_id)
+                    strm_path = f"{current_dir}/{filename}.strm"
+                    ep_nfo_path = f"{current_dir}/{filename}.nfo"
+                    expected_paths.update((strm_path, ep_nfo_path))
+                    cached = cached_episodes.get(episode_id)
+                    if cached and cached.fingerprint == fingerprint and not force:
+                        counts["unchanged"] += 1
+                        if strm_path not in item['recorded_episode_paths']:
+                            backfill_rows += existing_file_rows(
+                                SOURCE_XTREAM, subscription_id, "episode", episode_id, [strm_path, ep_nfo_path], parent_id=series_id
+                            )
+                        continue
+                    counts["updated" if cached else "added"] += 1
+
+                    # A renamed episode leaves its old files behind otherwise
+                    if cached and cached.path and cached.path != relative_path:
+                        old_base = f"{fm.output_dir}/{cached.path}"
+                        remove_paths += [f"{old_base}.strm", f"{old_base}.nfo"]
+                        prune_dirs.add(os.path.dirname(old_base))
+
+                    if current_dir not in dirs:
+                        dirs.append(current_dir)
+                    strm_files.append((strm_path, url))
+
+                    # Episode NFO
+                    nfo_files.append((ep_nfo_path, nfo.episode(ep, name, season_num, ep_num)))
+                    owners[strm_path] = owners[ep_nfo_path] = ("episode", episode_id)
+
+                    episode_rows.append({
+                        'subscription_id': subscription_id,
+                        'series_id': series_id,
+                        'episode_id': episode_id,
+                        'season_num': season_num,
+                        'episode_num': ep_num,
+                        'title': ep.get('title'),
+                        'container_extension': container,
+                        'path': relative_path,
+                        'fingerprint': fingerprint
+                    })
+
+            # Episodes the provider dropped
+            # An empty episode list is more likely a provider hiccup than a wiped show, keep the files then
+            dropped = [e for episode_id, e in cached_episodes.items() if episode_id not in seen_episodes] if seen_episodes else []
+            for episode in dropped:
+                if episode.path:
+                    old_base = f"{fm.output_dir}/{episode.path}"
+                    remove_paths += [f"{old_base}.strm", f"{old_base}.nfo"]
+                    prune_dirs.add(os.path.dirname(old_base))
+            counts["deleted"] = len(dropped)
+            if seen_episodes:
+                # Recorded episode files nothing maps to any more, e.g. left by a rename whose staged sync never published
+                for old_path in item['recorded_episode_paths'] - expected_paths - set(remove_paths):
+                    remove_paths.append(old_path)
+                    prune_dirs.add(os.path.dirname(old_path))
+
+            return {
+                'series': series,
+                'tmdb_id': tmdb_id,
+                'dirs': dirs,
+                'strm_files': strm_files,
+                'nfo_files': nfo_files,
+                'owners': owners,
+                'remove_paths': remove_paths,
+                # Season folders left empty go too (deepest first), never the series folder itself
+                'prune_dirs': sorted((d for d in prune_dirs if d != series_dir), key=len, reverse=True),
+                'episode_rows': episode_rows,
+                'backfill_rows': backfill_rows,
+                'dropped_episode_ids': [e.id for e in dropped],
+                'episode_counts': counts
+            }
+
+        async def write_series(item):
+            if item['remove_paths']:
+                await fm.remove_paths(item['remove_paths'], prune_dirs=item['prune_dirs'])
+            for path in item['dirs']:
+                fm.ensure_directory(path)
+            item['files'] = (
+                [(path, url.encode('utf-8')) for path, url in item['strm_files']] +
+                [(path, content.encode('utf-8')) for path, content in item['nfo_files']]
+            )
+            await fm.write_files(item['files'])
+            return item
+
+        def persist_series(batch):
+            bulk_upsert(db, SeriesCache.__table__, [series_row(item['series'], item['tmdb_id']) for item in batch], ['subscription_id', 'series_id'])
+            bulk_upsert(db, EpisodeCache.__table__, [row for item in batch for row in item['episode_rows']], ['subscription_id', 'episode_id'])
+            # Dropped episodes and replaced files are only forgotten once their removal is live
+            dropped_ids = [i for item in batch for i in item['dropped_episode_ids']]
+            removed_paths = [p for item in batch for p in item['remove_paths']]
+            fm.on_publish(lambda: bulk_delete_ids(db, EpisodeCache.__table__, dropped_ids))
+            fm.on_publish(lambda: forget_paths(db, removed_paths))
+
+            now = datetime.utcnow()
+            manifest = [row for item in batch for row in item['backfill_rows']]
+            for item in batch:
+                series_id = item['series']['series_id']
+                for path, data in item['files']:
+                    kind, item_id = item['owners'][path]
+                    parent_id = series_id if kind == "episode" else None
+                    manifest += manifest_rows(SOURCE_XTREAM, subscription_id, kind, item_id, [(path, data)], parent_id=parent_id, now=now)
+            record_files(db, manifest)
+
+            for item in batch:
+                for key, value in item['episode_counts'].items():
+                    episode_stats[key] += value
+            record_sync_stats(sync_state, concurrency=xc.limiter.snapshot(), episodes=dict(episode_stats))
             db.commit()
 
-        sync_state.items_added = len(to_add_update)
+        # Staged pipeline: a slow get_series_info only holds one fetch worker, never a whole batch
+        batcher = CommitBatcher(persist_series, app_settings.SYNC_COMMIT_BATCH_SIZE, app_settings.SYNC_COMMIT_INTERVAL)
+        pipeline = (
+            Pipeline(queue_size=app_settings.SYNC_QUEUE_SIZE)
+            .add_stage("fetch", fetch_series_info, concurrency=xc.limiter.max_limit)
+            .add_stage("render", render_series)
+            .add_stage("write", write_series, concurrency=app_settings.SYNC_WRITE_CONCURRENCY)
+            .add_stage("persist", batcher.add, fatal=True)
+        )
+        await pipeline.run(feed_series())
+        batcher.flush()
+        record_sync_stats(sync_state, pipeline=pipeline.get_stats())
+
+        sync_state.items_added = len(to_add_update) + len(to_refresh)
         sync_state.items_deleted = len(to_delete)
+        record_sync_stats(sync_state, http=xc.get_connection_stats(), concurrency=xc.limiter.snapshot(), files=fm.get_write_stats(), episodes=episode_stats)
+        record_sync_stats(sync_state, series={
+            "fetched": len(to_add_update),
+            "listing_only": len(to_refresh),
+            "unchanged": len(current_ids) - len(to_add_update) - len(to_refresh),
+            "forced": force
+        })
         sync_state.status = SyncStatus.SUCCESS
         db.commit()
 
     except Exception as e:
         logger.exception("Error syncing series")
+        record_sync_stats(sync_state, http=xc.get_connection_stats(), concurrency=xc.limiter.snapshot(), files=fm.get_write_stats())
         sync_state.status = SyncStatus.FAILED
         sync_state.error_message = str(e)
         db.commit()
@@ -459,16 +1026,31 @@ def sync_movies_task(subscription_id: int):
             logger.info(f"Subscription {sub.name} is inactive")
             return "Subscription inactive"
 
-        xc = XtreamClient(sub.xtream_url, sub.username, sub.password)
-        fm = FileManager(sub.movies_dir)
+        xc = build_xtream_client(sub)
+        fm = FileManager(sub.movies_dir, app_settings.FILE_IO_WORKERS, app_settings.FILE_WRITE_BATCH_SIZE)
         
-        asyncio.run(process_movies(db, xc, fm, subscription_id))
+        try:
+            # A staged sync that never published (worker crashed, task revoked) left the DB ahead of the files
+            forget_unpublished_sync(db, subscription_id, SyncType.MOVIES)
+            if app_settings.STAGED_OUTPUT:
+                mark_unpublished(db, subscription_id, SyncType.MOVIES, datetime.utcnow())
+                fm.begin_staging()
+            asyncio.run(run_with_client(process_movies, db, xc, fm, subscription_id))
+            fm.publish()
+            mark_unpublished(db, subscription_id, SyncType.MOVIES, None)
+        except Exception as e:
+            # close() drops the staged copy, what the sync committed for it is reset with it
+            db.rollback()
+            forget_unpublished_sync(db, subscription_id, SyncType.MOVIES, error=str(e))
+            raise
+        finally:
+            fm.close()
         return f"Movies synced successfully for {sub.name}"
     finally:
         db.close()
 
 @celery_app.task
-def sync_series_task(subscription_id: int):
+def sync_series_task(subscription_id: int, force: bool = False):
     db = SessionLocal()
     try:
         sub = db.query(Subscription).filter(Subscription.id == subscription_id).first()
@@ -480,10 +1062,25 @@ def sync_series_task(subscription_id: int):
             logger.info(f"Subscription {sub.name} is inactive")
             return "Subscription inactive"
 
-        xc = XtreamClient(sub.xtream_url, sub.username, sub.password)
-        fm = FileManager(sub.series_dir)
+        xc = build_xtream_client(sub)
+        fm = FileManager(sub.series_dir, app_settings.FILE_IO_WORKERS, app_settings.FILE_WRITE_BATCH_SIZE)
         
-        asyncio.run(process_series(db, xc, fm, subscription_id))
+        try:
+            # A staged sync that never published (worker crashed, task revoked) left the DB ahead of the files
+            forget_unpublished_sync(db, subscription_id, SyncType.SERIES)
+            if app_settings.STAGED_OUTPUT:
+                mark_unpublished(db, subscription_id, SyncType.SERIES, datetime.utcnow())
+                fm.begin_staging()
+            asyncio.run(run_with_client(process_series, db, xc, fm, subscription_id, force=force))
+            fm.publish()
+            mark_unpublished(db, subscription_id, SyncType.SERIES, None)
+        except Exception as e:
+            # close() drops the staged copy, what the sync committed for it is reset with it
+            db.rollback()
+            forget_unpublished_sync(db, subscription_id, SyncType.SERIES, error=str(e))
+            raise
+        finally:
+            fm.close()
         return f"Series synced successfully for {sub.name}"
     finally:
         db.close()
@@ -0,0 +1,100 @@
+"""Microbenchmark: M3U parsing throughput on a synthetic playlist.
+
+Run from the backend directory:
+
+    python -m benchmarks.m3u_parse [entries]
+
+Writes a playlist of `entries` VOD entries (1M by default) to a temporary
+file and streams it through M3UParser, reporting lines and entries per
+second. The EXTINF attribute step is also timed against the original
+six-search implementation on the same lines, after checking both agree
+wherever no comma sits inside a quoted attribute.
+"""
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+
+from app.services.m3u_parser import M3UParser
+
+def legacy_parse_extinf(line: str) -> dict:
+    """M3UParser._parse_extinf as it was before the single-pass scanner, kept for comparison"""
+    entry = {'title': '', 'logo': None, 'group_title': None, 'tvg_id': None, 'tvg_name': None, 'entry_type': 'live'}
+    tvg_id_match = re.search(r'tvg-id="([^"]*)"', line)
+    if tvg_id_match:
+        entry['tvg_id'] = tvg_id_match.group(1)
+    tvg_name_match = re.search(r'tvg-name="([^"]*)"', line)
+    if tvg_name_match:
+        entry['tvg_name'] = tvg_name_match.group(1)
+    logo_match = re.search(r'tvg-logo="([^"]*)"', line)
+    if not logo_match:
+        logo_match = re.search(r'logo="([^"]*)"', line)
+    if logo_match:
+        entry['logo'] = logo_match.group(1)
+    group_match = re.search(r'group-title="([^"]*)"', line)
+    if group_match:
+        entry['group_title'] = group_match.group(1)
+    title_match = re.search(r',(.+)$', line)
+    if title_match:
+        entry['title'] = title_match.group(1).strip()
+    return entry
+
+def synthetic_extinf(i: int, rnd: random.Random) -> str:
+    name = rnd.choice([f"Movie {i}", f"Movie {i}, The Sequel", f"Série é {i}"])
+    logo = rnd.choice([f' tvg-logo="http://img.example/{i}.jpg"', f' logo="http://img.example/{i}.png"', ""])
+    return (f'#EXTINF:-1 tvg-id="vod.{i}" tvg-name="{name}"{logo} group-title="Group {i % 250}" '
+            f'tvg-country="FR",{name}{rnd.choice(["", " (2019)", ", extended cut"])}')
+
+def write_playlist(path: str, count: int, seed: int = 1):
+    rnd = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("#EXTM3U\n")
+        for i in range(count):
+            kind = rnd.choice(["movie", "series", "live"])
+            f.write(synthetic_extinf(i, rnd) + "\n")
+            f.write(f"http://provider.example/{kind}/user/pass/{i}.mkv\n")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fd, path = tempfile.mkstemp(suffix=".m3u")
+    os.close(fd)
+    try:
+        write_playlist(path, count)
+        size_mb = os.path.getsize(path) / 1e6
+
+        parser = M3UParser()
+        started = time.perf_counter()
+        entries = sum(1 for _ in parser.iter_file(path))
+        elapsed = time.perf_counter() - started
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"stream parse  {entries} entries, {parser.lines_read} lines ({size_mb:.0f} MB) in {elapsed:.2f}s: "
+              f"{parser.lines_read / elapsed:,.0f} lines/s, {entries / elapsed:,.0f} entries/s, max RSS {max_rss_mb:.0f} MB")
+
+        rnd = random.Random(2)
+        lines = [synthetic_extinf(i, rnd) for i in range(min(count, 200_000))]
+        for line in lines:
+            current = parser._parse_extinf(line)
+            legacy = legacy_parse_extinf(line)
+            # A comma in tvg-name changed the title, the old one is still reported for cached entries
+            assert current.get('legacy_title', current['title']) == legacy['title'], line
+            if ',' not in current['tvg_name']:
+                assert all(current[key] == legacy[key] for key in legacy), line
+
+        started = time.perf_counter()
+        for line in lines:
+            legacy_parse_extinf(line)
+        legacy_time = time.perf_counter() - started
+        started = time.perf_counter()
+        for line in lines:
+            parser._parse_extinf(line)
+        current_time = time.perf_counter() - started
+        print(f"EXTINF lines  legacy {len(lines) / legacy_time:,.0f} lines/s  single pass {len(lines) / current_time:,.0f} lines/s  "
+              f"(x{legacy_time / current_time:.2f}, all attributes kept)")
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Microbenchmark: NFO rendering, the original concatenation code vs NfoRenderer.
+
+Run from the backend directory:
+
+    python -m benchmarks.nfo_render [items]
+
+Both implementations render the same synthetic catalog; the script checks the
+output is byte-identical before reporting timings.
+"""
+import random
+import re
+import sys
+import time
+from typing import Optional
+
+from app.services.file_manager import FileManager
+
+class LegacyNfo:
+    """The NFO generators as they were before NfoRenderer, kept verbatim for comparison"""
+
+    def generate_movie_nfo(self, movie_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
+        """Generate NFO file for a movie with comprehensive metadata"""
+        tmdb_id = movie_data.get('tmdb') or movie_data.get('tmdb_id', '')
+        # Use o_name as title if available, otherwise name
+        title = movie_data.get('o_name') or movie_data.get('name', 'Unknown')
+        
+        # Strip language prefix
+        regex = prefix_regex if prefix_regex else r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)'
+        try:
+            title = re.sub(regex, '', title)
+        except re.error:
+            title = re.sub(r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)', '', title)
+            
+        # Format date at end
+        if format_date:
+            title = re.sub(r'[_\s](\d{4})$', r' (\1)', title)
+            
+        # Clean name
+        if clean_name:
+            title = title.replace('_', ' ')
+        
+        plot = movie_data.get('plot') or movie_data.get('description', '')
+        year = movie_data.get('year') or movie_data.get('releasedate', '')
+        rating = movie_data.get('rating') or movie_data.get('rating_5based', '')
+        genre = movie_data.get('genre', '')
+        director = movie_data.get('director', '')
+        cast_list = movie_data.get('cast') or movie_data.get('actors', '')
+        duration = movie_data.get('duration') or movie_data.get('episode_run_time', '')
+        trailer = movie_data.get('youtube_trailer', '')
+        cover = movie_data.get('movie_image') or movie_data.get('cover_big') or movie_data.get('stream_icon') or movie_data.get('backdrop_path_original', '')
+        
+        # Handle backdrop/fanart
+        backdrop_path = movie_data.get('backdrop_path', [])
+        fanart = backdrop_path[0] if isinstance(backdrop_path, list) and backdrop_path else ''
+        
+        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<movie>\n'
+        
+        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
+        nfo += f'  <originaltitle>{self._escape_xml(movie_data.get("o_name", ""))}</originaltitle>\n'
+        
+        # TMDB / IMDB IDs
+        if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
+            nfo += f'  <tmdbid>{tmdb_id}</tmdbid>\n'
+            nfo += f'  <uniqueid type="tmdb" default="true">{tmdb_id}</uniqueid>\n'
+        
+        # Try to find IMDB ID in info if available
+        # (This usually requires detailed info fetch)
+        
+        if plot:
+            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
+            nfo += f'  <outline>{self._escape_xml(plot[:200])}</outline>\n'
+        
+        if year:
+            year_str = str(year)[:4] if len(str(year)) >= 4 else str(year)
+            nfo += f'  <year>{year_str}</year>\n'
+            nfo += f'  <premiered>{year_str}-01-01</premiered>\n'
+        
+        # Ratings
+        if rating:
+            try:
+                r_val = float(rating)
+                # If it was 5-based, convert
+                if movie_data.get('rating_5based'):
+                    r_val *= 2
+                
+                nfo += '  <ratings>\n'
+                nfo += f'    <rating name="tmdb" default="true"><value>{r_val:.1f}</value></rating>\n'
+                nfo += '  </ratings>\n'
+                nfo += f'  <userrating>{int(round(r_val))}</userrating>\n'
+            except (ValueError, TypeError):
+                pass
+        
+        # Genre
+        if genre:
+            # Split by comma or slash
+            for g in re.split(r'[,/]', str(genre)):
+                g_str = g.strip()
+                if g_str:
+                    nfo += f'  <genre>{self._escape_xml(g_str)}</genre>\n'
+        
+        # Director
+        if director:
+            nfo += f'  <director>{self._escape_xml(director)}</director>\n'
+        
+        # Cast
+        if cast_list:
+            for actor in str(cast_list).split(','):
+                actor_name = actor.strip()
+                if actor_name:
+                    nfo += f'  <actor><name>{self._escape_xml(actor_name)}</name></actor>\n'
+        
+        # Duration
+        if duration:
+            try:
+                total_mins = 0
+                if ':' in str(duration):
+                    parts = str(duration).split(':')
+                    total_mins = int(parts[0]) * 60 + int(parts[1])
+                else:
+                    total_mins = int(duration)
+                nfo += f'  <runtime>{total_mins}</runtime>\n'
+            except (ValueError, TypeError, IndexError):
+                pass
+
+        # Stream Details (Video/Audio)
+        # Usually from detailed info 'info' dict
+        info = movie_data.get('info', {})
+        nfo += '  <fileinfo>\n    <streamdetails>\n'
+        
+        # Video
+        nfo += '      <video>\n'
+        nfo += f'        <codec>{self._escape_xml(movie_data.get("container_extension", ""))}</codec>\n'
+        if info.get('videoing'): # Check if present
+             pass # Use info from API if mapped
+        if info.get('bitrate'):
+             nfo += f'        <bitrate>{info.get("bitrate")}</bitrate>\n'
+        nfo += '      </video>\n'
+        
+        # Audio
+        if info.get('audio'):
+             nfo += '      <audio>\n'
+             nfo += f'        <codec>{self._escape_xml(info.get("audio", {}).get("codec", ""))}</codec>\n'
+             nfo += '      </audio>\n'
+             
+        nfo += '    </streamdetails>\n  </fileinfo>\n'
+
+        if trailer:
+            nfo += f'  <trailer>plugin://plugin.video.youtube/?action=play_video&amp;videoid={trailer}</trailer>\n'
+        
+        if cover:
+            nfo += f'  <thumb>{cover}</thumb>\n'
+        
+        if fanart:
+            nfo += f'  <fanart><thumb>{fanart}</thumb></fanart>\n'
+        elif cover:
+            nfo += f'  <fanart><thumb>{cover}</thumb></fanart>\n'
+            
+        # MPAA
+        mpaa = movie_data.get('mpaa') or info.get('mpaa')
+        if mpaa:
+             nfo += f'  <mpaa>{self._escape_xml(mpaa)}</mpaa>\n'
+        
+        nfo += '</movie>'
+        return nfo
+
+
+    def generate_show_nfo(self, series_data: dict, prefix_regex: Optional[str] = None, format_date: bool = False, clean_name: bool = False) -> str:
+        """Generate NFO file for a TV show"""
+        tmdb_id = series_data.get('tmdb') or series_data.get('tmdb_id', '')
+        title = series_data.get('o_name') or series_data.get('name', 'Unknown')
+
+        regex = prefix_regex if prefix_regex else r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)'
+        try:
+            title = re.sub(regex, '', title)
+        except re.error:
+            title = re.sub(r'^(?:[A-Za-z0-9.-]+_|[A-Za-z]{2,}\s*-\s*)', '', title)
+            
+        if format_date:
+            title = re.sub(r'[_\s](\d{4})$', r' (\1)', title)
+        if clean_name:
+            title = title.replace('_', ' ')
+        
+        plot = series_data.get('plot') or series_data.get('description', '')
+        year = series_data.get('year') or series_data.get('releaseDate', '')
+        rating = series_data.get('rating') or series_data.get('rating_5based', '')
+        genre = series_data.get('genre', '')
+        cast_list = series_data.get('cast') or series_data.get('actors', '')
+        director = series_data.get('director', '')
+        cover = series_data.get('cover') or series_data.get('cover_big') or series_data.get('stream_icon') or series_data.get('backdrop_path_original', '')
+        
+        backdrop_path = series_data.get('backdrop_path', [])
+        fanart = backdrop_path[0] if isinstance(backdrop_path, list) and backdrop_path else ''
+        
+        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<tvshow>\n'
+        
+        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
+        
+        if tmdb_id and str(tmdb_id) not in ['0', 'None', 'null', '']:
+             nfo += f'  <tmdbid>{tmdb_id}</tmdbid>\n'
+             nfo += f'  <uniqueid type="tmdb" default="true">{tmdb_id}</uniqueid>\n'
+
+        if plot:
+            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
+        
+        if year:
+            year_str = str(year)[:4] if len(str(year)) >= 4 else str(year)
+            nfo += f'  <year>{year_str}</year>\n'
+            nfo += f'  <premiered>{year_str}-01-01</premiered>\n'
+        
+        if rating:
+            try:
+                r_val = float(rating)
+                if series_data.get('rating_5based'):
+                    r_val *= 2
+                
+                nfo += '  <ratings>\n'
+                nfo += f'    <rating name="tmdb" default="true"><value>{r_val:.1f}</value></rating>\n'
+                nfo += '  </ratings>\n'
+                nfo += f'  <userrating>{int(round(r_val))}</userrating>\n'
+            except (ValueError, TypeError):
+                pass
+        
+        if genre:
+            for g in re.split(r'[,/]', str(genre)):
+                g_str = g.strip()
+                if g_str:
+                    nfo += f'  <genre>{self._escape_xml(g_str)}</genre>\n'
+        
+        if director:
+            nfo += f'  <director>{self._escape_xml(director)}</director>\n'
+        
+        if cast_list:
+            for actor in str(cast_list).split(','):
+                actor_name = actor.strip()
+                if actor_name:
+                    nfo += f'  <actor><name>{self._escape_xml(actor_name)}</name></actor>\n'
+        
+        if cover:
+            nfo += f'  <thumb>{cover}</thumb>\n'
+        
+        if fanart:
+            nfo += f'  <fanart><thumb>{fanart}</thumb></fanart>\n'
+        elif cover:
+            nfo += f'  <fanart><thumb>{cover}</thumb></fanart>\n'
+        
+        nfo += '</tvshow>'
+        return nfo
+
+    def generate_episode_nfo(self, episode_data: dict, series_name: str, season_num: int, episode_num: int) -> str:
+        """Generate NFO file for an episode"""
+        title = episode_data.get('title', '')
+        if not title:
+            title = f"Episode {episode_num}"
+            
+        plot = episode_data.get('info', {}).get('plot') or episode_data.get('plot', '')
+        duration = episode_data.get('info', {}).get('duration') or episode_data.get('duration', '')
+        
+        nfo = '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<episodedetails>\n'
+        nfo += f'  <title>{self._escape_xml(title)}</title>\n'
+        nfo += f'  <showtitle>{self._escape_xml(series_name)}</showtitle>\n'
+        nfo += f'  <season>{season_num}</season>\n'
+        nfo += f'  <episode>{episode_num}</episode>\n'
+        
+        if plot:
+            nfo += f'  <plot>{self._escape_xml(plot)}</plot>\n'
+            
+        # Parse duration "HH:MM:SS" -> minutes
+        if duration:
+             try:
+                total_mins = 0
+                if ':' in str(duration):
+                    parts = str(duration).split(':')
+                    if len(parts) == 3:
+                        total_mins = int(parts[0]) * 60 + int(parts[1])
+                    elif len(parts) == 2:
+                        total_mins = int(parts[0])
+                elif str(duration).isdigit():
+                     total_mins = int(duration)
+                
+                if total_mins > 0:
+                    nfo += f'  <runtime>{total_mins}</runtime>\n'
+             except (ValueError, TypeError):
+                 pass
+
+        # Stream Details
+        # Usually from detailed info 'info' dict of the episode
+        info = episode_data.get('info', {})
+        nfo += '  <fileinfo>\n    <streamdetails>\n'
+        nfo += '      <video>\n'
+        nfo += f'        <codec>{self._escape_xml(episode_data.get("container_extension", ""))}</codec>\n'
+        if info.get('bitrate'):
+             nfo += f'        <bitrate>{info.get("bitrate")}</bitrate>\n'
+        nfo += '      </video>\n'
+        nfo += '    </streamdetails>\n  </fileinfo>\n'
+
+        nfo += '</episodedetails>'
+        return nfo
+
+    def _escape_xml(self, text: str) -> str:
+        """Escape XML special characters"""
+        if not text:
+            return ''
+        return (str(text)
+                .replace('&', '&amp;')
+                .replace('<', '&lt;')
+                .replace('>', '&gt;')
+                .replace('"', '&quot;')
+                .replace("'", '&apos;'))
+
+def synthetic_catalog(count: int, seed: int = 1):
+    rnd = random.Random(seed)
+    movies, shows, episodes = [], [], []
+    for i in range(count):
+        info = {"bitrate": rnd.choice(["", "4500"]), "audio": rnd.choice([{}, {"codec": "aac"}]), "mpaa": rnd.choice(["", "PG-13"])}
+        movies.append({
+            "name": f"{rnd.choice(['FR - ', 'EN_', ''])}Movie & <Friends> {i}{rnd.choice(['_2019', ' 2020', ''])}",
+            "o_name": rnd.choice(["", f"Original 'Title' {i}"]),
+            "tmdb": rnd.choice(["", "0", str(1000 + i)]),
+            "plot": "A plot with \"quotes\" & ampersands. " * rnd.randint(0, 12),
+            "year": rnd.choice(["", "2019-05-01", "99"]),
+            "rating": rnd.choice(["", "7.4", "n/a", "3.5"]),
+            "rating_5based": rnd.choice(["", "3.5"]),
+            "genre": rnd.choice(["", "Action, Drama / Crime", "Comedy"]),
+            "director": rnd.choice(["", "Jane Doe"]),
+            "cast": rnd.choice(["", "A, B ,C,,D"]),
+            "duration": rnd.choice(["", "01:42:00", "95", "1:x"]),
+            "youtube_trailer": rnd.choice(["", "abc123"]),
+            "stream_icon": rnd.choice(["", "http://img/1.jpg"]),
+            "backdrop_path": rnd.choice([[], ["http://img/b.jpg"]]),
+            "container_extension": "mkv",
+            "info": info,
+        })
+        shows.append(dict(movies[-1], cover=movies[-1]["stream_icon"], releaseDate=movies[-1]["year"]))
+        episodes.append({
+            "title": rnd.choice(["", f"Episode <{i}>"]),
+            "container_extension": "mp4",
+            "info": {"plot": rnd.choice(["", "Ep plot & more"]), "duration": rnd.choice(["", "00:45:10", "45:10", "42"]), "bitrate": rnd.choice(["", "900"])},
+        })
+    return movies, shows, episodes
+
+def render_legacy(movies, shows, episodes, options):
+    legacy = LegacyNfo()
+    out = [legacy.generate_movie_nfo(movie, *options) for movie in movies]
+    out += [legacy.generate_show_nfo(show, *options) for show in shows]
+    out += [legacy.generate_episode_nfo(episode, "Show & Co", 1, i + 1) for i, episode in enumerate(episodes)]
+    return out
+
+def render_current(movies, shows, episodes, options):
+    # What a sync does: one renderer for the whole run
+    renderer = FileManager("/tmp").get_nfo_renderer(*options)
+    out = [renderer.movie(movie) for movie in movies]
+    out += [renderer.show(show) for show in shows]
+    out += [renderer.episode(episode, "Show & Co", 1, i + 1) for i, episode in enumerate(episodes)]
+    return out
+
+def best_of(runs, func, *args):
+    best, result = None, None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    movies, shows, episodes = synthetic_catalog(count)
+
+    for options in [(None, False, False), (r"^[A-Z]{2} - ", True, True), ("(unbalanced", False, True)]:
+        legacy_time, legacy_out = best_of(3, render_legacy, movies, shows, episodes, options)
+        current_time, current_out = best_of(3, render_current, movies, shows, episodes, options)
+        assert legacy_out == current_out, f"output differs for options {options}"
+        print(f"{str(options):45} legacy {legacy_time:.3f}s  renderer {current_time:.3f}s  "
+              f"speedup x{legacy_time / current_time:.2f}  ({3 * count} files, identical)")
+
+if __name__ == "__main__":
+    main()
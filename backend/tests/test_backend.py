@@ -3,15 +3,113 @@ from unittest.mock import MagicMock, patch, AsyncMock
 import sys
 import os
 import asyncio
+import json
+from datetime import datetime, timedelta
 
 # Add backend to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.services.xtream import XtreamClient
+from app.services.xtream import XtreamClient, iter_json_array
 from app.services.file_manager import FileManager
-from app.tasks.sync import process_movies
+from app.services.rate_limiter import AdaptiveLimiter
+from app.services.pipeline import Pipeline, CommitBatcher
+from app.services.m3u_parser import M3UParser, download_m3u
+from app.tasks.sync import process_movies, process_series, record_fingerprint, episode_fingerprint, use_incremental_movie_sync, MOVIE_FINGERPRINT_FIELDS
+from app.tasks.sync import forget_unpublished_sync, fresh_vod_info, UNPUBLISHED_FINGERPRINT, VOD_INFO_FINGERPRINT_FIELDS
+from app.tasks.m3u_sync import entry_row, assign_entry_key, reconcile_entries, generation_digest
+from app.core.config import settings as app_settings
+from app.core.schema import upgrade_schema
 from app.models.cache import MovieCache
 
+class TestM3UParser(unittest.TestCase):
+    def test_entries_are_yielded_while_lines_stream_in(self):
+        consumed = []
+
+        def lines():
+            for line in ['#EXTM3U', '#EXTINF:-1 group-title="Films",Movie A', 'http://h/movie/u/p/1.mkv',
+                         '#EXTINF:-1,Broken', '#EXTVLCOPT:x', '', '#EXTINF:-1,Show B', 'http://h/series/u/p/2.mkv']:
+                consumed.append(line)
+                yield line
+
+        entries = M3UParser().iter_lines(lines())
+        first = next(entries)
+        self.assertEqual((first['title'], first['group_title'], first['entry_type']), ('Movie A', 'Films', 'movie'))
+        self.assertEqual(len(consumed), 3)
+        # An EXTINF followed by another comment is dropped, as before
+        self.assertEqual([e['title'] for e in entries], ['Show B'])
+
+    def test_extinf_keeps_every_attribute_and_commas_inside_quotes(self):
+        entry = M3UParser()._parse_extinf(
+            '#EXTINF:-1 tvg-id="v.1" tvg-name="Movie, The" logo="http://l/1.png" group-title="Films" tvg-country="FR",Movie, The (2019)'
+        )
+        self.assertEqual(entry['title'], 'Movie, The (2019)')
+        self.assertEqual((entry['tvg_id'], entry['tvg_name'], entry['logo'], entry['group_title']), ('v.1', 'Movie, The', 'http://l/1.png', 'Films'))
+        self.assertEqual(entry['attributes']['tvg-country'], 'FR')
+        # The title earlier versions read, starting inside tvg-name
+        self.assertEqual(entry['legacy_title'], 'The" logo="http://l/1.png" group-title="Films" tvg-country="FR",Movie, The (2019)')
+        self.assertNotIn('legacy_title', M3UParser()._parse_extinf('#EXTINF:-1 tvg-name="Movie" group-title="Films",Movie, The (2019)'))
+
+    def test_entries_cached_under_the_legacy_title_keep_it(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.models.m3u_source import M3USource
+        from app.models.m3u_entry import M3UEntry
+
+        engine = create_engine("sqlite://")
+        M3UEntry.metadata.create_all(engine, tables=[M3USource.__table__, M3UEntry.__table__])
+        db = sessionmaker(bind=engine)()
+        parser = M3UParser()
+        lines = ['#EXTINF:-1 tvg-name="Movie, The" group-title="Films",Movie (2019)', 'http://h/movie/u/p/1.mkv',
+                 '#EXTINF:-1 tvg-name="Other, An" group-title="Films",Other (2020)', 'http://h/movie/u/p/2.mkv']
+        # Movie 1 was cached by an older version, under the title it read then
+        cached = entry_row(1, dict(parser.parse_content('\n'.join(lines[:2]))[0], title='The" group-title="Films",Movie (2019)'))
+        assign_entry_key(cached, set())
+        db.add(M3UEntry(**cached))
+        db.commit()
+
+        stats, changed_keys = reconcile_entries(db, 1, parser.iter_lines(lines), batch_size=10)
+
+        # Same key and title, so the same file names: nothing inserted or deleted
+        self.assertEqual((stats['unchanged'], stats['inserted'], stats['deleted']), (1, 1, 0))
+        titles = sorted(entry.title for entry in db.query(M3UEntry))
+        self.assertEqual(titles, ['Other (2020)', 'The" group-title="Films",Movie (2019)'])
+
+    @patch('app.services.m3u_parser.requests.get')
+    def test_download_sends_validators_and_honours_not_modified(self, mock_get):
+        response = mock_get.return_value.__enter__.return_value
+        response.status_code = 304
+        response.headers = {}
+        result = download_m3u("http://test.com/list.m3u", etag='"v1"', last_modified="Sat, 17 Oct 2026 07:00:00 GMT")
+        self.assertEqual(mock_get.call_args.kwargs['headers'], {'If-None-Match': '"v1"', 'If-Modified-Since': "Sat, 17 Oct 2026 07:00:00 GMT"})
+        self.assertEqual((result['status'], result['etag']), ('not_modified', '"v1"'))
+        self.assertNotIn('path', result)
+        response.iter_content.assert_not_called()
+
+    def test_entry_key_is_stable_and_repeats_stay_distinct(self):
+        parsed = {'title': 'Movie', 'url': 'http://h/movie/1.mkv', 'group_title': 'A', 'entry_type': 'movie'}
+        first, repeat = entry_row(1, parsed), entry_row(1, dict(parsed, group_title='B'))
+        seen = set()
+        key = assign_entry_key(first, seen)
+        self.assertEqual(key, assign_entry_key(entry_row(1, parsed), set()))
+        self.assertNotEqual(assign_entry_key(repeat, seen), key)
+        self.assertNotEqual(first['content_hash'], repeat['content_hash'])
+        self.assertIsNone(entry_row(1, dict(parsed, entry_type='live')))
+
+    @patch('app.tasks.m3u_sync.count_source_files', return_value=80)
+    def test_generation_digest_tracks_selection_settings_and_recorded_files(self, mock_count):
+        from app.models.m3u_selection import SelectionType
+        selection = [MagicMock(group_title='A', selection_type=SelectionType.MOVIE), MagicMock(group_title='B', selection_type=SelectionType.SERIES)]
+        naming, dirs = (None, False, True), ('/out/movies', '/out/series')
+        digest = generation_digest(MagicMock(), 1, selection, naming, dirs, None)
+
+        self.assertEqual(digest, generation_digest(MagicMock(), 1, list(reversed(selection)), naming, dirs, None))
+        self.assertNotEqual(digest, generation_digest(MagicMock(), 1, selection[:1], naming, dirs, None))
+        self.assertNotEqual(digest, generation_digest(MagicMock(), 1, selection, (None, False, False), dirs, None))
+        self.assertNotEqual(digest, generation_digest(MagicMock(), 1, selection, naming, dirs, ['movies']))
+        # Files forgotten since (sweep repair, deleted output) have to be written again
+        mock_count.return_value = 79
+        self.assertNotEqual(digest, generation_digest(MagicMock(), 1, selection, naming, dirs, None))
+
 class TestXtreamClient(unittest.TestCase):
     def setUp(self):
         self.client = XtreamClient("http://test.com", "user", "pass")
@@ -40,47 +138,542 @@ class TestXtreamClient(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]['category_name'], 'Action')
 
+    @patch('httpx.AsyncClient')
+    def test_client_is_pooled_and_closed(self, mock_client_cls):
+        mock_client_instance = MagicMock()
+        mock_client_instance.is_closed = False
+        mock_client_instance.aclose = AsyncMock()
+        mock_client_cls.return_value = mock_client_instance
+
+        # The same pooled client is reused for every request until closed
+        self.assertIs(self.client._get_client(), self.client._get_client())
+        mock_client_cls.assert_called_once()
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self.client.close())
+        loop.close()
+
+        mock_client_instance.aclose.assert_awaited_once()
+        self.assertIsNone(self.client._client)
+
+    def test_stream_categories_merges_and_deduplicates(self):
+        listings = {
+            "1": [{"stream_id": "10"}, {"stream_id": "11"}],
+            "2": [{"stream_id": "11"}, {"stream_id": "12"}],
+        }
+
+        async def fake_stream_list(action, category_id=None):
+            for item in listings[category_id]:
+                yield item
+
+        self.client._stream_list = fake_stream_list
+
+        async def collect():
+            return [m["stream_id"] async for m in self.client.iter_vod_streams_for_categories(["1", "2"])]
+
+        loop = asyncio.new_event_loop()
+        result = loop.run_until_complete(collect())
+        loop.close()
+
+        self.assertEqual(sorted(result), ["10", "11", "12"])
+
     def test_get_stream_url(self):
         url = self.client.get_stream_url("movie", "123", "mp4")
         self.assertEqual(url, "http://test.com/movie/user/pass/123.mp4")
 
+class TestStreamingJson(unittest.TestCase):
+    def _collect(self, body, chunk_size):
+        async def chunks():
+            for i in range(0, len(body), chunk_size):
+                yield body[i:i + chunk_size]
+
+        async def collect():
+            return [item async for item in iter_json_array(chunks())]
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(collect())
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def test_items_split_across_chunks(self):
+        data = [{"stream_id": i, "name": f"Movie, [{i}]"} for i in range(50)] + [12345, 1.5e10, None]
+        body = json.dumps(data)
+        for chunk_size in (1, 7, 4096):
+            self.assertEqual(self._collect(body, chunk_size), data)
+
+    def test_non_array_payload_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self._collect('{"user_info": {"auth": 0}}', 4)
+        with self.assertRaises(ValueError):
+            self._collect('', 4)
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def _run(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_grows_while_healthy_and_backs_off_on_throttling(self):
+        limiter = AdaptiveLimiter(initial=4, max_limit=8, latency_target=1.0)
+
+        async def scenario():
+            for _ in range(40):
+                await limiter.acquire()
+                await limiter.release(0.1)
+            grown = limiter.current_limit
+            await limiter.acquire()
+            await limiter.release(0.1, throttled=True)
+            return grown
+
+        grown = self._run(scenario())
+        self.assertEqual(grown, 8)
+        self.assertEqual(limiter.current_limit, 4)
+        self.assertEqual(limiter.snapshot()["throttled"], 1)
+        self.assertEqual(limiter.snapshot()["history"][0], [0.0, 4])
+
+    def test_limits_in_flight_requests(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=2)
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            await limiter.acquire()
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+            await limiter.release(0.01)
+
+        async def scenario():
+            await asyncio.gather(*[work() for _ in range(10)])
+
+        self._run(scenario())
+        self.assertEqual(peak, 2)
+
+class TestPipeline(unittest.TestCase):
+    def test_straggler_does_not_stall_other_items(self):
+        finished = []
+        flushed = []
+
+        async def fetch(item):
+            # Item 0 is a straggler; the other items must get through meanwhile
+            await asyncio.sleep(0.2 if item == 0 else 0.001)
+            return item
+
+        async def render(item):
+            if item == 3:
+                raise ValueError("bad item")
+            return item * 10
+
+        async def write(item):
+            finished.append(item)
+            return item
+
+        batcher = CommitBatcher(flushed.append, batch_size=4, interval=60)
+
+        async def source():
+            for i in range(10):
+                yield i
+
+        pipeline = (
+            Pipeline(queue_size=2)
+            .add_stage("fetch", fetch, concurrency=3)
+            .add_stage("render", render)
+            .add_stage("write", write, concurrency=2)
+            .add_stage("persist", batcher.add)
+        )
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(pipeline.run(source()))
+        loop.close()
+        batcher.flush()
+
+        self.assertEqual(finished[-1], 0)
+        self.assertEqual(sorted(finished), [0, 10, 20, 40, 50, 60, 70, 80, 90])
+        self.assertEqual([len(batch) for batch in flushed], [4, 4, 1])
+        self.assertEqual(pipeline.get_stats()["render"]["errors"], 1)
+
+    def test_failing_fatal_stage_stops_the_pipeline(self):
+        written = []
+
+        async def write(item):
+            written.append(item)
+            return item
+
+        async def persist(item):
+            if item == 2:
+                raise RuntimeError("commit failed")
+
+        async def source():
+            for i in range(1000):
+                yield i
+
+        pipeline = (
+            Pipeline(queue_size=2)
+            .add_stage("write", write)
+            .add_stage("persist", persist, fatal=True)
+        )
+
+        loop = asyncio.new_event_loop()
+        with self.assertRaises(RuntimeError):
+            loop.run_until_complete(asyncio.wait_for(pipeline.run(source()), 5))
+        loop.close()
+
+        self.assertLess(len(written), 1000)
+        self.assertEqual(pipeline.get_stats()["persist"]["errors"], 1)
+
+class TestSchemaUpgrade(unittest.TestCase):
+    def test_existing_table_gets_new_columns_and_deduplicated_unique_index(self):
+        from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, UniqueConstraint, text, inspect
+
+        engine = create_engine("sqlite://")
+        old = MetaData()
+        Table("movie_cache", old, Column("id", Integer, primary_key=True), Column("subscription_id", Integer), Column("stream_id", Integer), Column("name", String))
+        old.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO movie_cache (subscription_id, stream_id, name) VALUES (1, 5, 'old'), (1, 5, 'new'), (1, 6, 'other'), (2, 5, 'sub2')"))
+
+        new = MetaData()
+        Table("movie_cache", new, Column("id", Integer, primary_key=True), Column("subscription_id", Integer), Column("stream_id", Integer),
+              Column("name", String), Column("fingerprint", String, nullable=True),
+              UniqueConstraint("subscription_id", "stream_id", name="uq_movie_cache_stream"))
+        new.create_all(engine)
+        upgrade_schema(engine, new)
+        upgrade_schema(engine, new)
+
+        with engine.begin() as conn:
+            rows = conn.execute(text("SELECT subscription_id, stream_id, name, fingerprint FROM movie_cache ORDER BY id")).all()
+            self.assertEqual([tuple(r) for r in rows], [(1, 5, 'new', None), (1, 6, 'other', None), (2, 5, 'sub2', None)])
+            with self.assertRaises(Exception):
+                conn.execute(text("INSERT INTO movie_cache (subscription_id, stream_id) VALUES (1, 6)"))
+        self.assertIn("uq_movie_cache_stream", [i["name"] for i in inspect(engine).get_indexes("movie_cache")])
+
+class TestFingerprint(unittest.TestCase):
+    def test_fingerprint_tracks_relevant_fields_only(self):
+        movie = {"stream_id": "1", "name": "Movie", "container_extension": "mp4", "rating": "7", "num": 1}
+        fingerprint = record_fingerprint(movie, MOVIE_FINGERPRINT_FIELDS)
+
+        self.assertEqual(fingerprint, record_fingerprint(dict(movie, num=2), MOVIE_FINGERPRINT_FIELDS))
+        self.assertNotEqual(fingerprint, record_fingerprint(dict(movie, rating="8"), MOVIE_FINGERPRINT_FIELDS))
+        self.assertNotEqual(fingerprint, record_fingerprint(dict(movie, added="1700000000"), MOVIE_FINGERPRINT_FIELDS))
+
+    def test_vod_info_cache_survives_listing_only_changes(self):
+        movie = {"stream_id": "1", "name": "Movie", "rating": "7", "added": "1600000000"}
+        info_fingerprint = record_fingerprint(movie, VOD_INFO_FINGERPRINT_FIELDS)
+        row = MagicMock(info={"plot": "p"}, fingerprint=info_fingerprint, fetched_at=datetime.utcnow())
+
+        renamed = dict(movie, name="Movie (2020)", rating="8")
+        self.assertEqual(fresh_vod_info({1: row}, 1, record_fingerprint(renamed, VOD_INFO_FINGERPRINT_FIELDS)), {"plot": "p"})
+        self.assertIsNone(fresh_vod_info({1: row}, 1, record_fingerprint(dict(movie, tmdb="55"), VOD_INFO_FINGERPRINT_FIELDS)))
+        self.assertIsNone(fresh_vod_info({1: row}, 1, record_fingerprint(dict(movie, added="1700000000"), VOD_INFO_FINGERPRINT_FIELDS)))
+
+        row.fetched_at = datetime.utcnow() - timedelta(hours=app_settings.VOD_INFO_CACHE_TTL_HOURS + 1)
+        self.assertIsNone(fresh_vod_info({1: row}, 1, info_fingerprint))
+
+    def test_episode_fingerprint_covers_payload_and_path(self):
+        episode = {"id": "101", "episode_num": 1, "title": "Pilot", "info": {"plot": "x"}}
+        fingerprint = episode_fingerprint(episode, "Show", 1, "Cat/Show/Season 01/S01E01 - Pilot")
+
+        self.assertEqual(fingerprint, episode_fingerprint(dict(reversed(list(episode.items()))), "Show", 1, "Cat/Show/Season 01/S01E01 - Pilot"))
+        self.assertNotEqual(fingerprint, episode_fingerprint(dict(episode, info={"plot": "y"}), "Show", 1, "Cat/Show/Season 01/S01E01 - Pilot"))
+        self.assertNotEqual(fingerprint, episode_fingerprint(episode, "Show", 1, "Cat/Show/S01E01 - Pilot"))
+
 class TestSyncLogic(unittest.TestCase):
+    def test_incremental_movie_sync_needs_recent_full_sync(self):
+        state = MagicMock(watermark=None, last_full_sync=None)
+        self.assertFalse(use_incremental_movie_sync(state))
+
+        state = MagicMock(watermark=1700000000, last_full_sync=datetime.utcnow() - timedelta(hours=1))
+        self.assertTrue(use_incremental_movie_sync(state))
+
+        state.last_full_sync = datetime.utcnow() - timedelta(hours=app_settings.MOVIE_FULL_RECONCILE_HOURS + 1)
+        self.assertFalse(use_incremental_movie_sync(state))
+
+    @patch('app.tasks.sync.forget_paths')
+    @patch('app.tasks.sync.record_files')
+    @patch('app.tasks.sync.bulk_delete_ids')
+    @patch('app.tasks.sync.bulk_upsert')
     @patch('app.services.xtream.XtreamClient.get_vod_categories')
-    @patch('app.services.xtream.XtreamClient.get_vod_streams')
-    @patch('app.services.file_manager.FileManager.write_strm')
-    def test_process_movies_add(self, mock_write, mock_get_streams, mock_get_cats):
+    @patch('app.services.xtream.XtreamClient.iter_vod_streams')
+    def test_process_movies_add(self, mock_iter_streams, mock_get_cats, mock_upsert, mock_delete, mock_record, mock_forget):
         # Setup Mocks - these are async methods on the class, so we mock them to return awaitables
         mock_get_cats.return_value = [{"category_id": "1", "category_name": "Action"}]
-        mock_get_streams.return_value = [
-            {"stream_id": "100", "name": "Test Movie", "container_extension": "mp4", "category_id": "1", "tmdb_id": "123"}
-        ]
+
+        async def stream_movies(category_id=None):
+            yield {"stream_id": "100", "name": "Test Movie", "container_extension": "mp4", "category_id": "1", "tmdb_id": "123"}
+        mock_iter_streams.side_effect = stream_movies
         
         db = MagicMock()
         # Mock cache query to return empty (so it adds)
         db.query.return_value.all.return_value = []
-        # Mock SyncState query
-        db.query.return_value.filter.return_value.first.return_value = MagicMock()
+        # Mock SyncState query (first sync: no watermark yet)
+        db.query.return_value.filter.return_value.first.return_value = MagicMock(watermark=None, last_full_sync=None)
         # Mock SelectedCategory query (filter().all()) to return empty list so it doesn't filter out movies
         db.query.return_value.filter.return_value.all.return_value = []
 
         xc = XtreamClient("http://test.com", "user", "pass")
+        xc.get_vod_info = AsyncMock(return_value={})
         fm = FileManager("/tmp/output")
         fm.ensure_directory = MagicMock()
-        fm.write_strm = AsyncMock()
-        fm.write_nfo = AsyncMock()
+        fm.write_files = AsyncMock(return_value=2)
 
         # Run
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(process_movies(db, xc, fm))
+        loop.run_until_complete(process_movies(db, xc, fm, 1))
         loop.close()
 
         # Verify
-        # Should have called write_strm
-        fm.write_strm.assert_called_once()
-        args = fm.write_strm.call_args[0]
-        self.assertTrue(args[0].endswith("Test Movie.strm"))
-        self.assertIn("100.mp4", args[1])
+        # The .strm and .nfo go to the IO pool as one batch
+        fm.write_files.assert_awaited_once()
+        (strm_path, strm_data), (nfo_path, _) = fm.write_files.call_args[0][0]
+        self.assertTrue(strm_path.endswith("Test Movie.strm"))
+        self.assertIn(b"100.mp4", strm_data)
+        self.assertTrue(nfo_path.endswith("Test Movie.nfo"))
+
+        # The cache row is written through the bulk upsert path
+        upserts = [c[0][1:] for c in mock_upsert.call_args_list if c[0][1].name == "movie_cache" and c[0][2]]
+        table, rows, conflict_columns = upserts[0]
+        self.assertEqual(rows[0]["stream_id"], 100)
+        self.assertTrue(rows[0]["fingerprint"])
+        self.assertEqual(conflict_columns, ["subscription_id", "stream_id"])
+
+        # Both files land in the output manifest under the movie's stream id
+        manifest = mock_record.call_args[0][1]
+        self.assertEqual({row["path"] for row in manifest}, {strm_path, nfo_path})
+        self.assertTrue(all(row["item_kind"] == "movie" and row["item_id"] == "100" for row in manifest))
+        self.assertEqual(manifest[0]["size"], len(strm_data))
+
+class TestProcessSeries(unittest.TestCase):
+    """process_series against a real SQLite session and output folder, only the provider is mocked"""
+
+    def setUp(self):
+        import tempfile
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.models.cache import SeriesCache, EpisodeCache
+        from app.models.output_file import OutputFile
+        from app.models.selection import SelectedCategory
+        from app.models.settings import SettingsModel
+        from app.models.sync_state import SyncState
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_dir = self.tmp.name
+        engine = create_engine("sqlite://")
+        MovieCache.metadata.create_all(engine, tables=[t.__table__ for t in (
+            SeriesCache, EpisodeCache, OutputFile, SelectedCategory, SettingsModel, SyncState
+        )])
+        self.db = sessionmaker(bind=engine)()
+        self.series = {"series_id": "7", "name": "Show", "category_id": "1", "last_modified": "100", "cover": "c", "plot": "Old plot"}
+        self.episodes = [self.episode(e) for e in (1, 2, 3)]
+        self.get_series_info = AsyncMock(side_effect=lambda series_id: {
+            "info": {"tmdb_id": "9"}, "episodes": {"1": [dict(e) for e in self.episodes]}
+        })
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    @staticmethod
+    def episode(num, title=None):
+        return {"id": f"70{num}", "episode_num": num, "container_extension": "mkv", "title": title or f"Ep {num}", "info": {"plot": "x"}}
+
+    def sync(self, force=False):
+        from app.models.sync_state import SyncState
+
+        async def iter_series(category_id=None):
+            yield dict(self.series)
+
+        xc = XtreamClient("http://test.com", "user", "pass")
+        xc.get_series_categories = AsyncMock(return_value=[{"category_id": "1", "category_name": "Drama"}])
+        xc.iter_series = iter_series
+        xc.get_series_info = self.get_series_info
+        fm = FileManager(self.output_dir)
+        try:
+            asyncio.run(process_series(self.db, xc, fm, 1, force=force))
+        finally:
+            fm.close()
+        return self.db.query(SyncState).one().stats
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.output_dir)
+            for root, _, names in os.walk(self.output_dir) for name in names
+        )
+
+    def recorded(self):
+        from app.models.output_file import OutputFile
+        return sorted(os.path.relpath(row.path, self.output_dir) for row in self.db.query(OutputFile))
+
+    def test_new_changed_and_dropped_episodes(self):
+        from app.models.cache import EpisodeCache
+
+        show = "Drama/Show {tmdb-9}"
+        stats = self.sync()
+        self.assertEqual(stats["episodes"], {"added": 3, "updated": 0, "unchanged": 0, "deleted": 0})
+        self.assertEqual(self.files(), sorted([f"{show}/tvshow.nfo"] + [
+            f"{show}/Season 01/S01E0{e} - Ep {e}.{ext}" for e in (1, 2, 3) for ext in ("strm", "nfo")
+        ]))
+
+        # Episode 2 renamed, 3 dropped, 4 new, 1 as it was
+        self.series["last_modified"] = "200"
+        self.episodes = [self.episode(1), self.episode(2, "Ep 2b"), self.episode(4)]
+        stats = self.sync()
+
+        self.assertEqual(stats["episodes"], {"added": 1, "updated": 1, "unchanged": 1, "deleted": 1})
+        self.assertEqual(self.files(), sorted([f"{show}/tvshow.nfo"] + [
+            f"{show}/Season 01/S01E0{e}.{ext}" for e in ("1 - Ep 1", "2 - Ep 2b", "4 - Ep 4") for ext in ("strm", "nfo")
+        ]))
+        with open(os.path.join(self.output_dir, show, "Season 01", "S01E04 - Ep 4.strm")) as f:
+            self.assertEqual(f.read(), "http://test.com/series/user/pass/704.mkv")
+        self.assertEqual(sorted(e.episode_id for e in self.db.query(EpisodeCache)), [701, 702, 704])
+        # The manifest follows the files
+        self.assertEqual(self.recorded(), self.files())
+
+    def test_unchanged_last_modified_skips_get_series_info(self):
+        self.sync()
+        stats = self.sync()
+
+        self.assertEqual(self.get_series_info.await_count, 1)
+        self.assertEqual(stats["series"], {"fetched": 0, "listing_only": 0, "unchanged": 1, "forced": False})
+        self.assertEqual(stats["files"]["written"], 0)
+
+    def test_listing_only_change_rewrites_tvshow_nfo_only(self):
+        self.sync()
+        mtimes = {path: os.stat(os.path.join(self.output_dir, path)).st_mtime_ns for path in self.files()}
+
+        # New plot, same last_modified: the episodes can't have changed
+        self.series["plot"] = "New plot"
+        stats = self.sync()
+
+        self.assertEqual(self.get_series_info.await_count, 1)
+        self.assertEqual(stats["series"], {"fetched": 0, "listing_only": 1, "unchanged": 0, "forced": False})
+        self.assertEqual(stats["files"]["written"], 1)
+        show_nfo = "Drama/Show {tmdb-9}/tvshow.nfo"
+        with open(os.path.join(self.output_dir, show_nfo)) as f:
+            content = f.read()
+        self.assertIn("New plot", content)
+        # The TMDB id learned from get_series_info is kept from the cache
+        self.assertIn("<tmdbid>9</tmdbid>", content)
+        changed = [path for path in self.files() if os.stat(os.path.join(self.output_dir, path)).st_mtime_ns != mtimes[path]]
+        self.assertEqual(changed, [show_nfo])
+
+    def test_force_fetches_and_writes_everything_again(self):
+        self.sync()
+        stats = self.sync(force=True)
+
+        self.assertEqual(self.get_series_info.await_count, 2)
+        self.assertEqual(stats["series"], {"fetched": 1, "listing_only": 0, "unchanged": 0, "forced": True})
+        self.assertEqual(stats["episodes"], {"added": 0, "updated": 3, "unchanged": 0, "deleted": 0})
+        self.assertEqual(len(self.files()), 7)
+
+class TestUnpublishedSync(unittest.TestCase):
+    def test_rows_of_a_discarded_staged_sync_are_reset(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.models.cache import VodInfoCache
+        from app.models.output_file import OutputFile
+        from app.models.sync_state import SyncState, SyncType
+
+        engine = create_engine("sqlite://")
+        MovieCache.metadata.create_all(engine, tables=[t.__table__ for t in (MovieCache, VodInfoCache, OutputFile, SyncState)])
+        db = sessionmaker(bind=engine)()
+        started = datetime.utcnow()
+        db.add(SyncState(subscription_id=1, type=SyncType.MOVIES, unpublished_since=started, last_full_sync=started))
+        for stream_id in (1, 2):
+            db.add(MovieCache(subscription_id=1, stream_id=stream_id, name=f"m{stream_id}", fingerprint="fp"))
+            db.add(VodInfoCache(subscription_id=1, stream_id=stream_id, info={}, fingerprint="fp"))
+        # Movie 1 was published by an earlier sync, movie 2 only went to the discarded copy
+        db.add(OutputFile(source_type="xtream", source_id=1, item_kind="movie", item_id="1", path="/m/1.strm",
+                          updated_at=started - timedelta(days=1)))
+        db.add(OutputFile(source_type="xtream", source_id=1, item_kind="movie", item_id="2", path="/m/2.strm",
+                          updated_at=started + timedelta(seconds=1)))
+        db.commit()
+
+        self.assertEqual(forget_unpublished_sync(db, 1, SyncType.MOVIES, error="publish failed"), 1)
+
+        self.assertEqual([row.item_id for row in db.query(OutputFile)], ["1"])
+        fingerprints = {row.stream_id: row.fingerprint for row in db.query(MovieCache)}
+        self.assertEqual(fingerprints, {1: "fp", 2: UNPUBLISHED_FINGERPRINT})
+        self.assertEqual(db.query(VodInfoCache).filter_by(stream_id=2).one().fingerprint, UNPUBLISHED_FINGERPRINT)
+        state = db.query(SyncState).one()
+        self.assertIsNone(state.unpublished_since)
+        self.assertIsNone(state.last_full_sync)
+        self.assertEqual(state.error_message, "publish failed")
+        # Nothing left to undo
+        self.assertEqual(forget_unpublished_sync(db, 1, SyncType.MOVIES), 0)
+
+class TestSweep(unittest.TestCase):
+    @patch('app.tasks.sweep.sync_running', return_value=False)
+    @patch('app.tasks.sweep.unrecorded_items', return_value=3)
+    @patch('app.tasks.sweep.recorded_paths_under', return_value=set())
+    @patch('app.tasks.sweep.load_source_files')
+    @patch('app.tasks.sweep.output_roots')
+    @patch('app.tasks.sweep.SessionLocal')
+    def test_remove_keeps_orphans_while_cached_items_are_unrecorded(self, mock_session, mock_roots, mock_recorded, mock_under, mock_unrecorded, mock_running):
+        import tempfile
+        from app.tasks.sweep import sweep_output_task
+
+        with tempfile.TemporaryDirectory() as root:
+            movies, series = os.path.join(root, "movies"), os.path.join(root, "series")
+            os.makedirs(os.path.join(movies, "Cat"))
+            os.makedirs(series)
+            recorded_strm = os.path.join(movies, "Cat", "Recorded.strm")
+            # Synced before the manifest existed: on disk, in the cache, not in the manifest
+            unrecorded_strm = os.path.join(movies, "Cat", "Old.strm")
+            for path in (recorded_strm, unrecorded_strm):
+                with open(path, "w") as f:
+                    f.write("http://x")
+            mock_roots.return_value = [movies, series]
+            mock_recorded.return_value = {recorded_strm: ("movie", "1", None)}
+
+            result = sweep_output_task.run("xtream", 1, remove=True)
+
+            self.assertEqual(result["orphans"], 1)
+            self.assertEqual(result["removed"], 0)
+            self.assertEqual(result["unrecorded_items"], 3)
+            self.assertIn("warning", result)
+            self.assertTrue(os.path.exists(unrecorded_strm))
+
+            mock_unrecorded.return_value = 0
+            result = sweep_output_task.run("xtream", 1, remove=True)
+
+            self.assertEqual(result["removed"], 1)
+            self.assertFalse(os.path.exists(unrecorded_strm))
+            self.assertTrue(os.path.exists(recorded_strm))
+
+    @patch('app.tasks.sweep.sync_running', return_value=True)
+    @patch('app.tasks.sweep.unrecorded_items', return_value=0)
+    @patch('app.tasks.sweep.recorded_paths_under', return_value=set())
+    @patch('app.tasks.sweep.load_source_files')
+    @patch('app.tasks.sweep.output_roots')
+    @patch('app.tasks.sweep.SessionLocal')
+    def test_remove_only_reports_while_a_sync_is_running(self, mock_session, mock_roots, mock_recorded, mock_under, mock_unrecorded, mock_running):
+        import tempfile
+        from app.tasks.sweep import sweep_output_task
+
+        with tempfile.TemporaryDirectory() as root:
+            movies = os.path.join(root, "movies")
+            os.makedirs(os.path.join(movies, "Cat"))
+            recorded_strm = os.path.join(movies, "Cat", "Recorded.strm")
+            # Just written by the running sync, its manifest row is not committed yet
+            new_strm = os.path.join(movies, "Cat", "New.strm")
+            for path in (recorded_strm, new_strm):
+                with open(path, "w") as f:
+                    f.write("http://x")
+            mock_roots.return_value = [movies]
+            mock_recorded.return_value = {recorded_strm: ("m3u_movie", "http://x", None)}
+
+            result = sweep_output_task.run("m3u", 1, remove=True)
+
+            self.assertEqual(result["orphans"], 1)
+            self.assertEqual(result["removed"], 0)
+            self.assertIn("warning", result)
+            self.assertTrue(os.path.exists(new_strm))
+            mock_running.assert_called_with(mock_session.return_value, "m3u", 1)
 
 if __name__ == '__main__':
     unittest.main()
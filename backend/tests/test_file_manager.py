@@ -1,9 +1,12 @@
 import unittest
 import sys
 import os
+import tempfile
+import asyncio
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.services.file_manager import FileManager
+from app.services.file_manager import FileManager, sanitize_m3u_name
+from app.services.tree_scan import TreeScan
 
 class TestFileManagerNFO(unittest.TestCase):
     def setUp(self):
@@ -65,5 +68,276 @@ class TestFileManagerNFO(unittest.TestCase):
         nfo = self.fm.generate_movie_nfo(data, prefix_regex=r'^TEST - ')
         self.assertIn("<title>Custom Movie</title>", nfo)
 
+class TestSanitizeName(unittest.TestCase):
+    def test_xtream_names_replace_invalid_characters(self):
+        fm = FileManager("/tmp/test_output")
+        self.assertEqual(fm.sanitize_name('AC/DC: Live? <"Best"> | *2019*\\'), 'AC_DC_ Live_ __Best__ _ _2019__')
+        self.assertEqual(fm.sanitize_name("Léon: The Professional"), "Léon_ The Professional")
+        self.assertEqual(len(fm.sanitize_name("x" * 300)), 200)
+
+    def test_m3u_names_keep_only_safe_characters(self):
+        self.assertEqual(sanitize_m3u_name("  FR: Films d'été (2019) - HD_1  "), "FR Films dété 2019 - HD_1")
+        self.assertEqual(sanitize_m3u_name("日本/ニュース"), "日本ニュース")
+
+class TestNfoGolden(unittest.TestCase):
+    """Rendered NFOs must stay byte-identical to what earlier releases wrote"""
+
+    def setUp(self):
+        self.fm = FileManager("/tmp/test_output")
+
+    def test_movie_nfo_golden(self):
+        data = {
+            "name": "FR - Tom & Jerry_2019", "o_name": "Tom 'n' Jerry", "tmdb": "42", "plot": 'Cat <chases> "mouse"',
+            "year": "2019-05-01", "rating_5based": "3.5", "genre": "Comedy, Family / Animation", "director": "A & B",
+            "cast": "Tom, Jerry,,", "duration": "01:41:00", "youtube_trailer": "xyz", "stream_icon": "http://img/c.jpg",
+            "backdrop_path": ["http://img/b.jpg"], "container_extension": "mkv",
+            "info": {"bitrate": "4500", "audio": {"codec": "aac"}, "mpaa": "PG"},
+        }
+        expected = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<movie>\n'
+            '  <title>Tom &apos;n&apos; Jerry</title>\n'
+            '  <originaltitle>Tom &apos;n&apos; Jerry</originaltitle>\n'
+            '  <tmdbid>42</tmdbid>\n'
+            '  <uniqueid type="tmdb" default="true">42</uniqueid>\n'
+            '  <plot>Cat &lt;chases&gt; &quot;mouse&quot;</plot>\n'
+            '  <outline>Cat &lt;chases&gt; &quot;mouse&quot;</outline>\n'
+            '  <year>2019</year>\n'
+            '  <premiered>2019-01-01</premiered>\n'
+            '  <ratings>\n    <rating name="tmdb" default="true"><value>7.0</value></rating>\n  </ratings>\n'
+            '  <userrating>7</userrating>\n'
+            '  <genre>Comedy</genre>\n  <genre>Family</genre>\n  <genre>Animation</genre>\n'
+            '  <director>A &amp; B</director>\n'
+            '  <actor><name>Tom</name></actor>\n  <actor><name>Jerry</name></actor>\n'
+            '  <runtime>101</runtime>\n'
+            '  <fileinfo>\n    <streamdetails>\n      <video>\n        <codec>mkv</codec>\n        <bitrate>4500</bitrate>\n      </video>\n'
+            '      <audio>\n        <codec>aac</codec>\n      </audio>\n    </streamdetails>\n  </fileinfo>\n'
+            '  <trailer>plugin://plugin.video.youtube/?action=play_video&amp;videoid=xyz</trailer>\n'
+            '  <thumb>http://img/c.jpg</thumb>\n'
+            '  <fanart><thumb>http://img/b.jpg</thumb></fanart>\n'
+            '  <mpaa>PG</mpaa>\n'
+            '</movie>'
+        )
+        self.assertEqual(self.fm.generate_movie_nfo(data, None, True, True), expected)
+
+    def test_show_nfo_golden_with_invalid_regex(self):
+        data = {"name": "EN - Show_Name", "tmdb": "7", "plot": "Plot & more", "releaseDate": "2001", "rating": "8.25",
+                "cast": "X, Y", "cover": "http://img/s.jpg"}
+        expected = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<tvshow>\n'
+            '  <title>Show_Name</title>\n'
+            '  <tmdbid>7</tmdbid>\n'
+            '  <uniqueid type="tmdb" default="true">7</uniqueid>\n'
+            '  <plot>Plot &amp; more</plot>\n'
+            '  <year>2001</year>\n'
+            '  <premiered>2001-01-01</premiered>\n'
+            '  <ratings>\n    <rating name="tmdb" default="true"><value>8.2</value></rating>\n  </ratings>\n'
+            '  <userrating>8</userrating>\n'
+            '  <actor><name>X</name></actor>\n  <actor><name>Y</name></actor>\n'
+            '  <thumb>http://img/s.jpg</thumb>\n'
+            '  <fanart><thumb>http://img/s.jpg</thumb></fanart>\n'
+            '</tvshow>'
+        )
+        # An invalid PREFIX_REGEX falls back to the default prefix rule
+        self.assertEqual(self.fm.generate_show_nfo(data, "(broken"), expected)
+
+    def test_episode_nfo_golden(self):
+        data = {"title": "", "container_extension": "mp4", "info": {"plot": "<p>", "duration": "00:45:10", "bitrate": "900"}}
+        expected = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes" ?>\n<episodedetails>\n'
+            '  <title>Episode 5</title>\n'
+            '  <showtitle>Show &amp; Co</showtitle>\n'
+            '  <season>2</season>\n'
+            '  <episode>5</episode>\n'
+            '  <plot>&lt;p&gt;</plot>\n'
+            '  <runtime>45</runtime>\n'
+            '  <fileinfo>\n    <streamdetails>\n      <video>\n        <codec>mp4</codec>\n        <bitrate>900</bitrate>\n      </video>\n'
+            '    </streamdetails>\n  </fileinfo>\n'
+            '</episodedetails>'
+        )
+        self.assertEqual(self.fm.generate_episode_nfo(data, "Show & Co", 2, 5), expected)
+
+class TestFileManagerWrites(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fm = FileManager(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_if_changed_skips_identical_content(self):
+        path = os.path.join(self.tmp.name, "Movie.strm")
+
+        self.assertTrue(self.fm.write_if_changed(path, b"http://a/1.mp4"))
+        mtime = os.stat(path).st_mtime_ns
+        self.assertFalse(self.fm.write_if_changed(path, b"http://a/1.mp4"))
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+        self.assertTrue(self.fm.write_if_changed(path, b"http://a/2.mp4"))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b"http://a/2.mp4")
+
+        self.assertEqual(os.listdir(self.tmp.name), ["Movie.strm"])
+        stats = self.fm.get_write_stats()
+        self.assertEqual((stats["written"], stats["skipped"], stats["bytes_saved"]), (2, 1, 14))
+
+    def test_remove_paths_prunes_categories_once_empty(self):
+        kept_dir = os.path.join(self.tmp.name, "Kept")
+        gone_dir = os.path.join(self.tmp.name, "Gone")
+        movie_dir = os.path.join(gone_dir, "Movie {tmdb-1}")
+        os.makedirs(movie_dir)
+        os.makedirs(kept_dir)
+        self.fm.write_if_changed(os.path.join(movie_dir, "Movie {tmdb-1}.strm"), b"x")
+        self.fm.write_if_changed(os.path.join(gone_dir, "Flat.strm"), b"x")
+        self.fm.write_if_changed(os.path.join(kept_dir, "Other.strm"), b"x")
+
+        loop = asyncio.new_event_loop()
+        removed = loop.run_until_complete(self.fm.remove_paths(
+            [movie_dir, os.path.join(gone_dir, "Flat.strm"), os.path.join(gone_dir, "Missing.nfo")],
+            prune_dirs=[gone_dir, kept_dir],
+        ))
+        loop.close()
+        self.fm.close()
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(os.listdir(self.tmp.name), ["Kept"])
+
+    def test_write_files_batches_and_isolates_failures(self):
+        fm = FileManager(self.tmp.name, io_workers=2, write_batch_size=2)
+        jobs = [(os.path.join(self.tmp.name, f"{i}.strm"), b"url") for i in range(4)]
+        # A path whose parent is a regular file cannot be written
+        jobs.append((os.path.join(self.tmp.name, "0.strm", "bad.nfo"), b"x"))
+
+        loop = asyncio.new_event_loop()
+        written = loop.run_until_complete(fm.write_files(jobs))
+        loop.close()
+        fm.close()
+
+        self.assertEqual(written, 4)
+        stats = fm.get_write_stats()
+        self.assertEqual((stats["batches"], stats["errors"]), (3, 1))
+
+    def test_ensure_directory_is_memoized_until_removed(self):
+        season_dir = os.path.join(self.tmp.name, "Cat", "Show", "Season 01")
+        self.fm.ensure_directory(season_dir)
+        self.fm.ensure_directory(season_dir)
+        self.fm.ensure_directory(os.path.join(self.tmp.name, "Cat"))
+        stats = self.fm.get_write_stats()
+        self.assertEqual((stats["dirs_created"], stats["mkdir_avoided"]), (1, 2))
+
+        # Removing a tree forgets it and everything below, so it is created again
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(self.fm.remove_paths([os.path.join(self.tmp.name, "Cat", "Show")]))
+        loop.close()
+        self.fm.close()
+        self.fm.ensure_directory(season_dir)
+        self.assertTrue(os.path.isdir(season_dir))
+        self.assertEqual(self.fm.get_write_stats()["dirs_created"], 2)
+
+class TestStagedOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.live = os.path.join(self.tmp.name, "movies")
+        os.makedirs(os.path.join(self.live, "Cat"))
+        for name in ("kept.strm", "changed.strm", "gone.strm"):
+            with open(os.path.join(self.live, "Cat", name), "w") as f:
+                f.write("old")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _stage_changes(self, fm):
+        fm.begin_staging()
+        asyncio.run(fm.write_files([
+            (f"{self.live}/Cat/kept.strm", b"old"),
+            (f"{self.live}/Cat/changed.strm", b"new"),
+        ]))
+        asyncio.run(fm.remove_paths([f"{self.live}/Cat/gone.strm"]))
+
+    def test_live_tree_changes_only_on_publish(self):
+        kept_inode = os.stat(os.path.join(self.live, "Cat", "kept.strm")).st_ino
+        fm = FileManager(self.live)
+        self._stage_changes(fm)
+
+        # Nothing visible yet
+        self.assertEqual(sorted(os.listdir(os.path.join(self.live, "Cat"))), ["changed.strm", "gone.strm", "kept.strm"])
+        with open(os.path.join(self.live, "Cat", "changed.strm")) as f:
+            self.assertEqual(f.read(), "old")
+
+        fm.publish()
+        fm.close()
+        self.assertTrue(os.path.islink(self.live))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.live, "Cat"))), ["changed.strm", "kept.strm"])
+        with open(os.path.join(self.live, "Cat", "changed.strm")) as f:
+            self.assertEqual(f.read(), "new")
+        # Unchanged files are hardlinks of the previous version, not copies
+        self.assertEqual(os.stat(os.path.join(self.live, "Cat", "kept.strm")).st_ino, kept_inode)
+        self.assertEqual(fm.get_write_stats()["staging"]["linked"], 3)
+
+    def test_close_without_publish_discards_the_staged_copy(self):
+        fm = FileManager(self.live)
+        self._stage_changes(fm)
+        fm.close()
+        self.assertFalse(os.path.islink(self.live))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.live, "Cat"))), ["changed.strm", "gone.strm", "kept.strm"])
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, ".movies.versions")), [])
+
+    def test_extra_dirs_outside_output_dir_are_staged_too(self):
+        series = os.path.join(self.tmp.name, "library", "series")
+        nested = os.path.join(self.live, "Cat")
+        fm = FileManager(os.path.join(self.tmp.name, "out"))
+        fm.begin_staging((self.live, nested, series))
+        # A folder nested in a staged root shares its copy
+        self.assertEqual(sorted(tree.live_dir for tree in fm.staging), sorted([fm.output_dir, self.live, series]))
+        asyncio.run(fm.write_files([(f"{self.live}/Cat/changed.strm", b"new"), (f"{series}/Show/ep.strm", b"ep")]))
+        self.assertFalse(os.path.exists(os.path.join(series, "Show")))
+        with open(os.path.join(self.live, "Cat", "changed.strm")) as f:
+            self.assertEqual(f.read(), "old")
+
+        fm.publish()
+        fm.close()
+        with open(os.path.join(self.live, "Cat", "changed.strm")) as f:
+            self.assertEqual(f.read(), "new")
+        self.assertTrue(os.path.isfile(os.path.join(series, "Show", "ep.strm")))
+        self.assertEqual(fm.get_write_stats()["staging"]["linked"], 3)
+
+    def test_on_publish_waits_for_the_staged_copy(self):
+        done = []
+        fm = FileManager(self.live)
+        fm.on_publish(lambda: done.append("direct"))
+        self._stage_changes(fm)
+        fm.on_publish(lambda: done.append("staged"))
+        self.assertEqual(done, ["direct"])
+        fm.publish()
+        fm.close()
+        self.assertEqual(done, ["direct", "staged"])
+
+        # Dropped with a copy that never gets published
+        fm = FileManager(self.live)
+        self._stage_changes(fm)
+        fm.on_publish(lambda: done.append("discarded"))
+        fm.close()
+        self.assertEqual(done, ["direct", "staged"])
+
+class TestTreeScan(unittest.TestCase):
+    def test_scan_collects_generated_files_in_every_folder(self):
+        with tempfile.TemporaryDirectory() as root:
+            expected = set()
+            for cat in range(3):
+                for movie in range(4):
+                    folder = os.path.join(root, f"Cat {cat}", f"Movie {movie}")
+                    os.makedirs(folder)
+                    for name in (f"Movie {movie}.strm", f"Movie {movie}.nfo"):
+                        open(os.path.join(folder, name), "w").close()
+                        expected.add(os.path.join(folder, name))
+                    # Artwork a media server dropped next to them is never collected
+                    open(os.path.join(folder, "poster.jpg"), "w").close()
+            progress = []
+            scan = TreeScan(workers=4, progress=progress.append, progress_every=5)
+
+            self.assertEqual(scan.run([root, os.path.join(root, "missing")]), expected)
+            self.assertEqual(scan.stats["dirs"], 1 + 3 + 12)
+            self.assertEqual(scan.stats["files"], 24)
+            self.assertTrue(progress)
+
 if __name__ == '__main__':
     unittest.main()